@@ -1,17 +1,91 @@
-from typing import List
+import asyncio
+import os
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 
-from config import DEFAULT_LIMIT_PER_CHAT
+from config import (
+    DEFAULT_LIMIT_PER_CHAT,
+    OUTPUT_MODE,
+    CHATS_PAGE_SIZE,
+    CHATS_PAGE_MAX_SIZE,
+    MESSAGE_INDEX_PATH,
+    USE_TAKEOUT,
+)
 from telethon_handlers import export_chat_list, export_all_chats_media
-from api_helpers import start_qr_login, check_qr_login, get_active_client
+from api_helpers import (
+    start_qr_login,
+    check_qr_login,
+    get_active_client,
+    resume_session,
+    get_session_status,
+    close_session,
+)
+from watch_mode import watch_chats
+from chat_catalog import load_chat_catalog
 
 app = FastAPI(title="Telegram Downloader API")
 
+_watch_task = None
+_watch_stop = None
+_resume_task = None
+
+
+@app.on_event("startup")
+async def warm_session():
+    # Reconnect a saved session in the background; startup does not wait
+    global _resume_task
+    _resume_task = asyncio.create_task(resume_session())
+
+
+@app.on_event("shutdown")
+async def close_telegram_session():
+    await close_session()
+
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "telegram": get_session_status()}
+
+
+@app.get("/metrics")
+async def metrics():
+    from event_bus import MetricsSink, get_event_bus
+    from priority_scheduler import get_scheduler
+
+    bus = get_event_bus()
+    sink = bus.get_sink(MetricsSink)
+    counters = sink.snapshot() if sink else {}
+    return {
+        "counters": counters,
+        "events_dropped": bus.dropped,
+        "scheduler": get_scheduler().status(),
+    }
+
+
+@app.get("/bandwidth")
+async def bandwidth_status():
+    from bandwidth import get_bandwidth_shaper
+
+    return get_bandwidth_shaper().status()
+
+
+@app.put("/bandwidth")
+async def bandwidth_update(
+    limit_bytes_per_sec: Optional[int] = None,
+    weights: Optional[Dict[int, float]] = None,
+):
+    from bandwidth import get_bandwidth_shaper
+
+    shaper = get_bandwidth_shaper()
+    try:
+        if limit_bytes_per_sec is not None:
+            shaper.set_rate(limit_bytes_per_sec)
+        for chat_id, weight in (weights or {}).items():
+            shaper.set_weight(chat_id, weight)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return shaper.status()
 
 
 @app.post("/login/start")
@@ -33,16 +107,178 @@ async def chats_export():
     return {"count": len(chats), "chats": chats}
 
 
+@app.get("/chats")
+async def chats_list(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = CHATS_PAGE_SIZE,
+    fields: Optional[str] = None,
+    q: Optional[str] = None,
+    type: Optional[str] = None,
+    forum: Optional[bool] = None,
+):
+    # Served from the cached chat list: no Telegram requests
+    catalog = load_chat_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=404, detail="chat_list_not_exported")
+    if not 1 <= limit <= CHATS_PAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail="invalid_limit")
+
+    etag = f'"{catalog.etag}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        page = catalog.page(
+            q,
+            chat_type=type,
+            is_forum=forum,
+            cursor=cursor,
+            limit=limit,
+            fields=fields.split(",") if fields else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return page
+
+
+@app.get("/chats/search")
+async def chats_search(
+    q: Optional[str] = None,
+    type: Optional[str] = None,
+    forum: Optional[bool] = None,
+    username: Optional[str] = None,
+    limit: int = 50,
+):
+    catalog = load_chat_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=404, detail="chat_list_not_exported")
+    if username:
+        chat = catalog.get_by_username(username)
+        chats = [chat] if chat else []
+    else:
+        chats = catalog.search(q, chat_type=type, is_forum=forum, limit=limit)
+    return {"count": len(chats), "chats": chats}
+
+
+@app.get("/messages/search")
+async def messages_search(
+    q: str,
+    chat_id: Optional[int] = None,
+    media_type: Optional[str] = None,
+    limit: int = 50,
+):
+    # Served from the local message index: no Telegram requests
+    from message_index import get_message_index
+
+    if not os.path.exists(MESSAGE_INDEX_PATH):
+        raise HTTPException(status_code=404, detail="message_index_not_found")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="invalid_limit")
+
+    try:
+        messages = get_message_index().search(
+            q, chat_id=chat_id, media_type=media_type, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"count": len(messages), "messages": messages}
+
+
 @app.post("/media/download")
-async def media_download(chat_ids: List[int], limit: int = DEFAULT_LIMIT_PER_CHAT):
+async def media_download(
+    chat_ids: List[int],
+    limit: int = DEFAULT_LIMIT_PER_CHAT,
+    output_mode: str = OUTPUT_MODE,
+    priority: str = "bulk",
+    takeout: bool = USE_TAKEOUT,
+):
+    from priority_scheduler import PRIORITIES
+
     client = get_active_client()
     if not client:
         raise HTTPException(status_code=400, detail="not_authenticated")
+    if output_mode not in ("files", "tar", "zip"):
+        raise HTTPException(status_code=400, detail="invalid_output_mode")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail="invalid_priority")
     chat_list = [{"id": cid, "title": str(cid), "type": "Unknown"} for cid in chat_ids]
-    success, failed = await export_all_chats_media(client, chat_list, limit)
+    success, failed = await export_all_chats_media(
+        client,
+        chat_list,
+        limit,
+        output_mode=output_mode,
+        priority=priority,
+        takeout=takeout,
+    )
     return {"success": success, "failed": failed}
 
 
+@app.post("/media/catalog")
+async def media_catalog(chat_ids: List[int], limit: int = DEFAULT_LIMIT_PER_CHAT):
+    client = get_active_client()
+    if not client:
+        raise HTTPException(status_code=400, detail="not_authenticated")
+    chat_list = [{"id": cid, "title": str(cid), "type": "Unknown"} for cid in chat_ids]
+    success, failed = await export_all_chats_media(
+        client, chat_list, limit, metadata_only=True
+    )
+    return {"success": success, "failed": failed}
+
+
+@app.post("/media/plan")
+async def media_plan(chat_ids: List[int], sort_by: str = "bytes"):
+    from export_planner import PLAN_SORT_KEYS, plan_chats
+
+    client = get_active_client()
+    if not client:
+        raise HTTPException(status_code=400, detail="not_authenticated")
+    if sort_by not in PLAN_SORT_KEYS:
+        raise HTTPException(status_code=400, detail="invalid_sort_by")
+    chat_list = [{"id": cid, "title": str(cid), "type": "Unknown"} for cid in chat_ids]
+    plans = await plan_chats(client, chat_list, sort_by)
+    for plan in plans:
+        plan.pop("ref", None)
+    return {"count": len(plans), "plans": plans}
+
+
+@app.post("/watch/start")
+async def watch_start(chat_ids: List[int]):
+    global _watch_task, _watch_stop
+    client = get_active_client()
+    if not client:
+        raise HTTPException(status_code=400, detail="not_authenticated")
+    if _watch_task and not _watch_task.done():
+        raise HTTPException(status_code=409, detail="watch_already_running")
+    chat_list = [{"id": cid, "title": str(cid), "type": "Unknown"} for cid in chat_ids]
+    _watch_stop = asyncio.Event()
+    _watch_task = asyncio.create_task(
+        watch_chats(client, chat_list, stop_event=_watch_stop)
+    )
+    return {"watching": True, "chat_ids": chat_ids}
+
+
+@app.post("/watch/stop")
+async def watch_stop():
+    if not _watch_task or _watch_task.done():
+        return {"watching": False}
+    _watch_stop.set()
+    await _watch_task
+    return {"watching": False}
+
+
+@app.get("/watch/status")
+async def watch_status():
+    return {"watching": bool(_watch_task and not _watch_task.done())}
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,40 +1,65 @@
-from typing import Optional, Dict, Any
+from __future__ import annotations
 
-from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError
+import os
+from typing import TYPE_CHECKING, Optional, Dict, Any
 
-from config import API_ID, API_HASH, SESSION_NAME
+from config import SESSION_NAME
+from session_manager import get_session_manager
+
+# Telethon is imported lazily so the API process starts quickly
+if TYPE_CHECKING:
+    from telethon import TelegramClient
 
-_active_client: Optional[TelegramClient] = None
 _qr_login = None
 
 
+async def resume_session() -> bool:
+    """Reconnect an existing authorized session, if there is one."""
+    manager = get_session_manager()
+
+    if manager.authorized or not os.path.exists(f"{SESSION_NAME}.session"):
+        return False
+
+    try:
+        client = await manager.get_client()
+        manager.authorized = await client.is_user_authorized()
+    except Exception as e:
+        print(f"⚠️ Não foi possível retomar a sessão: {e}")
+
+    return manager.authorized
+
+
 async def start_qr_login() -> Dict[str, Any]:
     """Start QR code login and return the URL."""
-    global _active_client, _qr_login
+    global _qr_login
 
-    client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
-    await client.connect()
+    # The session's single client is reused; no new connection per call
+    manager = get_session_manager()
+    client = await manager.get_client()
 
     if await client.is_user_authorized():
-        _active_client = client
+        manager.authorized = True
+        _qr_login = None
         return {"authorized": True}
 
     _qr_login = await client.qr_login()
-    _active_client = client
     return {"authorized": False, "qr_url": _qr_login.url}
 
 
 async def check_qr_login(password: Optional[str] = None) -> Dict[str, Any]:
     """Check login status. Provide password if 2FA is required."""
-    global _active_client, _qr_login
+    global _qr_login
+
+    from telethon.errors import SessionPasswordNeededError
 
-    if _active_client is None:
+    manager = get_session_manager()
+    client = manager.client
+    if client is None:
         return {"authorized": False, "detail": "login_not_started"}
 
     if _qr_login is None:
-        authorized = await _active_client.is_user_authorized()
-        return {"authorized": authorized}
+        manager.authorized = await client.is_user_authorized()
+        return {"authorized": manager.authorized}
 
     try:
         await _qr_login.wait(1)
@@ -42,13 +67,14 @@ async def check_qr_login(password: Optional[str] = None) -> Dict[str, Any]:
         return {"authorized": False}
     except SessionPasswordNeededError:
         if password:
-            await _active_client.sign_in(password=password)
+            await client.sign_in(password=password)
         else:
             return {"authorized": False, "detail": "2fa_required"}
     except Exception as e:
         return {"authorized": False, "detail": str(e)}
 
-    if await _active_client.is_user_authorized():
+    if await client.is_user_authorized():
+        manager.authorized = True
         _qr_login = None
         return {"authorized": True}
     return {"authorized": False}
@@ -56,4 +82,15 @@ async def check_qr_login(password: Optional[str] = None) -> Dict[str, Any]:
 
 def get_active_client() -> Optional[TelegramClient]:
     """Return the active authenticated client if available."""
-    return _active_client
+    manager = get_session_manager()
+    return manager.client if manager.authorized else None
+
+
+def get_session_status() -> Dict[str, Any]:
+    """Return the connection state of the API session."""
+    return get_session_manager().status()
+
+
+async def close_session() -> None:
+    """Disconnect the API session."""
+    await get_session_manager().close()
@@ -0,0 +1,247 @@
+"""
+Archive store module for Telegram Media Downloader
+Writes downloaded media into size-capped tar or zip shards with an index
+sidecar, so exports do not create one file per media item
+"""
+
+import asyncio
+import glob
+import json
+import os
+import re
+import struct
+import tarfile
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from config import ARCHIVE_SHARD_MAX_BYTES
+
+ARCHIVE_FORMATS = ("tar", "zip")
+
+# Size of the fixed part of a zip local file header
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+class ShardedArchiveWriter:
+    """
+    Append media files to size-capped archive shards
+
+    Shards are named "{name}_00001.tar" (or .zip) inside the archive
+    directory, and every stored item is recorded in "{name}.index.jsonl"
+    with the shard, member name, data offset and size. Members are stored
+    uncompressed, so any single item can be read back with one seek.
+    """
+
+    def __init__(
+        self,
+        archive_dir: str,
+        name: str,
+        archive_format: str = "tar",
+        max_shard_size: int = ARCHIVE_SHARD_MAX_BYTES,
+    ):
+        """
+        Args:
+            archive_dir: Directory where shards and the index are stored
+            name: Shard name prefix (chat or topic)
+            archive_format: "tar" or "zip"
+            max_shard_size: Size in bytes after which a new shard is started
+        """
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato de arquivo inválido: {archive_format}")
+
+        os.makedirs(archive_dir, exist_ok=True)
+
+        self.archive_dir = archive_dir
+        self.name = name
+        self.archive_format = archive_format
+        self.max_shard_size = max_shard_size
+        self.index_path = os.path.join(archive_dir, f"{name}.index.jsonl")
+
+        self._lock = asyncio.Lock()
+        self._shard_number = self._last_shard_number()
+        self._shard_path: Optional[str] = None
+        self._shard_file: Optional[BinaryIO] = None
+        self._archive = None
+
+    def _last_shard_number(self) -> int:
+        pattern = os.path.join(self.archive_dir, f"{glob.escape(self.name)}_*.*")
+        numbers = [0]
+        for path in glob.glob(pattern):
+            match = re.search(r"_(\d+)\.(tar|zip)$", path)
+            if match:
+                numbers.append(int(match.group(1)))
+        return max(numbers)
+
+    def _open_next_shard(self) -> None:
+        self._close_shard()
+
+        # Always start a new shard so existing ones are never rewritten
+        self._shard_number += 1
+        shard_name = f"{self.name}_{self._shard_number:05d}.{self.archive_format}"
+        self._shard_path = os.path.join(self.archive_dir, shard_name)
+        self._shard_file = open(self._shard_path, "w+b")
+
+        if self.archive_format == "tar":
+            self._archive = tarfile.open(fileobj=self._shard_file, mode="w")
+        else:
+            self._archive = zipfile.ZipFile(
+                self._shard_file, "w", compression=zipfile.ZIP_STORED, allowZip64=True
+            )
+
+    def _close_shard(self) -> None:
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+
+    def _write_member(self, arcname: str, stream: BinaryIO, size: int) -> int:
+        """Write one member to the current shard and return its data offset"""
+        if self.archive_format == "tar":
+            info = tarfile.TarInfo(arcname)
+            info.size = size
+            info.mtime = int(time.time())
+            # Data follows the header blocks (including long name headers)
+            header = info.tobuf(
+                self._archive.format, self._archive.encoding, self._archive.errors
+            )
+            offset = self._archive.offset + len(header)
+            self._archive.addfile(info, stream)
+            return offset
+
+        info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        info.file_size = size
+        with self._archive.open(info, "w", force_zip64=size > 0xFFFFFFFF) as dest:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                dest.write(chunk)
+
+        # The local header has variable-length fields, read them back
+        self._shard_file.flush()
+        with open(self._shard_path, "rb") as shard:
+            shard.seek(info.header_offset)
+            header = shard.read(_ZIP_LOCAL_HEADER_SIZE)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        return info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+
+    def _add(self, message_id: int, arcname: str, stream: BinaryIO, size: int) -> Dict:
+        # Oversized items still get a shard of their own
+        if self._archive is None or (
+            self._shard_file.tell() > 0
+            and self._shard_file.tell() + size > self.max_shard_size
+        ):
+            self._open_next_shard()
+
+        offset = self._write_member(arcname, stream, size)
+
+        entry = {
+            "message_id": message_id,
+            "shard": os.path.basename(self._shard_path),
+            "member": arcname,
+            "offset": offset,
+            "size": size,
+        }
+        with open(self.index_path, "a", encoding="utf-8") as index:
+            index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return entry
+
+    async def add(
+        self, message_id: int, arcname: str, stream: BinaryIO, size: int
+    ) -> Dict:
+        """
+        Store a downloaded file in the current shard
+
+        The copy runs in a worker thread, so large members do not block
+        the event loop; the lock keeps one writer per shard series.
+
+        Args:
+            message_id: Telegram message ID of the media
+            arcname: Member name inside the shard
+            stream: Readable stream positioned at the start of the data
+            size: Number of bytes to store
+
+        Returns:
+            Index entry describing where the item was stored
+        """
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            return await loop.run_in_executor(
+                None, self._add, message_id, arcname, stream, size
+            )
+
+    def close(self) -> None:
+        """Finish the current shard"""
+        self._close_shard()
+
+
+def load_archive_index(index_path: str) -> Dict[int, Dict]:
+    """
+    Load an archive index sidecar
+
+    Args:
+        index_path: Path to the "{name}.index.jsonl" file
+
+    Returns:
+        Dictionary mapping message ID to its index entry
+    """
+    entries = {}
+
+    with open(index_path, "r", encoding="utf-8") as index:
+        for line in index:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                entries[entry["message_id"]] = entry
+
+    return entries
+
+
+def iter_archived_item(
+    archive_dir: str, entry: Dict, chunk_size: int = 1024 * 1024
+) -> Iterator[bytes]:
+    """
+    Read a single archived item without unpacking its shard
+
+    Args:
+        archive_dir: Directory containing the shards
+        entry: Index entry of the item
+        chunk_size: Size of the yielded chunks
+
+    Yields:
+        Chunks of the item data
+    """
+    with open(os.path.join(archive_dir, entry["shard"]), "rb") as shard:
+        shard.seek(entry["offset"])
+        remaining = entry["size"]
+        while remaining > 0:
+            chunk = shard.read(min(chunk_size, remaining))
+            if not chunk:
+                raise IOError(f"Shard truncado: {entry['shard']}")
+            remaining -= len(chunk)
+            yield chunk
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 4:
+        print("Uso: python archive_store.py <index.jsonl> <message_id> <destino>")
+        sys.exit(1)
+
+    index_file, item_id, destination = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    item = load_archive_index(index_file).get(item_id)
+    if item is None:
+        print(f"❌ Mensagem {item_id} não encontrada no índice")
+        sys.exit(1)
+
+    with open(destination, "wb") as output:
+        for data in iter_archived_item(os.path.dirname(index_file), item):
+            output.write(data)
+
+    print(f"✅ Item extraído para '{destination}'")
@@ -0,0 +1,156 @@
+"""
+Bandwidth shaping module for Telegram Media Downloader
+Token bucket rate limiting applied to every downloaded chunk, with a
+global byte rate that can be changed at runtime and weighted shares per
+chat (or any other flow key)
+"""
+
+import asyncio
+import inspect
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, Optional
+
+from config import BANDWIDTH_LIMIT, BANDWIDTH_BURST_SECONDS
+
+
+class _Flow:
+    __slots__ = ("weight", "active", "tokens", "updated")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.active = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class BandwidthShaper:
+    """
+    Global download rate split between active flows by weight
+
+    Each flow (usually a chat) has its own token bucket refilled at
+    rate * weight / sum of the weights of the flows currently
+    downloading, so an idle chat leaves its share to the others. Chunks
+    bigger than the bucket are allowed and paid back as a wait, which
+    keeps the average rate exact without splitting Telethon's chunks.
+    """
+
+    def __init__(
+        self,
+        rate: int = BANDWIDTH_LIMIT,
+        burst_seconds: float = BANDWIDTH_BURST_SECONDS,
+    ):
+        """
+        Args:
+            rate: Global limit in bytes per second (0 = unlimited)
+            burst_seconds: Bucket size, in seconds of a flow's rate
+        """
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self._flows: Dict[Hashable, _Flow] = {}
+        self._weights: Dict[Hashable, float] = {}
+
+    def set_rate(self, rate: int) -> None:
+        """Change the global limit (bytes per second, 0 = unlimited)"""
+        if rate < 0:
+            raise ValueError(f"Limite de banda inválido: {rate}")
+        self.rate = rate
+
+    def set_weight(self, key: Hashable, weight: float) -> None:
+        """Set the share of a flow relative to the others (default 1)"""
+        if weight <= 0:
+            raise ValueError(f"Peso inválido para {key}: {weight}")
+        self._weights[key] = weight
+        if key in self._flows:
+            self._flows[key].weight = weight
+
+    def _flow_rate(self, flow: _Flow) -> float:
+        total = sum(f.weight for f in self._flows.values() if f.active) or flow.weight
+        return self.rate * flow.weight / total
+
+    @asynccontextmanager
+    async def active(self, key: Hashable):
+        """Mark a flow as downloading for the duration of the block"""
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = _Flow(self._weights.get(key, 1))
+        flow.active += 1
+        try:
+            yield flow
+        finally:
+            flow.active -= 1
+            if not flow.active:
+                del self._flows[key]
+
+    async def consume(self, key: Hashable, nbytes: int) -> None:
+        """Take nbytes from the bucket of a flow, waiting if it is in debt"""
+        if self.rate <= 0:
+            return
+
+        flow = self._flows.get(key)
+        if flow is None:
+            async with self.active(key):
+                return await self.consume(key, nbytes)
+
+        rate = self._flow_rate(flow)
+        now = time.monotonic()
+        flow.tokens = min(
+            rate * self.burst_seconds, flow.tokens + (now - flow.updated) * rate
+        )
+        flow.updated = now
+        flow.tokens -= nbytes
+
+        if flow.tokens < 0:
+            await asyncio.sleep(-flow.tokens / rate)
+
+    def throttle(self, file, key: Hashable) -> "ThrottledWriter":
+        """Wrap a download target so each chunk is paid for before writing"""
+        return ThrottledWriter(file, self, key)
+
+    def status(self) -> Dict:
+        """Global limit, configured weights and current per-flow rates"""
+        return {
+            "limit_bytes_per_sec": self.rate,
+            "weights": {str(key): weight for key, weight in self._weights.items()},
+            "active": {
+                str(key): round(self._flow_rate(flow))
+                for key, flow in self._flows.items()
+                if self.rate > 0
+            },
+        }
+
+
+class ThrottledWriter:
+    """
+    Download target that shapes the chunks written to another target
+
+    Telethon awaits awaitable write() results, so the wait happens
+    between chunks without blocking other downloads.
+    """
+
+    def __init__(self, file, shaper: BandwidthShaper, key: Hashable):
+        self._file = file
+        self._shaper = shaper
+        self._key = key
+
+    async def write(self, data: bytes):
+        await self._shaper.consume(self._key, len(data))
+        result = self._file.write(data)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def flush(self) -> None:
+        if callable(getattr(self._file, "flush", None)):
+            self._file.flush()
+
+
+_shaper: Optional[BandwidthShaper] = None
+
+
+def get_bandwidth_shaper() -> BandwidthShaper:
+    """Return the process-wide bandwidth shaper"""
+    global _shaper
+    if _shaper is None:
+        _shaper = BandwidthShaper()
+    return _shaper
@@ -0,0 +1,489 @@
+"""
+Batch job module for Telegram Media Downloader
+Runs exports unattended from a declarative JSON job spec: the spec is
+compiled into an execution plan, chats run in parallel and a
+machine-readable summary is written at the end
+
+Example spec:
+{
+    "chats": [
+        "@canal_publico",
+        "https://t.me/c/1234567890/1",
+        -1001234567890,
+        {"chat": "https://t.me/outro_canal", "limit": 200, "media_types": ["photo"]}
+    ],
+    "defaults": {"limit": 500, "output_mode": "zip", "metadata_only": false},
+    "concurrency": 2,
+    "downloads_per_chat": 1,
+    "order": "largest_first",
+    "takeout": false,
+    "summary_path": "exports/batch_summary.json"
+}
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+from config import (
+    EXPORTS_DIR,
+    DEFAULT_LIMIT_PER_CHAT,
+    CONCURRENT_DOWNLOADS,
+    OUTPUT_MODE,
+    MEDIA_DIRECTORIES,
+    BATCH_CHAT_CONCURRENCY,
+    BATCH_SUMMARY_FILENAME,
+    USE_TAKEOUT,
+)
+from archive_store import ARCHIVE_FORMATS
+from chat_catalog import ChatCatalog, load_chat_catalog, parse_chat_link
+from takeout_session import TakeoutSession
+
+OUTPUT_MODES = ("files",) + ARCHIVE_FORMATS
+
+# Per-chat options and their defaults
+TASK_DEFAULTS = {
+    "limit": DEFAULT_LIMIT_PER_CHAT,
+    "media_types": None,
+    "output_mode": OUTPUT_MODE,
+    "metadata_only": False,
+    "bandwidth_weight": 1,
+}
+
+# Task order: as listed in the spec, or biggest estimated export first
+JOB_ORDERS = ("spec", "largest_first")
+
+# Exit codes for cron and orchestrators
+EXIT_OK = 0
+EXIT_CHAT_FAILURES = 1
+EXIT_JOB_ERROR = 2
+
+
+def load_job_spec(path: str) -> Dict:
+    """
+    Load a job spec from a JSON file
+
+    Args:
+        path: Path to the job spec
+
+    Returns:
+        Job spec dictionary
+
+    Raises:
+        ValueError: If the file is not a valid job spec
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Job spec inválido: {e}")
+
+    if not isinstance(spec, dict) or not spec.get("chats"):
+        raise ValueError("Job spec precisa de uma lista 'chats' não vazia")
+
+    return spec
+
+
+def resolve_chat_ref(
+    ref: Union[int, str], catalog: Optional[ChatCatalog] = None
+) -> Dict:
+    """
+    Turn a chat reference from a job spec into a chat information dictionary
+
+    Args:
+        ref: Chat ID, username, @username or t.me link
+        catalog: Exported chat catalog used to fill in known chats
+
+    Returns:
+        Chat information dictionary
+
+    Raises:
+        ValueError: If the reference cannot be parsed
+    """
+    if isinstance(ref, str) and ref.strip().lstrip("-").isdigit():
+        ref = int(ref)
+
+    if isinstance(ref, int):
+        found = catalog.get(ref) if catalog else None
+        return found or {
+            "id": ref,
+            "title": f"Chat_ID_{ref}",
+            "type": "Unknown",
+            "username": None,
+            "participants_count": 0,
+            "is_forum": False,
+        }
+
+    if not isinstance(ref, str):
+        raise ValueError(f"Referência de chat inválida: {ref!r}")
+
+    chat = parse_chat_link(ref)
+    if chat is None:
+        raise ValueError(f"Referência de chat vazia: {ref!r}")
+
+    if catalog:
+        if chat["username"]:
+            found = catalog.get_by_username(chat["username"])
+        else:
+            found = catalog.get(chat["id"])
+        chat = found or chat
+
+    return chat
+
+
+def _validate_task_options(options: Dict, ref) -> None:
+    if not isinstance(options["limit"], int) or options["limit"] < 1:
+        raise ValueError(f"'limit' inválido para {ref!r}: {options['limit']}")
+
+    if options["output_mode"] not in OUTPUT_MODES:
+        raise ValueError(
+            f"'output_mode' inválido para {ref!r}: {options['output_mode']} "
+            f"(use {', '.join(OUTPUT_MODES)})"
+        )
+
+    weight = options["bandwidth_weight"]
+    if not isinstance(weight, (int, float)) or weight <= 0:
+        raise ValueError(f"'bandwidth_weight' inválido para {ref!r}: {weight}")
+
+    media_types = options["media_types"]
+    if media_types is not None:
+        unknown = set(media_types) - set(MEDIA_DIRECTORIES)
+        if unknown:
+            raise ValueError(
+                f"'media_types' inválido para {ref!r}: {', '.join(sorted(unknown))}"
+            )
+
+
+def compile_job_plan(spec: Dict, catalog: Optional[ChatCatalog] = None) -> Dict:
+    """
+    Compile a job spec into an execution plan
+
+    Every chat entry is resolved and merged with the spec defaults, and
+    the whole spec is validated before anything runs. A chat listed more
+    than once is planned only once (first entry wins).
+
+    Args:
+        spec: Job spec dictionary (see load_job_spec)
+        catalog: Exported chat catalog used to fill in known chats
+
+    Returns:
+        Plan dictionary with "concurrency", "downloads_per_chat",
+        "order", "takeout" and "tasks" (one per chat, in spec order)
+
+    Raises:
+        ValueError: If the spec is invalid
+    """
+    defaults = dict(TASK_DEFAULTS)
+    unknown = set(spec.get("defaults", {})) - set(TASK_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Opções desconhecidas em 'defaults': {sorted(unknown)}")
+    defaults.update(spec.get("defaults", {}))
+
+    tasks = []
+    planned = set()
+
+    for entry in spec["chats"]:
+        options = dict(defaults)
+        if isinstance(entry, dict):
+            ref = entry.get("chat")
+            unknown = set(entry) - set(TASK_DEFAULTS) - {"chat"}
+            if unknown:
+                raise ValueError(
+                    f"Opções desconhecidas para {ref!r}: {sorted(unknown)}"
+                )
+            options.update({k: v for k, v in entry.items() if k != "chat"})
+        else:
+            ref = entry
+
+        chat = resolve_chat_ref(ref, catalog)
+        _validate_task_options(options, ref)
+
+        key = chat["id"] or (chat.get("username") or "").casefold()
+        if key in planned:
+            continue
+        planned.add(key)
+
+        tasks.append({"ref": ref, "chat": chat, **options})
+
+    concurrency = spec.get("concurrency", BATCH_CHAT_CONCURRENCY)
+    downloads_per_chat = spec.get("downloads_per_chat", CONCURRENT_DOWNLOADS)
+    if concurrency < 1 or downloads_per_chat < 1:
+        raise ValueError("'concurrency' e 'downloads_per_chat' devem ser >= 1")
+
+    order = spec.get("order", "spec")
+    if order not in JOB_ORDERS:
+        raise ValueError(f"'order' inválido: {order} (use {', '.join(JOB_ORDERS)})")
+
+    takeout = spec.get("takeout", USE_TAKEOUT)
+    if not isinstance(takeout, bool):
+        raise ValueError(f"'takeout' inválido: {takeout} (use true ou false)")
+
+    return {
+        "concurrency": concurrency,
+        "downloads_per_chat": downloads_per_chat,
+        "order": order,
+        "takeout": takeout,
+        "tasks": tasks,
+    }
+
+
+async def order_largest_first(client, plan: Dict) -> None:
+    """
+    Reorder plan tasks by estimated export size, biggest first
+
+    Long chats then start early instead of becoming the tail of the job.
+    The data centers seen while sampling are pre-warmed in the meantime.
+
+    Args:
+        client: Authenticated Telegram client
+        plan: Plan from compile_job_plan (modified in place)
+    """
+    from dc_pool import get_dc_pool
+    from export_planner import plan_chats
+
+    estimates = await plan_chats(client, [task["chat"] for task in plan["tasks"]])
+    for estimate in estimates:
+        for dc_id in estimate["dc_ids"]:
+            get_dc_pool(client).ensure_warm(dc_id)
+
+    rank = {id(estimate["ref"]): i for i, estimate in enumerate(estimates)}
+    plan["tasks"].sort(key=lambda task: rank[id(task["chat"])])
+    for task in plan["tasks"]:
+        estimate = estimates[rank[id(task["chat"])]]
+        task["est_bytes"] = estimate["bytes"]
+
+
+def print_job_plan(plan: Dict) -> None:
+    """Display an execution plan"""
+    print(f"\n🗺️ PLANO DE EXECUÇÃO ({len(plan['tasks'])} chats)")
+    print(
+        f"   {plan['concurrency']} chats em paralelo, "
+        f"{plan['downloads_per_chat']} downloads por chat"
+    )
+    if plan["takeout"]:
+        print("   Sessão takeout (limites de exportação em massa)")
+    print("-" * 80)
+    for i, task in enumerate(plan["tasks"], 1):
+        mode = "metadados" if task["metadata_only"] else task["output_mode"]
+        media_types = ",".join(task["media_types"]) if task["media_types"] else "todas"
+        print(
+            f"{i:3d}. {task['chat']['title'][:40]:<40} | limite {task['limit']:>6} | "
+            f"{mode:<9} | mídias: {media_types}"
+        )
+
+
+async def _run_task(session, task: Dict, downloads_per_chat: int) -> Dict:
+    """
+    Export one chat of the plan and return its summary entry
+
+    The chat is exported with session.client and redone with the regular
+    client if the takeout session is invalidated meanwhile.
+    """
+    from bandwidth import get_bandwidth_shaper
+    from trace_replay import trace_chat
+    from telethon_handlers import (
+        get_chat_entity_safe,
+        validate_chat_access,
+        export_media_organized,
+        export_media_metadata,
+    )
+
+    chat = task["chat"]
+    result = {
+        "ref": task["ref"],
+        "chat_id": chat["id"],
+        "title": chat["title"],
+        "status": "failed",
+        "files": 0,
+        "failed_files": 0,
+        "error": None,
+        "started_at": datetime.now().isoformat(),
+    }
+    start = time.monotonic()
+
+    try:
+        client = session.client
+        trace_chat(client)
+        entity = await get_chat_entity_safe(client, chat)
+        if not entity:
+            result["error"] = "chat_not_accessible"
+        elif not await validate_chat_access(client, entity):
+            result["error"] = "no_read_access"
+        else:
+            result["chat_id"] = entity.id
+            result["title"] = getattr(entity, "title", chat["title"])
+            get_bandwidth_shaper().set_weight(entity.id, task["bandwidth_weight"])
+
+            if task["metadata_only"]:
+                result["files"] = await export_media_metadata(
+                    client, entity, task["limit"], task["media_types"]
+                )
+            else:
+                stats = {}
+                result["files"] = await export_media_organized(
+                    client,
+                    entity,
+                    task["limit"],
+                    task["output_mode"],
+                    task["media_types"],
+                    downloads_per_chat,
+                    stats=stats,
+                )
+                result["failed_files"] = stats["failed"]
+
+            if result["failed_files"]:
+                # Some media could not be downloaded; the next run retries them
+                result["status"] = "partial" if result["files"] else "failed"
+                result["error"] = f"{result['failed_files']} downloads falharam"
+            else:
+                result["status"] = "ok" if result["files"] else "empty"
+
+    except Exception as e:
+        if session.fallback(e):
+            return await _run_task(session, task, downloads_per_chat)
+        print(f"❌ Erro ao processar chat {chat['title']}: {e}")
+        result["error"] = str(e)
+
+    result["duration_seconds"] = round(time.monotonic() - start, 3)
+    return result
+
+
+async def run_job_plan(client, plan: Dict) -> Dict:
+    """
+    Execute a plan, running up to plan["concurrency"] chats at a time
+
+    With plan["takeout"], chats run through a takeout session when
+    Telegram grants one (see takeout_session.TakeoutSession).
+
+    Args:
+        client: Authenticated Telegram client
+        plan: Plan from compile_job_plan
+
+    Returns:
+        Job summary dictionary
+    """
+    semaphore = asyncio.Semaphore(plan["concurrency"])
+    started_at = datetime.now().isoformat()
+    start = time.monotonic()
+
+    async with TakeoutSession(client, plan["takeout"]) as session:
+
+        async def run_limited(task):
+            async with semaphore:
+                return await _run_task(session, task, plan["downloads_per_chat"])
+
+        results = await asyncio.gather(*[run_limited(task) for task in plan["tasks"]])
+
+    return {
+        "started_at": started_at,
+        "finished_at": datetime.now().isoformat(),
+        "duration_seconds": round(time.monotonic() - start, 3),
+        "chats_total": len(results),
+        "chats_ok": sum(1 for r in results if r["status"] == "ok"),
+        "chats_empty": sum(1 for r in results if r["status"] == "empty"),
+        "chats_partial": sum(1 for r in results if r["status"] == "partial"),
+        # Partial chats count as failed too, so the job exits non-zero
+        "chats_failed": sum(1 for r in results if r["status"] in ("failed", "partial")),
+        "files": sum(r["files"] for r in results),
+        "results": results,
+    }
+
+
+def write_job_summary(summary: Dict, path: str) -> None:
+    """Write the job summary as JSON (atomically, for pollers)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def run_batch_job(spec_path: str, dry_run: bool = False) -> int:
+    """
+    Run a job spec end to end without any interactive prompt
+
+    Uses the saved session (log in once interactively first) and the
+    exported chat list, exporting it if it does not exist yet.
+
+    Args:
+        spec_path: Path to the JSON job spec
+        dry_run: Only compile and display the plan
+
+    Returns:
+        Process exit code: EXIT_OK, EXIT_CHAT_FAILURES or EXIT_JOB_ERROR
+    """
+    from dc_pool import close_dc_pool
+    from telethon_handlers import connect_saved_session, export_chat_list
+
+    try:
+        spec = load_job_spec(spec_path)
+        plan = compile_job_plan(spec, load_chat_catalog())
+    except (OSError, ValueError) as e:
+        print(f"❌ Erro no job spec: {e}")
+        return EXIT_JOB_ERROR
+
+    print_job_plan(plan)
+    if dry_run:
+        return EXIT_OK
+
+    summary_path = spec.get("summary_path") or os.path.join(
+        EXPORTS_DIR, BATCH_SUMMARY_FILENAME
+    )
+    started_at = datetime.now().isoformat()
+    try:
+        client = await connect_saved_session()
+        if not client:
+            raise RuntimeError(
+                "Nenhuma sessão autorizada. Faça login interativo uma vez antes."
+            )
+
+        try:
+            catalog = load_chat_catalog()
+            if catalog is None:
+                # Without a chat list, refresh it so IDs can be resolved by access hash
+                catalog = ChatCatalog(await export_chat_list(client))
+                plan = compile_job_plan(spec, catalog)
+
+            if plan["order"] == "largest_first":
+                await order_largest_first(client, plan)
+                print_job_plan(plan)
+
+            summary = await run_job_plan(client, plan)
+        finally:
+            await close_dc_pool(client)
+            await client.disconnect()
+    except Exception as e:
+        # The job itself failed (session, chat list, network): still leave a
+        # summary behind so pollers see the error instead of a stale file
+        print(f"❌ Erro ao executar o job: {e}")
+        write_job_summary(
+            {
+                "spec": os.path.abspath(spec_path),
+                "started_at": started_at,
+                "finished_at": datetime.now().isoformat(),
+                "error": f"{type(e).__name__}: {e}",
+                "chats_total": len(plan["tasks"]),
+                "results": [],
+            },
+            summary_path,
+        )
+        print(f"📄 Resumo: {summary_path}")
+        return EXIT_JOB_ERROR
+
+    summary["spec"] = os.path.abspath(spec_path)
+    write_job_summary(summary, summary_path)
+
+    print(
+        f"\n📊 Job concluído: {summary['chats_ok']} ok, {summary['chats_empty']} sem mídia, "
+        f"{summary['chats_failed']} com falha ({summary['chats_partial']} parciais) - "
+        f"{summary['files']} arquivos"
+    )
+    print(f"📄 Resumo: {summary_path}")
+
+    return EXIT_CHAT_FAILURES if summary["chats_failed"] else EXIT_OK
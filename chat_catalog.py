@@ -0,0 +1,365 @@
+"""
+Chat catalog module for Telegram Media Downloader
+Indexed, in-memory view of the exported chat list with fast lookup by
+ID, username and title, plus type and forum filters and cursor pages
+"""
+
+import base64
+import bisect
+import hashlib
+import json
+import os
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from config import EXPORTS_DIR, CHATS_PAGE_SIZE
+
+CHAT_LIST_FILENAME = "chat_list.json"
+
+# Fields of a chat information dictionary (see export_chat_list)
+CHAT_FIELDS = (
+    "id",
+    "title",
+    "type",
+    "username",
+    "participants_count",
+    "is_forum",
+    "access_hash",
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for searching (case and accent insensitive)
+
+    Args:
+        text: Original text
+
+    Returns:
+        Lowercase text without diacritics
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.casefold().strip()
+
+
+def parse_chat_link(link: str) -> Optional[Dict]:
+    """
+    Parse a chat reference into a chat information dictionary
+
+    Accepted formats: https://t.me/c/1234567890/1 (private chat),
+    https://t.me/username, @username or a bare username.
+
+    Args:
+        link: Chat link or username
+
+    Returns:
+        Chat dictionary (id 0 when only the username is known), or None
+        if link is empty
+
+    Raises:
+        ValueError: If a private chat link has no valid chat ID
+    """
+    link = link.strip()
+    if not link:
+        return None
+
+    if link.startswith("https://t.me/c/"):
+        # Private chat link: https://t.me/c/1234567890/1
+        try:
+            chat_id = int(f"-100{int(link.split('/')[4])}")
+        except (IndexError, ValueError):
+            raise ValueError(f"Link inválido: {link}")
+
+        return {
+            "id": chat_id,
+            "title": f"Chat_Link_{abs(chat_id)}",
+            "type": "Channel",
+            "username": None,
+            "participants_count": 0,
+            "is_forum": False,
+            "access_hash": None,
+        }
+
+    if link.startswith("https://t.me/"):
+        # Public chat link: https://t.me/username
+        username = link.rstrip("/").split("/")[-1]
+    else:
+        # @username or a bare username
+        username = link.lstrip("@")
+
+    if not username:
+        return None
+
+    return {
+        "id": 0,  # Will be resolved later
+        "title": f"@{username}",
+        "type": "Channel",
+        "username": username,
+        "participants_count": 0,
+        "is_forum": False,
+    }
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class ChatCatalog:
+    """
+    Chat list with hash indexes by ID and username, a sorted title index
+    for prefix search and a trigram index for substring search
+    """
+
+    def __init__(self, chats: Iterable[Dict], etag: Optional[str] = None):
+        """
+        Args:
+            chats: Chat information dictionaries (as in chat_list.json)
+            etag: Version tag of the chat list (default: hash of the chats)
+        """
+        self.chats: List[Dict] = list(chats)
+        self.etag = (
+            etag
+            or hashlib.sha1(
+                json.dumps(self.chats, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+        )
+
+        self._by_id: Dict[int, int] = {}
+        self._by_username: Dict[str, int] = {}
+        self._by_type: Dict[str, List[int]] = {}
+        self._forums: List[int] = []
+        self._titles: List[str] = []
+        self._sorted_titles: List[tuple] = []
+        self._trigram_index: Dict[str, Set[int]] = {}
+
+        for position, chat in enumerate(self.chats):
+            self._by_id[chat["id"]] = position
+
+            username = chat.get("username")
+            if username:
+                self._by_username[username.lstrip("@").casefold()] = position
+
+            self._by_type.setdefault(chat.get("type", "Unknown"), []).append(position)
+            if chat.get("is_forum"):
+                self._forums.append(position)
+
+            title = normalize_text(chat.get("title", ""))
+            self._titles.append(title)
+            self._sorted_titles.append((title, position))
+            for trigram in _trigrams(title):
+                self._trigram_index.setdefault(trigram, set()).add(position)
+
+        self._sorted_titles.sort()
+
+    def __len__(self) -> int:
+        return len(self.chats)
+
+    def get(self, chat_id: int) -> Optional[Dict]:
+        """
+        Find a chat by ID
+
+        Marked channel IDs (-100...) are also accepted.
+
+        Args:
+            chat_id: Chat ID
+
+        Returns:
+            Chat dictionary or None
+        """
+        position = self._by_id.get(chat_id)
+        if position is None and str(chat_id).startswith("-100"):
+            position = self._by_id.get(int(str(chat_id)[4:]))
+        return self.chats[position] if position is not None else None
+
+    def get_by_username(self, username: str) -> Optional[Dict]:
+        """
+        Find a chat by username (with or without @, case insensitive)
+
+        Args:
+            username: Chat username
+
+        Returns:
+            Chat dictionary or None
+        """
+        position = self._by_username.get(username.lstrip("@").casefold())
+        return self.chats[position] if position is not None else None
+
+    def count_by_type(self) -> Dict[str, int]:
+        """Return the number of chats of each type"""
+        return {chat_type: len(ids) for chat_type, ids in self._by_type.items()}
+
+    def _title_prefix_positions(self, prefix: str) -> List[int]:
+        start = bisect.bisect_left(self._sorted_titles, (prefix,))
+        positions = []
+        for title, position in self._sorted_titles[start:]:
+            if not title.startswith(prefix):
+                break
+            positions.append(position)
+        return positions
+
+    def _title_substring_positions(self, text: str) -> List[int]:
+        if len(text) < 3:
+            # Too short for trigrams, fall back to a scan
+            return [i for i, title in enumerate(self._titles) if text in title]
+
+        candidates = None
+        for trigram in _trigrams(text):
+            matches = self._trigram_index.get(trigram, set())
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        return sorted(i for i in candidates if text in self._titles[i])
+
+    def search(
+        self,
+        query: str = None,
+        chat_type: str = None,
+        is_forum: bool = None,
+        prefix_only: bool = False,
+        limit: int = None,
+    ) -> List[Dict]:
+        """
+        Search chats by title and filter by type and forum flag
+
+        Title prefix matches come first, followed by other substring
+        matches; each group keeps the chat list order.
+
+        Args:
+            query: Text to find in the title (case and accent insensitive)
+            chat_type: Only chats of this type (e.g. "Channel", "Chat")
+            is_forum: Only forum (True) or non-forum (False) chats
+            prefix_only: Match only at the start of the title
+            limit: Maximum number of results
+
+        Returns:
+            List of matching chat dictionaries
+        """
+        if query:
+            text = normalize_text(query)
+            positions = sorted(self._title_prefix_positions(text))
+            if not prefix_only:
+                seen = set(positions)
+                positions += [
+                    i for i in self._title_substring_positions(text) if i not in seen
+                ]
+        elif chat_type is not None:
+            positions = list(self._by_type.get(chat_type, []))
+        elif is_forum:
+            positions = list(self._forums)
+        else:
+            positions = list(range(len(self.chats)))
+
+        results = []
+        for position in positions:
+            chat = self.chats[position]
+            if chat_type is not None and chat.get("type") != chat_type:
+                continue
+            if is_forum is not None and bool(chat.get("is_forum")) != is_forum:
+                continue
+            results.append(chat)
+            if limit and len(results) >= limit:
+                break
+
+        return results
+
+    def _encode_cursor(self, offset: int) -> str:
+        raw = f"{self.etag}:{offset}".encode("ascii")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def _decode_cursor(self, cursor: str) -> int:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            etag, offset = base64.urlsafe_b64decode(padded).decode("ascii").split(":")
+            offset = int(offset)
+            if offset < 0:
+                raise ValueError(offset)
+        except ValueError:
+            raise ValueError("invalid_cursor")
+
+        # Offsets are only meaningful for the chat list they were made for
+        if etag != self.etag:
+            raise ValueError("cursor_expired")
+        return offset
+
+    def page(
+        self,
+        query: str = None,
+        chat_type: str = None,
+        is_forum: bool = None,
+        cursor: str = None,
+        limit: int = CHATS_PAGE_SIZE,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Dict:
+        """
+        Return one page of the chats matching the search filters
+
+        Args:
+            query: Text to find in the title (see search())
+            chat_type: Only chats of this type
+            is_forum: Only forum (True) or non-forum (False) chats
+            cursor: next_cursor of the previous page (None for the first)
+            limit: Maximum chats in the page
+            fields: Only include these fields of each chat (see CHAT_FIELDS)
+
+        Returns:
+            Dictionary with total (matches across all pages), count, chats
+            and next_cursor (None on the last page)
+
+        Raises:
+            ValueError: "invalid_cursor", "cursor_expired" (the chat list
+                changed since the cursor was issued) or "invalid_fields"
+        """
+        if fields is not None and not set(fields) <= set(CHAT_FIELDS):
+            raise ValueError("invalid_fields")
+
+        offset = self._decode_cursor(cursor) if cursor else 0
+        matches = self.search(query, chat_type=chat_type, is_forum=is_forum)
+        chats = matches[offset : offset + limit]
+        if fields is not None:
+            chats = [{field: chat.get(field) for field in fields} for chat in chats]
+
+        end = offset + len(chats)
+        return {
+            "total": len(matches),
+            "count": len(chats),
+            "chats": chats,
+            "next_cursor": self._encode_cursor(end) if end < len(matches) else None,
+        }
+
+
+_catalog_cache: Dict[str, tuple] = {}
+
+
+def load_chat_catalog(path: str = None) -> Optional[ChatCatalog]:
+    """
+    Load the catalog from the cached chat_list.json
+
+    The parsed catalog is kept in memory and only rebuilt when the file
+    changes on disk. Its etag is the SHA-1 of the file contents.
+
+    Args:
+        path: Path to chat_list.json (default: inside EXPORTS_DIR)
+
+    Returns:
+        ChatCatalog, or None if the chat list was never exported
+    """
+    path = path or os.path.join(EXPORTS_DIR, CHAT_LIST_FILENAME)
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _catalog_cache.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    catalog = ChatCatalog(json.loads(raw), etag=hashlib.sha1(raw).hexdigest())
+
+    _catalog_cache[path] = (version, catalog)
+    return catalog
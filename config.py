@@ -18,9 +18,154 @@ DEFAULT_LIMIT_PER_CHAT = 1000
 # File size limits (in bytes)
 MAX_FILE_SIZE = 1024 * 1024 * 1024  # 1GB default limit
 
+# Takeout export mode (takeout_session.py): bulk exports run through a
+# Telegram data export session with higher flood limits; Telegram asks
+# for approval in the app on the first request
+USE_TAKEOUT = False
+
 # Download settings
 ENABLE_PROGRESS_BAR = True
-CONCURRENT_DOWNLOADS = 1  # Keep at 1 to avoid rate limiting
+CONCURRENT_DOWNLOADS = 1  # Per chat; keep at 1 to avoid rate limiting
+
+# API session supervision (session_manager.py)
+SESSION_HEALTH_INTERVAL = 30  # Seconds between connection checks (ping RPC)
+SESSION_PING_TIMEOUT = 10  # Seconds without a ping answer before reconnecting
+SESSION_RECONNECT_MIN_DELAY = 1  # First retry delay after a failed reconnect
+SESSION_RECONNECT_MAX_DELAY = 60  # Backoff cap between reconnect attempts
+
+# Batch jobs (telegram_downloader.py --job spec.json)
+BATCH_CHAT_CONCURRENCY = 2  # Chats exported in parallel by default
+BATCH_SUMMARY_FILENAME = "batch_summary.json"
+
+# Distributed export (distributed.py): shared work queue and worker leases
+WORK_QUEUE_BACKEND = os.environ.get("WORK_QUEUE_BACKEND", "sqlite")
+WORK_QUEUE_PATH = os.environ.get("WORK_QUEUE_PATH", "exports/work_queue.db")
+WORK_LEASE_SECONDS = 300  # A worker must heartbeat before its lease expires
+WORK_HEARTBEAT_INTERVAL = 60
+WORK_MAX_ATTEMPTS = 3  # Failed or expired items are retried up to this many times
+WORK_RETRY_BACKOFF = 30  # Seconds before the first retry (doubles each attempt)
+WORK_POLL_INTERVAL = 5  # Idle workers check the queue this often
+WORK_RANGE_SIZE = 0  # Split chat history into ranges of N message IDs (0 = whole chat)
+
+# Export planning (export_planner.py): estimates without downloading
+PLAN_SAMPLE_SIZE = 20  # Recent media sampled per type to estimate sizes
+PLAN_THROUGHPUT_BYTES_PER_SEC = 5 * 1024 * 1024  # Assumed download rate
+
+# Verify and repair (verify_repair.py)
+REPAIR_FETCH_BATCH_SIZE = 100  # Messages fetched per request when re-downloading
+
+# Downloads whose file reference expired while queued re-fetch their messages
+REFERENCE_REFRESH_BATCH_SIZE = 100  # Message IDs per get_messages request
+REFERENCE_REFRESH_DELAY = 1.0  # Seconds spent collecting expired items per batch
+
+# Progress and error events (event_bus.py): "console", "json" and/or "metrics"
+EVENT_SINKS = [
+    name.strip()
+    for name in os.environ.get("EVENT_SINKS", "console,metrics").split(",")
+    if name.strip()
+]
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "exports/events.jsonl")
+EVENT_CONSOLE_INTERVAL = 2.0  # Seconds between aggregated progress lines
+EVENT_QUEUE_SIZE = 10000  # File progress events beyond this backlog are dropped
+
+# Album members (same grouped_id) are downloaded as one batch in one slot
+ALBUM_PARALLEL_DOWNLOADS = 3  # Parallel downloads inside an album batch
+
+# Media in other data centers is downloaded through pre-warmed senders (dc_pool.py)
+# Per data center; only reached when parallel chats share a DC, since every
+# download also needs one of the SCHEDULER_SLOTS below
+DC_MAX_CONCURRENT_DOWNLOADS = 4
+DC_WARM_RETRY_MIN_DELAY = 5  # First backoff after a failed sender warm-up (seconds)
+DC_WARM_RETRY_MAX_DELAY = 600  # Maximum backoff between warm-up attempts (seconds)
+
+# Download slots shared by all exports of the process, granted by priority
+# class (interactive > incremental > bulk; see priority_scheduler.py).
+# A single export stays at CONCURRENT_DOWNLOADS; the extra slots serve
+# chats exported in parallel (batch jobs, API requests). Set to 1 to keep
+# the whole process at one download at a time.
+SCHEDULER_SLOTS = 4
+
+# Download bandwidth cap in bytes per second (0 = unlimited), shared by
+# active chats by weight; can be changed at runtime via PUT /bandwidth
+BANDWIDTH_LIMIT = int(os.environ.get("BANDWIDTH_LIMIT", "0"))
+BANDWIDTH_BURST_SECONDS = 0.5  # Token bucket size in seconds of a chat's rate
+
+# Output layout: "files" (one file per media), "tar" or "zip" (size-capped shards)
+OUTPUT_MODE = "files"
+ARCHIVE_SHARD_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB per shard
+ARCHIVE_SPOOL_MAX_BYTES = 32 * 1024 * 1024  # Larger downloads spill to a temp file
+
+# Metadata-only export settings
+METADATA_CATALOG_FILENAME = "media_catalog.jsonl.gz"
+
+# GET /chats pagination (served from the cached chat_list.json)
+CHATS_PAGE_SIZE = 100  # Default chats per page
+CHATS_PAGE_MAX_SIZE = 1000  # Largest page a client may request
+
+# Storage backend for downloaded media: "local" or "s3" (any S3-compatible
+# service such as MinIO). Logs, records and indexes always stay local.
+# Empty variables (docker-compose passes unset ones as "") count as unset.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") or "local"
+# e.g. http://localhost:9000
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+S3_BUCKET = os.environ.get("S3_BUCKET") or "telegram-exports"
+S3_PREFIX = os.environ.get("S3_PREFIX", "")
+S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY") or None
+S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY") or None
+S3_REGION = os.environ.get("S3_REGION") or "us-east-1"
+S3_MULTIPART_PART_SIZE = 8 * 1024 * 1024  # S3 requires parts of at least 5MB
+
+# Local media files are written to a temporary name, preallocated to the
+# expected size and renamed into place when complete
+LOCAL_WRITE_BUFFER_SIZE = 4 * 1024 * 1024  # Writes are multiples of this size
+LOCAL_PREALLOCATE = True  # Reserve the expected size up front (fallocate)
+# fsync policy: "none", "file" (before every rename) or "batch" (groups of files)
+LOCAL_FSYNC_MODE = os.environ.get("LOCAL_FSYNC_MODE", "batch")
+LOCAL_FSYNC_BATCH_FILES = 64  # Committed files per batched fsync
+LOCAL_FSYNC_BATCH_SECONDS = 5.0  # Maximum age of an unsynced file
+
+# Download records (JSON Lines, one file per chat)
+DOWNLOAD_RECORDS_FILENAME = "download_records.jsonl"
+
+# Post-download processing settings (checksums, validation, media info)
+ENABLE_POST_PROCESSING = True
+POST_PROCESSORS = ["sha256", "size", "media_info"]
+POST_PROCESSING_WORKERS = 2
+POST_PROCESSING_QUEUE_SIZE = 100  # Files waiting for processing before backpressure
+POST_PROCESSING_EXECUTOR = "thread"  # "thread" or "process"
+
+# Near-duplicate detection (near_duplicates.py, requires Pillow; NumPy optional):
+# thumbnails are hashed before the full download and compared with the
+# hashes of media already downloaded
+ENABLE_NEAR_DUPLICATES = False
+NEAR_DUPLICATE_MEDIA_TYPES = ["photo"]
+NEAR_DUPLICATE_MAX_DISTANCE = 6  # Differing bits (of 64) to count as a repost
+NEAR_DUPLICATE_ACTION = "skip"  # "skip" or "defer" (download after the rest)
+NEAR_DUPLICATE_INDEX_PATH = "exports/near_duplicates.jsonl"
+
+# Message index (message_index.py, requires SQLite with FTS5): full-text
+# search over the text, captions, file names and senders of exported
+# messages, linked to the downloaded files
+ENABLE_MESSAGE_INDEX = False
+MESSAGE_INDEX_PATH = "exports/message_index.db"
+MESSAGE_INDEX_BATCH_SIZE = 500  # Buffered writes per transaction
+MESSAGE_INDEX_RANK_CANDIDATES = 10000  # Newest matches ranked per search
+
+# Trace recording (trace_replay.py): set to a file path to append an
+# anonymized trace of every export (RPC timings, page and media sizes,
+# data centers, flood waits) that can be replayed offline
+TRACE_RECORD_PATH = os.environ.get("TRACE_RECORD_PATH")
+
+# Startup settings: maximum time to import the API module (checked by test_setup.py)
+IMPORT_TIME_BUDGET_SECONDS = 1.0
+
+# Watch mode settings (live download of new media)
+WATCH_STATE_FILENAME = "watch_state.json"
+WATCH_RECONNECT_MAX_DELAY = 300  # Maximum backoff between reconnect attempts (seconds)
+WATCH_CATCH_UP_INTERVAL = (
+    0  # Optional periodic catch-up pass in seconds (0 = only on reconnect)
+)
+WATCH_MAX_ATTEMPTS = 5  # Download attempts per message before giving up
 
 # Supported media types
 SUPPORTED_MEDIA_TYPES = ["photo", "video", "document", "audio", "voice", "sticker"]
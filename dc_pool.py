@@ -0,0 +1,155 @@
+"""
+Data center sender pool module for Telegram Media Downloader
+Keeps authorized connections to the data centers that store media open
+across chats and jobs, and limits concurrent downloads per data center
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Dict, Iterable, Optional
+
+from config import (
+    DC_MAX_CONCURRENT_DOWNLOADS,
+    DC_WARM_RETRY_MIN_DELAY,
+    DC_WARM_RETRY_MAX_DELAY,
+)
+from event_bus import emit, ErrorEvent
+
+
+class DCSenderPool:
+    """
+    Pre-warmed download senders, one per foreign data center
+
+    Media stored outside the account's home DC is downloaded through an
+    exported sender that Telethon authorizes on first use and disconnects
+    again once nobody borrows it. The pool borrows one sender per DC and
+    holds it, so the authorization happens once (ahead of time when the
+    DCs are known) and download_file reuses the open connection. A DC
+    whose warm-up failed is not retried before an exponential backoff
+    delay, so every queued media of that DC does not retry it at once.
+    """
+
+    def __init__(self, client, max_concurrent: int = DC_MAX_CONCURRENT_DOWNLOADS):
+        """
+        Args:
+            client: Telegram client
+            max_concurrent: Maximum simultaneous downloads per data center
+        """
+        self.client = client
+        self.max_concurrent = max_concurrent
+
+        self._senders: Dict[int, object] = {}
+        self._warming: Dict[int, asyncio.Task] = {}
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._failures: Dict[int, int] = {}
+        self._retry_at: Dict[int, float] = {}
+
+    @property
+    def home_dc(self) -> Optional[int]:
+        session = getattr(self.client, "session", None)
+        return getattr(session, "dc_id", None)
+
+    def semaphore(self, dc_id: Optional[int]) -> asyncio.Semaphore:
+        """Return the download slot semaphore of a data center"""
+        if dc_id not in self._semaphores:
+            self._semaphores[dc_id] = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphores[dc_id]
+
+    def _held(self, dc_id: int) -> bool:
+        """
+        Whether a connected sender of dc_id is held
+
+        Telethon disconnects and forgets its exported senders whenever the
+        client disconnects (reconnects included), so a held sender that is
+        no longer connected is dropped and the DC gets warmed again.
+        """
+        sender = self._senders.get(dc_id)
+        if sender is None:
+            return False
+        is_connected = getattr(sender, "is_connected", None)
+        if is_connected is not None and not is_connected():
+            del self._senders[dc_id]
+            return False
+        return True
+
+    async def _warm(self, dc_id: int) -> None:
+        try:
+            # Telethon keeps borrowed senders connected and shares them
+            self._senders[dc_id] = await self.client._borrow_exported_sender(dc_id)
+            self._failures.pop(dc_id, None)
+            self._retry_at.pop(dc_id, None)
+        except Exception as e:
+            failures = self._failures.get(dc_id, 0) + 1
+            self._failures[dc_id] = failures
+            delay = min(
+                DC_WARM_RETRY_MIN_DELAY * 2 ** (failures - 1), DC_WARM_RETRY_MAX_DELAY
+            )
+            self._retry_at[dc_id] = time.monotonic() + delay
+            emit(ErrorEvent(f"dc_pool:{dc_id}", f"{e} (nova tentativa em {delay}s)"))
+        finally:
+            self._warming.pop(dc_id, None)
+
+    def ensure_warm(self, dc_id: Optional[int]) -> Optional[asyncio.Task]:
+        """
+        Start authorizing a sender for dc_id in the background if needed
+
+        Args:
+            dc_id: Data center of some media (None or the home DC is a no-op)
+
+        Returns:
+            The warm-up task, or None if nothing has to be done (or a
+            failed warm-up of dc_id is still backing off)
+        """
+        if (
+            dc_id is None
+            or dc_id == self.home_dc
+            or self._held(dc_id)
+            or not hasattr(self.client, "_borrow_exported_sender")
+            or time.monotonic() < self._retry_at.get(dc_id, 0)
+        ):
+            return None
+
+        if dc_id not in self._warming:
+            self._warming[dc_id] = asyncio.create_task(self._warm(dc_id))
+        return self._warming[dc_id]
+
+    async def prewarm(self, dc_ids: Iterable[Optional[int]]) -> None:
+        """Authorize senders for all the given data centers"""
+        tasks = [task for task in map(self.ensure_warm, set(dc_ids)) if task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def warm_dcs(self):
+        """Data centers with a held sender"""
+        return sorted(dc_id for dc_id in list(self._senders) if self._held(dc_id))
+
+    async def close(self) -> None:
+        """Give the held senders back to Telethon (idle ones are then closed)"""
+        for task in list(self._warming.values()):
+            task.cancel()
+        for sender in self._senders.values():
+            try:
+                await self.client._return_exported_sender(sender)
+            except Exception:
+                pass
+        self._senders = {}
+
+
+_pools: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_dc_pool(client) -> DCSenderPool:
+    """Return the sender pool of a client, shared by every pipeline"""
+    pool = _pools.get(client)
+    if pool is None:
+        pool = _pools[client] = DCSenderPool(client)
+    return pool
+
+
+async def close_dc_pool(client) -> None:
+    """Give back the senders held for a client; call before disconnecting it"""
+    pool = _pools.pop(client, None)
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,368 @@
+"""
+Distributed export module for Telegram Media Downloader
+A coordinator splits a job spec into work items (whole chats or ranges
+of their history) on a shared work queue; any number of worker
+processes, each with its own Telegram session, lease and run them
+
+Usage:
+    python distributed.py enqueue job.json [--range-size N]
+    python distributed.py worker [--session NAME] [--keep-running]
+    python distributed.py status
+"""
+
+import asyncio
+import os
+import socket
+from typing import Dict, List, Optional
+
+from config import (
+    SESSION_NAME,
+    WORK_LEASE_SECONDS,
+    WORK_HEARTBEAT_INTERVAL,
+    WORK_POLL_INTERVAL,
+    WORK_RANGE_SIZE,
+)
+from batch_jobs import compile_job_plan, load_job_spec
+from chat_catalog import load_chat_catalog
+from dc_pool import close_dc_pool
+from work_queue import DONE, FAILED, WorkQueue, get_work_queue
+
+
+async def _call(func, *args):
+    # Queue backends may block (SQLite waits on other writers)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+def split_history(top_id: int, limit: int, range_size: int) -> List[tuple]:
+    """
+    Split the newest message IDs of a chat into ranges
+
+    Args:
+        top_id: ID of the newest message of the chat
+        limit: Number of newest message IDs to cover
+        range_size: Message IDs per range
+
+    Returns:
+        List of (min_id, max_id) pairs, both exclusive as in iter_messages
+    """
+    ranges = []
+    low = max(0, top_id - limit)
+    while low < top_id:
+        high = min(low + range_size, top_id)
+        ranges.append((low, high + 1))
+        low = high
+    return ranges
+
+
+async def build_work_items(plan: Dict, range_size: int = WORK_RANGE_SIZE) -> List[Dict]:
+    """
+    Turn an execution plan into work item payloads
+
+    Chats exported as individual files are split into history ranges of
+    range_size message IDs, so several workers can share one large chat.
+    Archive and metadata-only exports stay one item per chat, since their
+    output (shards, catalog) is written by a single process.
+
+    Args:
+        plan: Plan from batch_jobs.compile_job_plan
+        range_size: Message IDs per range (0 = one item per chat)
+
+    Returns:
+        List of work item payloads
+    """
+    from telethon_handlers import connect_saved_session, get_chat_entity_safe
+
+    client = None
+    payloads = []
+
+    try:
+        for task in plan["tasks"]:
+            payload = {
+                "chat": task["chat"],
+                "limit": task["limit"],
+                "media_types": task["media_types"],
+                "output_mode": task["output_mode"],
+                "metadata_only": task["metadata_only"],
+                "bandwidth_weight": task["bandwidth_weight"],
+                "downloads_per_chat": plan["downloads_per_chat"],
+                "min_id": 0,
+                "max_id": 0,
+            }
+
+            splittable = task["output_mode"] == "files" and not task["metadata_only"]
+            if not range_size or not splittable:
+                payloads.append(payload)
+                continue
+
+            # The newest message ID bounds the ranges
+            if client is None:
+                client = await connect_saved_session()
+                if client is None:
+                    raise RuntimeError("Nenhuma sessão autorizada para o coordenador")
+
+            entity = await get_chat_entity_safe(client, task["chat"])
+            latest = await client.get_messages(entity, limit=1) if entity else None
+            if not latest:
+                payloads.append(payload)
+                continue
+
+            for min_id, max_id in split_history(
+                latest[0].id, task["limit"], range_size
+            ):
+                payloads.append(
+                    {**payload, "limit": None, "min_id": min_id, "max_id": max_id}
+                )
+    finally:
+        if client is not None:
+            await client.disconnect()
+
+    return payloads
+
+
+async def enqueue_job(
+    spec_path: str, queue: WorkQueue, range_size: int = WORK_RANGE_SIZE
+) -> int:
+    """
+    Compile a job spec and put its work items on the queue
+
+    Args:
+        spec_path: Path to the JSON job spec (see batch_jobs)
+        queue: Shared work queue
+        range_size: Message IDs per history range (0 = one item per chat)
+
+    Returns:
+        Number of work items added
+    """
+    plan = compile_job_plan(load_job_spec(spec_path), load_chat_catalog())
+    payloads = await build_work_items(plan, range_size)
+    count = queue.put(payloads)
+
+    print(
+        f"📬 {count} itens de trabalho adicionados à fila ({len(plan['tasks'])} chats)"
+    )
+    return count
+
+
+async def run_work_item(client, payload: Dict, final_attempt: bool = False) -> Dict:
+    """
+    Export the chat (or history range) described by a work item
+
+    Media already in the download records of the chat (stored by an
+    earlier attempt) are skipped, so a retry only downloads what failed.
+
+    Args:
+        client: Authenticated Telegram client of the worker
+        payload: Work item payload from build_work_items
+        final_attempt: Complete the item even if some downloads failed,
+            listing them in the result, instead of retrying it again
+
+    Returns:
+        Result dictionary stored with the completed item (chat_id, files
+        and, for downloads, recorded and failed_ids)
+
+    Raises:
+        RuntimeError: If the chat is not accessible or, before the final
+            attempt, some downloads failed, so the item is retried
+    """
+    from bandwidth import get_bandwidth_shaper
+    from trace_replay import trace_chat
+    from telethon_handlers import (
+        get_chat_entity_safe,
+        export_media_organized,
+        export_media_metadata,
+    )
+
+    trace_chat(client)
+    entity = await get_chat_entity_safe(client, payload["chat"])
+    if not entity:
+        raise RuntimeError("chat_not_accessible")
+
+    # Items queued before weights existed have none
+    get_bandwidth_shaper().set_weight(entity.id, payload.get("bandwidth_weight", 1))
+
+    if payload["metadata_only"]:
+        files = await export_media_metadata(
+            client, entity, payload["limit"], payload["media_types"]
+        )
+    else:
+        stats = {}
+        files = await export_media_organized(
+            client,
+            entity,
+            payload["limit"],
+            payload["output_mode"],
+            payload["media_types"],
+            payload["downloads_per_chat"],
+            payload["min_id"],
+            payload["max_id"],
+            stats=stats,
+            skip_recorded=True,
+        )
+        if stats["failed"] and not final_attempt:
+            raise RuntimeError(f"{stats['failed']} downloads falharam")
+        return {
+            "chat_id": entity.id,
+            "files": files,
+            "recorded": stats["recorded"],
+            "failed_ids": stats["failed_ids"],
+        }
+
+    return {"chat_id": entity.id, "files": files}
+
+
+async def _process_leased_item(
+    client,
+    queue: WorkQueue,
+    item: Dict,
+    worker_id: str,
+    lease_seconds: float,
+    heartbeat_interval: float,
+) -> bool:
+    """Run one leased item, renewing the lease until it finishes"""
+    # Media that keep failing (e.g. deleted messages) must not fail the range
+    final_attempt = item["attempts"] >= item["max_attempts"]
+    task = asyncio.create_task(run_work_item(client, item["payload"], final_attempt))
+
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=heartbeat_interval)
+        if done:
+            break
+
+        if not await _call(queue.heartbeat, item["id"], worker_id, lease_seconds):
+            # The lease expired and the item may already run elsewhere
+            print(f"⚠️ Lease do item {item['id']} perdido - abandonando")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return False
+
+    try:
+        result = task.result()
+    except Exception as e:
+        print(f"❌ Item {item['id']} falhou (tentativa {item['attempts']}): {e}")
+        await _call(queue.fail, item["id"], worker_id, str(e))
+        return False
+
+    if result.get("failed_ids"):
+        print(
+            f"⚠️ Item {item['id']} concluído com {len(result['failed_ids'])} "
+            f"downloads falhos: {result['failed_ids']}"
+        )
+    await _call(queue.complete, item["id"], worker_id, result)
+    return True
+
+
+async def run_worker(
+    queue: WorkQueue,
+    session_name: str = SESSION_NAME,
+    worker_id: Optional[str] = None,
+    lease_seconds: float = WORK_LEASE_SECONDS,
+    heartbeat_interval: float = WORK_HEARTBEAT_INTERVAL,
+    poll_interval: float = WORK_POLL_INTERVAL,
+    keep_running: bool = False,
+) -> int:
+    """
+    Lease and run work items until the queue is finished
+
+    Args:
+        queue: Shared work queue
+        session_name: Telegram session of this worker (one account per worker)
+        worker_id: Unique worker name (default: host:pid:session)
+        lease_seconds: Lease duration; renewed every heartbeat_interval
+        heartbeat_interval: Seconds between lease renewals
+        poll_interval: Seconds between queue checks while idle
+        keep_running: Keep polling for new items after the queue empties
+
+    Returns:
+        Number of items completed by this worker
+    """
+    from telethon_handlers import connect_saved_session
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{session_name}"
+
+    client = await connect_saved_session(session_name)
+    if client is None:
+        print(f"❌ Sessão '{session_name}' não autorizada. Faça login antes.")
+        return 0
+
+    completed = 0
+    print(f"👷 Worker {worker_id} iniciado")
+
+    try:
+        # Fill the entity cache so chats resolve by ID for this account
+        await client.get_dialogs()
+
+        while True:
+            item = await _call(queue.lease, worker_id, lease_seconds)
+            if item is None:
+                if not keep_running and await _call(queue.is_finished):
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+
+            print(f"📦 Item {item['id']}: {item['payload']['chat']['title']}")
+            if await _process_leased_item(
+                client, queue, item, worker_id, lease_seconds, heartbeat_interval
+            ):
+                completed += 1
+    finally:
+        await close_dc_pool(client)
+        await client.disconnect()
+
+    print(f"🏁 Worker {worker_id} encerrado - {completed} itens concluídos")
+    return completed
+
+
+def print_queue_status(queue: WorkQueue) -> None:
+    """Display item counts per state and the errors of failed items"""
+    counts = queue.stats()
+    print("📊 Fila de trabalho:")
+    for status in ("pending", "leased", "done", "failed"):
+        print(f"   - {status}: {counts.get(status, 0)}")
+
+    for item in queue.items(FAILED):
+        print(
+            f"❌ Item {item['id']} ({item['payload']['chat']['title']}): {item['error']}"
+        )
+    for item in queue.items(DONE):
+        failed_ids = (item["result"] or {}).get("failed_ids")
+        if failed_ids:
+            print(
+                f"⚠️ Item {item['id']} ({item['payload']['chat']['title']}): "
+                f"mensagens não baixadas {failed_ids}"
+            )
+
+
+def _option(args: List[str], name: str, default=None):
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    command = args[0] if args else None
+    try:
+        work_queue = get_work_queue(_option(args, "--queue"))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if command == "enqueue" and len(args) > 1:
+        range_size = int(_option(args, "--range-size", WORK_RANGE_SIZE))
+        asyncio.run(enqueue_job(args[1], work_queue, range_size))
+    elif command == "worker":
+        asyncio.run(
+            run_worker(
+                work_queue,
+                _option(args, "--session", SESSION_NAME),
+                keep_running="--keep-running" in args,
+            )
+        )
+    elif command == "status":
+        print_queue_status(work_queue)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,1001 @@
+"""
+Download pipeline module for Telegram Media Downloader
+Classifies messages into the organized export layout and runs their
+downloads, shared by full exports and watch mode
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    EXPORTS_DIR,
+    MAX_FILE_SIZE,
+    CONCURRENT_DOWNLOADS,
+    DOWNLOAD_RECORDS_FILENAME,
+    ENABLE_POST_PROCESSING,
+    OUTPUT_MODE,
+    ARCHIVE_SPOOL_MAX_BYTES,
+    ALBUM_PARALLEL_DOWNLOADS,
+    REFERENCE_REFRESH_BATCH_SIZE,
+    REFERENCE_REFRESH_DELAY,
+    ENABLE_NEAR_DUPLICATES,
+    NEAR_DUPLICATE_MEDIA_TYPES,
+    NEAR_DUPLICATE_MAX_DISTANCE,
+    NEAR_DUPLICATE_ACTION,
+    ENABLE_MESSAGE_INDEX,
+)
+from file_utils import (
+    sanitize_filename,
+    create_media_directories,
+    ensure_directories_exist,
+    get_media_type_name,
+    generate_filename,
+    write_download_log,
+    format_file_size,
+    build_media_record,
+    write_download_record,
+    load_download_records,
+)
+from event_bus import emit, ErrorEvent, FileDone, FileQueued, FileSkipped, FloodWait
+from archive_store import ARCHIVE_FORMATS, ShardedArchiveWriter
+from dc_pool import get_dc_pool
+from bandwidth import get_bandwidth_shaper
+from priority_scheduler import SchedulerSlot, get_scheduler, priority_level
+import near_duplicates
+import message_index
+from storage import get_storage_backend
+from post_processing import PostProcessor
+from takeout_session import is_takeout_error
+
+# Album member result of a near-duplicate that was not downloaded
+_HELD = object()
+
+
+def resolve_message_topic(
+    message, topics: Dict[int, str]
+) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Determine the forum topic a message belongs to
+
+    Args:
+        message: Telethon message object
+        topics: Dictionary mapping topic ID to topic name
+
+    Returns:
+        Tuple of (topic_id, topic_name), both None if not in a topic
+    """
+    if (
+        topics
+        and hasattr(message, "reply_to")
+        and message.reply_to
+        and hasattr(message.reply_to, "reply_to_top_id")
+    ):
+        top_msg_id = message.reply_to.reply_to_top_id
+        if top_msg_id in topics:
+            return top_msg_id, topics[top_msg_id]
+
+    return None, None
+
+
+def get_chat_base_dir(chat_info) -> str:
+    """
+    Get the export directory of a chat
+
+    Args:
+        chat_info: Chat entity
+
+    Returns:
+        Path "{EXPORTS_DIR}/{ChatName}_{ChatID}"
+    """
+    chat_name = getattr(chat_info, "title", f"Chat_{chat_info.id}")
+    return os.path.join(EXPORTS_DIR, f"{sanitize_filename(chat_name)}_{chat_info.id}")
+
+
+def get_media_location(message) -> Tuple[Optional[int], Optional[object]]:
+    """
+    Build the input file location of a photo or document message
+
+    For photos the largest size is used, as download_media does.
+
+    Args:
+        message: Telethon message object with media
+
+    Returns:
+        Tuple of (dc_id, input location), or (None, None) for other media
+    """
+    from telethon.tl.types import InputDocumentFileLocation, InputPhotoFileLocation
+
+    document = getattr(message, "document", None)
+    if document is not None and getattr(document, "access_hash", None) is not None:
+        return document.dc_id, InputDocumentFileLocation(
+            id=document.id,
+            access_hash=document.access_hash,
+            file_reference=document.file_reference,
+            thumb_size="",
+        )
+
+    photo = getattr(message, "photo", None)
+    if photo is not None and getattr(photo, "sizes", None):
+        largest, largest_size = None, -1
+        for photo_size in photo.sizes:
+            # Stripped and cached sizes are inline thumbnails, not files
+            if getattr(photo_size, "size", None):
+                byte_count = photo_size.size
+            elif getattr(photo_size, "sizes", None):
+                byte_count = max(photo_size.sizes)
+            else:
+                continue
+            if byte_count > largest_size:
+                largest, largest_size = photo_size, byte_count
+
+        if largest is not None:
+            return photo.dc_id, InputPhotoFileLocation(
+                id=photo.id,
+                access_hash=photo.access_hash,
+                file_reference=photo.file_reference,
+                thumb_size=largest.type,
+            )
+
+    return None, None
+
+
+class DownloadDescriptor:
+    """
+    Everything a scheduled download needs, without the Telethon message
+
+    Messages carry text, entities, reply headers and raw TL objects;
+    keeping only this descriptor until the download runs lets them be
+    freed right after classification. The download record is built
+    up front, since it is derived from the message too.
+    """
+
+    __slots__ = (
+        "message_id",
+        "date",
+        "media_type",
+        "size",
+        "dc_id",
+        "location",
+        "media",
+        "filepath",
+        "filename",
+        "topic_name",
+        "album_id",
+        "record",
+        "thumb",
+        "phash",
+        "original",
+        "reserved",
+    )
+
+    def __init__(
+        self,
+        message_id: int,
+        date,
+        media_type: str,
+        size: int,
+        dc_id: Optional[int],
+        location,
+        media,
+        filepath: str,
+        filename: str,
+        topic_name: Optional[str],
+        album_id: Optional[int],
+        record: Dict,
+        thumb: Optional[Tuple] = None,
+    ):
+        self.message_id = message_id
+        self.date = date
+        self.media_type = media_type
+        self.size = size
+        self.dc_id = dc_id
+        self.location = location
+        self.media = media
+        self.filepath = filepath
+        self.filename = filename
+        self.topic_name = topic_name
+        self.album_id = album_id
+        self.record = record
+        # Thumbnail source and perceptual hash for near-duplicate detection;
+        # original is the earlier copy found (path or pending future) and
+        # reserved tells whether this download holds a pending hash
+        self.thumb = thumb
+        self.phash: Optional[int] = None
+        self.original = None
+        self.reserved = False
+
+
+class MessageRefresher:
+    """
+    Re-fetches messages of one chat in batches
+
+    Every refresh() requested within REFERENCE_REFRESH_DELAY of the first
+    one (or until the batch is full) shares a single get_messages request,
+    so a wave of expired file references costs one RPC per 100 messages.
+    """
+
+    def __init__(
+        self,
+        client,
+        entity,
+        batch_size: int = REFERENCE_REFRESH_BATCH_SIZE,
+        delay: float = REFERENCE_REFRESH_DELAY,
+    ):
+        self.client = client
+        self.entity = entity
+        self.batch_size = batch_size
+        self.delay = delay
+
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def refresh(self, message_id: int):
+        """
+        Fetch a message again
+
+        Args:
+            message_id: Message ID
+
+        Returns:
+            The fresh message, or None if it no longer exists
+        """
+        future = self._pending.get(message_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[message_id] = future
+
+            if len(self._pending) >= self.batch_size:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                # Take the batch now: refreshes requested before the flush
+                # task runs start the next one
+                batch, self._pending = self._pending, {}
+                flush = asyncio.create_task(self._flush(batch))
+                self._flushes.add(flush)
+                flush.add_done_callback(self._flushes.discard)
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        self._timer = None
+        batch, self._pending = self._pending, {}
+        await self._flush(batch)
+
+    async def _flush(self, batch: Dict[int, asyncio.Future]) -> None:
+        try:
+            messages = await self.client.get_messages(self.entity, ids=list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+
+        for future, message in zip(batch.values(), messages):
+            future.set_result(message)
+
+
+class ChatDownloadPipeline:
+    """
+    Organized download pipeline for a single chat
+
+    Owns the directory layout, logs, download records, archive shards and
+    post-processing stage of a chat. Messages are handed to enqueue(),
+    which classifies them into a DownloadDescriptor and schedules its
+    download; drain() waits for everything scheduled so far. Downloads
+    also take a slot of the process-wide priority scheduler and of their
+    data center in the client's DC sender pool, and their chunks are paced
+    by the bandwidth shaper with the chat as flow key.
+    Items whose file reference expired while queued are re-fetched in
+    batches and retried once. With ENABLE_NEAR_DUPLICATES, reposts whose
+    thumbnail hash matches an earlier download are skipped or deferred;
+    reposts of a copy still downloading are decided once it is stored.
+    With ENABLE_MESSAGE_INDEX, stored paths are linked in the message index.
+    With skip_recorded, media that already have a download record in the
+    chat directory are not downloaded again.
+    """
+
+    def __init__(
+        self,
+        client,
+        chat_info,
+        topics: Dict[int, str],
+        output_mode: str = OUTPUT_MODE,
+        concurrency: int = CONCURRENT_DOWNLOADS,
+        media_types: Optional[Iterable[str]] = None,
+        priority: str = "bulk",
+        skip_recorded: bool = False,
+    ):
+        """
+        Args:
+            client: Telegram client
+            chat_info: Resolved chat entity
+            topics: Dictionary mapping forum topic ID to topic name
+            output_mode: "files", "tar" or "zip"
+            concurrency: Maximum simultaneous downloads for this chat
+            media_types: Only download these media types (default: all)
+            priority: "interactive", "incremental" or "bulk" (see
+                priority_scheduler.PRIORITIES)
+            skip_recorded: Skip messages already in the download records
+                (e.g. when a failed export is retried)
+        """
+        self.client = client
+        self.chat_info = chat_info
+        self.topics = topics
+        self.output_mode = output_mode
+        self.media_types = set(media_types) if media_types else None
+        self.priority = priority
+        priority_level(priority)  # Fail early on unknown classes
+
+        self.base_dir = get_chat_base_dir(chat_info)
+        self.log_file = os.path.join(self.base_dir, "download_log.txt")
+        self.records_file = os.path.join(self.base_dir, DOWNLOAD_RECORDS_FILENAME)
+
+        # Archive mode stores media in shards instead of one file per media
+        self.use_archive = output_mode in ARCHIVE_FORMATS
+        self.archive_dir = os.path.join(self.base_dir, "pacotes")
+        self.storage = get_storage_backend()
+        self.dc_pool = get_dc_pool(client)
+        self.bandwidth = get_bandwidth_shaper()
+        self.scheduler = get_scheduler()
+
+        self.near_duplicates = None
+        if ENABLE_NEAR_DUPLICATES:
+            if near_duplicates.is_available():
+                self.near_duplicates = near_duplicates.get_near_duplicate_index()
+            else:
+                print(
+                    "⚠️ Pillow não instalado: detecção de quase duplicadas desativada"
+                )
+        self.message_index = None
+        if ENABLE_MESSAGE_INDEX:
+            if message_index.is_available():
+                self.message_index = message_index.get_message_index()
+            else:
+                print("⚠️ SQLite sem FTS5: índice de mensagens desativado")
+        self.refresher = MessageRefresher(client, chat_info)
+
+        # Counters
+        self.downloaded_count = 0
+        self.failed_count = 0
+        self.failed_ids: List[int] = []
+        self.recorded_count = 0
+        self.near_duplicate_count = 0
+        self.topic_counts: Dict[str, int] = {}
+        # First takeout error of a file request; the export is redone by the caller
+        self.takeout_error: Optional[Exception] = None
+
+        self._main_media_dirs = create_media_directories(self.base_dir)
+        self._topic_media_dirs: Dict[int, Dict[str, str]] = {}
+        self._archive_writers: Dict[Optional[str], ShardedArchiveWriter] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._post_processor: Optional[PostProcessor] = None
+        self._deferred: List[DownloadDescriptor] = []
+        self._awaiting: List[Tuple[DownloadDescriptor, asyncio.Future]] = []
+        # Records without a chat_id only hold post-processing results
+        self._recorded_ids: Set[int] = (
+            {
+                message_id
+                for message_id, record in load_download_records(
+                    self.records_file
+                ).items()
+                if "chat_id" in record
+            }
+            if skip_recorded
+            else set()
+        )
+
+    async def start(self) -> None:
+        """Create the directory structure and start post-processing"""
+        if not self.use_archive:
+            ensure_directories_exist(self._main_media_dirs)
+
+        # Topic-specific directories (if forum)
+        for topic_id, topic_name in self.topics.items():
+            topic_dirs = create_media_directories(self.base_dir, topic_name)
+            self._topic_media_dirs[topic_id] = topic_dirs
+            if not self.use_archive:
+                ensure_directories_exist(topic_dirs)
+
+        os.makedirs(self.base_dir, exist_ok=True)
+
+        # Post-processing stage (checksums, validation) runs off the event loop
+        if ENABLE_POST_PROCESSING:
+            self._post_processor = PostProcessor()
+            await self._post_processor.start()
+
+    def classify(
+        self, message, album_id: int = None
+    ) -> Optional[Tuple[str, str, int, str]]:
+        """
+        Compute where the media of a message is stored
+
+        Args:
+            message: Telethon message object
+            album_id: grouped_id of the album the message belongs to
+
+        Returns:
+            Tuple of (filepath, filename, topic_id, topic_name), or None if
+            the message has no media, is of a filtered out media type or
+            exceeds MAX_FILE_SIZE
+        """
+        if message.media is None:
+            return None
+
+        media_type = get_media_type_name(message)
+        if self.media_types is not None and media_type not in self.media_types:
+            return None
+
+        # Determine message topic (if applicable)
+        topic_id, topic_name = resolve_message_topic(message, self.topics)
+        current_dirs = self._main_media_dirs
+        if topic_id is not None:
+            current_dirs = self._topic_media_dirs.get(topic_id, self._main_media_dirs)
+
+        # Determine target directory
+        target_dir = current_dirs.get(media_type, current_dirs["other"])
+
+        # Generate filename
+        filename = generate_filename(message, topic_name, album_id)
+        filepath = os.path.join(target_dir, filename)
+
+        # Skip if document size exceeds limit
+        if (
+            hasattr(message, "document")
+            and hasattr(message.document, "size")
+            and message.document.size
+            and message.document.size > MAX_FILE_SIZE
+        ):
+            size_str = format_file_size(message.document.size)
+            emit(
+                FileSkipped(
+                    self.chat_info.id,
+                    message.id,
+                    filename,
+                    f"Tamanho excede o limite ({size_str})",
+                )
+            )
+            return None
+
+        return filepath, filename, topic_id, topic_name
+
+    def describe(self, message, album_id: int = None) -> Optional[DownloadDescriptor]:
+        """
+        Classify a message and extract what its download needs
+
+        Args:
+            message: Telethon message object
+            album_id: grouped_id of the album the message belongs to
+
+        Returns:
+            DownloadDescriptor, or None if nothing should be downloaded
+        """
+        if message.id in self._recorded_ids:
+            self.recorded_count += 1
+            return None
+
+        target = self.classify(message, album_id)
+        if target is None:
+            return None
+
+        filepath, filename, topic_id, topic_name = target
+        record = build_media_record(message, filename, topic_id, topic_name)
+        record["chat_id"] = self.chat_info.id
+        if album_id is not None:
+            record["album_id"] = album_id
+
+        dc_id, location = get_media_location(message)
+        # Authorize the media's data center while earlier downloads run
+        self.dc_pool.ensure_warm(dc_id)
+
+        descriptor = DownloadDescriptor(
+            message.id,
+            message.date,
+            record["media_type"],
+            record["size"],
+            dc_id,
+            location,
+            # Only needed for media without a file location (rare)
+            None if location is not None else message.media,
+            filepath,
+            filename,
+            topic_name,
+            album_id,
+            record,
+            (
+                near_duplicates.get_thumbnail_source(message)
+                if self.near_duplicates is not None
+                and record["media_type"] in NEAR_DUPLICATE_MEDIA_TYPES
+                else None
+            ),
+        )
+        if descriptor.thumb is not None and descriptor.thumb[0] == "inline":
+            # Inline thumbnails cost no request: claim the hash right away
+            # so reposts queued after this message see it as pending
+            self._set_hash(descriptor, descriptor.thumb[1])
+        return descriptor
+
+    def enqueue(self, message, album_id: int = None) -> Optional[asyncio.Task]:
+        """
+        Classify a message and schedule the download of its media
+
+        Only a compact descriptor is kept, so the message can be freed
+        as soon as this returns.
+
+        Args:
+            message: Telethon message object
+            album_id: grouped_id when re-downloading a single album member
+
+        Returns:
+            The scheduled download task, or None if nothing was scheduled
+        """
+        descriptor = self.describe(message, album_id)
+        if descriptor is None:
+            return None
+
+        self._init_topic_counter(descriptor.topic_name)
+        self._emit_queued(descriptor)
+        return self._schedule(self._download_and_log(descriptor))
+
+    def enqueue_album(self, messages: List) -> Optional[asyncio.Task]:
+        """
+        Schedule the members of an album (same grouped_id) as one batch
+
+        Members share an "album{grouped_id}" filename prefix, are
+        downloaded in parallel inside a single download slot and are
+        logged as one unit.
+
+        Args:
+            messages: Telethon messages of the album, in chronological order
+
+        Returns:
+            The scheduled batch task, or None if no member has media
+        """
+        grouped_id = messages[0].grouped_id
+        descriptors = []
+        for message in messages:
+            descriptor = self.describe(message, album_id=grouped_id)
+            if descriptor is not None:
+                self._init_topic_counter(descriptor.topic_name)
+                self._emit_queued(descriptor)
+                descriptors.append(descriptor)
+
+        if not descriptors:
+            return None
+
+        return self._schedule(self._download_album(grouped_id, descriptors))
+
+    def _emit_queued(self, descriptor: DownloadDescriptor) -> None:
+        emit(
+            FileQueued(
+                self.chat_info.id,
+                descriptor.message_id,
+                descriptor.filename,
+                descriptor.size,
+            )
+        )
+
+    def _init_topic_counter(self, topic_name: Optional[str]) -> None:
+        if topic_name is not None and topic_name not in self.topic_counts:
+            self.topic_counts[topic_name] = 0
+
+    def _schedule(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+
+        if task.cancelled():
+            return
+
+        error = task.exception()
+        if error is not None:
+            emit(ErrorEvent("download", str(error), self.chat_info.id))
+            self._note_takeout_error(error)
+            self.failed_count += 1
+            return
+
+        # Tasks return (topic_name, downloaded, failed)
+        topic_name, downloaded, failed = task.result()
+        self.downloaded_count += downloaded
+        self.failed_count += failed
+        if topic_name:
+            self.topic_counts[topic_name] += downloaded
+
+    def _note_takeout_error(self, error: BaseException) -> None:
+        if self.takeout_error is None and is_takeout_error(error):
+            self.takeout_error = error
+
+    @property
+    def pending_count(self) -> int:
+        """Number of scheduled downloads that have not finished"""
+        return len(self._tasks)
+
+    async def drain(self) -> None:
+        """Wait for every download scheduled so far"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Wait for downloads and post-processing, then release resources"""
+        await self.drain()
+
+        # Reposts of media that were still downloading are decided now, and
+        # deferred near-duplicates go last, once unique media is downloaded
+        while self._awaiting or self._deferred:
+            if self._awaiting:
+                awaiting, self._awaiting = self._awaiting, []
+                for descriptor, pending in awaiting:
+                    # Copies of this chat are done; other chats' finish on their own
+                    await pending
+                    descriptor.original = self._claim_hash(descriptor)
+                    self._schedule(self._download_and_log(descriptor))
+            else:
+                deferred, self._deferred = self._deferred, []
+                for descriptor in deferred:
+                    self._schedule(self._download_and_log(descriptor))
+            await self.drain()
+
+        # Wait for pending post-processing to finish
+        if self._post_processor:
+            await self._post_processor.close()
+            self._post_processor = None
+
+        await self.storage.sync()
+        if self.message_index is not None:
+            self.message_index.flush()
+
+        for writer in self._archive_writers.values():
+            writer.close()
+        self._archive_writers = {}
+
+    def _get_archive_writer(self, topic_name: Optional[str]) -> ShardedArchiveWriter:
+        # One shard series per chat, or per topic in forum groups
+        if topic_name not in self._archive_writers:
+            name = sanitize_filename(topic_name) if topic_name else "geral"
+            self._archive_writers[topic_name] = ShardedArchiveWriter(
+                self.archive_dir, name, self.output_mode
+            )
+        return self._archive_writers[topic_name]
+
+    async def _download(
+        self, descriptor: DownloadDescriptor, file, slot: SchedulerSlot
+    ) -> None:
+        flow_key = self.chat_info.id
+        file = slot.wrap(self.bandwidth.throttle(file, flow_key))
+
+        async with self.bandwidth.active(flow_key):
+            if descriptor.location is None:
+                await self.client.download_media(descriptor.media, file=file)
+                return
+
+            await self.client.download_file(
+                descriptor.location,
+                file=file,
+                file_size=descriptor.size or None,
+                dc_id=descriptor.dc_id,
+            )
+
+    async def _download_to_archive(
+        self, descriptor: DownloadDescriptor, slot: SchedulerSlot
+    ) -> Dict:
+        # Small files stay in memory; larger ones spill to one temporary file
+        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_MAX_BYTES) as spool:
+            await self._download(descriptor, spool, slot)
+
+            size = spool.tell()
+            spool.seek(0)
+            return await self._get_archive_writer(descriptor.topic_name).add(
+                descriptor.message_id,
+                os.path.relpath(descriptor.filepath, self.base_dir),
+                spool,
+                size,
+            )
+
+    async def _fetch(self, descriptor: DownloadDescriptor) -> Optional[Dict]:
+        """Download one media; returns its archive entry in archive mode"""
+        from telethon.errors import FloodWaitError
+
+        started = time.monotonic()
+
+        while True:
+            try:
+                async with self.scheduler.slot(
+                    self.priority, self.dc_pool.semaphore(descriptor.dc_id)
+                ) as slot:
+                    if self.use_archive:
+                        archive_entry = await self._download_to_archive(
+                            descriptor, slot
+                        )
+                        size = archive_entry["size"]
+                    else:
+                        archive_entry = None
+                        async with self.storage.open_writer(
+                            descriptor.filepath, descriptor.size
+                        ) as writer:
+                            await self._download(descriptor, writer, slot)
+                        size = writer.bytes_written
+                break
+            except FloodWaitError as e:
+                # Waits longer than the client's flood_sleep_threshold surface here
+                emit(FloodWait(e.seconds, f"download msg {descriptor.message_id}"))
+                await asyncio.sleep(e.seconds)
+
+        emit(
+            FileDone(
+                self.chat_info.id,
+                descriptor.message_id,
+                descriptor.filename,
+                size,
+                time.monotonic() - started,
+            )
+        )
+        return archive_entry
+
+    async def _refresh_reference(self, descriptor: DownloadDescriptor) -> None:
+        """Replace the expired file location of a descriptor"""
+        message = await self.refresher.refresh(descriptor.message_id)
+        if message is None or message.media is None:
+            raise RuntimeError(
+                f"Mensagem {descriptor.message_id} não está mais disponível"
+            )
+
+        descriptor.dc_id, descriptor.location = get_media_location(message)
+        descriptor.media = None if descriptor.location is not None else message.media
+
+    async def _fetch_in_slot(
+        self, descriptor: DownloadDescriptor, slot: asyncio.Semaphore
+    ) -> Optional[Dict]:
+        """
+        Download one media while holding a download slot
+
+        Messages may be fetched hours before their download runs, when
+        their file reference has expired. The slot is then released while
+        the message is re-fetched together with other expired items.
+        """
+        from telethon.errors import FileReferenceExpiredError
+
+        try:
+            async with slot:
+                return await self._fetch(descriptor)
+        except FileReferenceExpiredError:
+            await self._refresh_reference(descriptor)
+
+        async with slot:
+            return await self._fetch(descriptor)
+
+    async def _record(
+        self, descriptor: DownloadDescriptor, archive_entry: Optional[Dict]
+    ) -> None:
+        """Write the download record and queue post-processing"""
+        record = descriptor.record
+        if archive_entry:
+            record["path"] = None
+            record["archive"] = archive_entry
+        else:
+            record["path"] = descriptor.filepath
+            record["storage"] = self.storage.name
+        write_download_record(self.records_file, record)
+
+        if self.message_index is not None:
+            if archive_entry:
+                self.message_index.set_path(
+                    self.chat_info.id,
+                    descriptor.message_id,
+                    os.path.join(self.archive_dir, archive_entry["shard"]),
+                    archive_entry["member"],
+                )
+            else:
+                self.message_index.set_path(
+                    self.chat_info.id, descriptor.message_id, descriptor.filepath
+                )
+
+        if descriptor.reserved:
+            descriptor.reserved = False
+            details = {
+                "chat_id": self.chat_info.id,
+                "message_id": descriptor.message_id,
+            }
+            if archive_entry:
+                path = os.path.join(self.archive_dir, archive_entry["shard"])
+                details["member"] = archive_entry["member"]
+            else:
+                path = descriptor.filepath
+            self.near_duplicates.add(descriptor.phash, path, **details)
+
+        # Post-processing works on individual files on local disk
+        local_path = (
+            None if archive_entry else self.storage.local_path(descriptor.filepath)
+        )
+        if self._post_processor and local_path:
+            await self._post_processor.submit(local_path, record, self.records_file)
+
+    def _set_hash(self, descriptor: DownloadDescriptor, thumbnail: bytes) -> None:
+        """Hash a thumbnail and claim it against earlier copies"""
+        descriptor.thumb = None
+        try:
+            descriptor.phash = near_duplicates.dhash(thumbnail)
+        except Exception as e:
+            # Without a hash the media is simply downloaded
+            emit(
+                ErrorEvent(
+                    "near_duplicate", str(e), self.chat_info.id, descriptor.message_id
+                )
+            )
+            return
+        descriptor.original = self._claim_hash(descriptor)
+
+    def _claim_hash(self, descriptor: DownloadDescriptor):
+        """
+        Find an earlier copy of a media, or reserve its hash
+
+        Returns:
+            Path of a stored copy, future of a copy still downloading, or
+            None if the hash was reserved for this download
+        """
+        original = self.near_duplicates.find(
+            descriptor.phash, NEAR_DUPLICATE_MAX_DISTANCE
+        )
+        if original is None:
+            original = self.near_duplicates.find_pending(
+                descriptor.phash, NEAR_DUPLICATE_MAX_DISTANCE
+            )
+        if original is None:
+            self.near_duplicates.reserve(descriptor.phash)
+            descriptor.reserved = True
+        return original
+
+    def _release_hash(self, descriptor: DownloadDescriptor) -> None:
+        """Give up the reserved hash of a download that failed"""
+        if descriptor.reserved:
+            descriptor.reserved = False
+            self.near_duplicates.release(descriptor.phash)
+
+    async def _near_duplicate_of(self, descriptor: DownloadDescriptor):
+        """Hash the thumbnail of a media if needed and return its earlier copy"""
+        source = descriptor.thumb
+        if source is not None:
+            try:
+                # Thumbnail requests take a download slot like any other
+                async with self._semaphore:
+                    thumbnail = await near_duplicates.fetch_thumbnail(
+                        self.client, source
+                    )
+            except Exception as e:
+                descriptor.thumb = None
+                emit(
+                    ErrorEvent(
+                        "near_duplicate",
+                        str(e),
+                        self.chat_info.id,
+                        descriptor.message_id,
+                    )
+                )
+                return None
+            self._set_hash(descriptor, thumbnail)
+
+        original, descriptor.original = descriptor.original, None
+        return original
+
+    async def _hold_near_duplicate(self, descriptor: DownloadDescriptor) -> bool:
+        """Skip or defer a near-duplicate; True if it must not be downloaded now"""
+        original = await self._near_duplicate_of(descriptor)
+        if original is None:
+            return False
+
+        if isinstance(original, asyncio.Future):
+            # The first copy is still downloading: decide once it is stored
+            self._awaiting.append((descriptor, original))
+            return True
+
+        self.near_duplicate_count += 1
+        if NEAR_DUPLICATE_ACTION == "defer":
+            # Downloaded after the rest without another check
+            descriptor.phash = None
+            self._deferred.append(descriptor)
+        else:
+            emit(
+                FileSkipped(
+                    self.chat_info.id,
+                    descriptor.message_id,
+                    descriptor.filename,
+                    f"Quase duplicada de {original}",
+                )
+            )
+        return True
+
+    async def _download_and_log(self, descriptor: DownloadDescriptor):
+        if await self._hold_near_duplicate(descriptor):
+            return descriptor.topic_name, 0, 0
+
+        try:
+            archive_entry = await self._fetch_in_slot(descriptor, self._semaphore)
+        except Exception:
+            self._release_hash(descriptor)
+            self.failed_ids.append(descriptor.message_id)
+            raise
+        except BaseException:
+            self._release_hash(descriptor)
+            raise
+
+        write_download_log(
+            self.log_file,
+            descriptor.filename,
+            descriptor.media_type,
+            descriptor.message_id,
+            descriptor.date,
+            descriptor.topic_name,
+        )
+        await self._record(descriptor, archive_entry)
+
+        return descriptor.topic_name, 1, 0
+
+    async def _download_album(
+        self, grouped_id: int, descriptors: List[DownloadDescriptor]
+    ):
+        album_semaphore = asyncio.Semaphore(ALBUM_PARALLEL_DOWNLOADS)
+
+        # Thumbnail checks take the chat's slot themselves, so run them first
+        held = await asyncio.gather(
+            *[self._hold_near_duplicate(descriptor) for descriptor in descriptors]
+        )
+
+        async def fetch_member(descriptor, is_held):
+            if is_held:
+                return _HELD
+            try:
+                return await self._fetch_in_slot(descriptor, album_semaphore)
+            except BaseException:
+                self._release_hash(descriptor)
+                raise
+
+        # The whole album uses a single download slot
+        async with self._semaphore:
+            results = await asyncio.gather(
+                *[
+                    fetch_member(descriptor, is_held)
+                    for descriptor, is_held in zip(descriptors, held)
+                ],
+                return_exceptions=True,
+            )
+
+        downloaded = held = 0
+        for descriptor, result in zip(descriptors, results):
+            if result is _HELD:
+                # Near-duplicate, skipped or deferred
+                held += 1
+                continue
+            if isinstance(result, Exception):
+                emit(
+                    ErrorEvent(
+                        "album", str(result), self.chat_info.id, descriptor.message_id
+                    )
+                )
+                self._note_takeout_error(result)
+                self.failed_ids.append(descriptor.message_id)
+                continue
+            downloaded += 1
+            await self._record(descriptor, result)
+
+        first = descriptors[0]
+        media_types = sorted({descriptor.media_type for descriptor in descriptors})
+        write_download_log(
+            self.log_file,
+            f"album{grouped_id} ({downloaded}/{len(descriptors)} arquivos)",
+            "album:" + ",".join(media_types),
+            first.message_id,
+            first.date,
+            first.topic_name,
+        )
+
+        return first.topic_name, downloaded, len(descriptors) - downloaded - held
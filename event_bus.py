@@ -0,0 +1,348 @@
+"""
+Event bus module for Telegram Media Downloader
+Typed progress and error events emitted from the download hot path and
+delivered to pluggable sinks (rate-limited console, JSON log, metrics)
+by a background thread, so formatting and I/O stay off the event loop
+"""
+
+import asyncio
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from config import (
+    EVENT_SINKS,
+    EVENT_LOG_PATH,
+    EVENT_CONSOLE_INTERVAL,
+    EVENT_QUEUE_SIZE,
+)
+
+
+class ChatStarted(NamedTuple):
+    chat_id: int
+    title: str
+    topics: int = 0
+
+
+class ChatFinished(NamedTuple):
+    chat_id: int
+    title: str
+    downloaded: int
+    failed: int
+
+
+class FileQueued(NamedTuple):
+    chat_id: int
+    message_id: int
+    filename: str
+    size: int = 0
+
+
+class FileDone(NamedTuple):
+    chat_id: int
+    message_id: int
+    filename: str
+    size: int
+    seconds: float
+
+
+class FileSkipped(NamedTuple):
+    chat_id: int
+    message_id: int
+    filename: str
+    reason: str
+
+
+class ResolveAttempt(NamedTuple):
+    title: str
+    method: str
+    ok: bool
+    error: Optional[str] = None
+
+
+class ErrorEvent(NamedTuple):
+    stage: str
+    error: str
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None
+
+
+class FloodWait(NamedTuple):
+    seconds: int
+    context: str
+
+
+def event_to_dict(event, timestamp: float) -> Dict:
+    """Serialize an event as {"event": type name, "ts": ..., **fields}"""
+    return {"event": type(event).__name__, "ts": timestamp, **event._asdict()}
+
+
+class EventSink:
+    """Base class for event sinks (called from the dispatcher thread)"""
+
+    def handle(self, event, timestamp: float) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# Per-event-type drop policy: only these may be dropped when the queue is full
+_DROPPABLE_EVENTS = (FileQueued, FileDone, FileSkipped, ResolveAttempt)
+
+
+class _ChatProgress:
+    __slots__ = ("title", "files", "bytes", "queued")
+
+    def __init__(self, title: Optional[str] = None):
+        self.title = title
+        self.files = 0
+        self.bytes = 0
+        self.queued = 0
+
+
+class ConsoleSink(EventSink):
+    """
+    Human-readable console output
+
+    Chat, error and flood wait events are printed as they happen; file
+    progress is aggregated per chat into at most one line per chat and
+    interval, so chats exported in parallel do not mix their counts.
+    """
+
+    def __init__(self, interval: float = EVENT_CONSOLE_INTERVAL, stream=None):
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._chats: Dict[int, _ChatProgress] = {}
+        self._last_report = 0.0
+
+    def _chat(self, chat_id: int) -> _ChatProgress:
+        if chat_id not in self._chats:
+            self._chats[chat_id] = _ChatProgress()
+        return self._chats[chat_id]
+
+    def _write(self, line: str) -> None:
+        self.stream.write(line + "\n")
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def _write_progress(self, chat_id: int, progress: _ChatProgress) -> None:
+        if not progress.files and not progress.queued:
+            return
+
+        name = f"{progress.title}: " if progress.title else ""
+        if len(self._chats) > 1 and not progress.title:
+            name = f"chat {chat_id}: "
+        size_mb = progress.bytes / (1024 * 1024)
+        self._write(
+            f"📥 {name}{progress.files} arquivos baixados ({size_mb:.1f} MB), "
+            f"{progress.queued} na fila"
+        )
+
+    def _report_progress(self, timestamp: float, force: bool = False) -> None:
+        if not force and timestamp - self._last_report < self.interval:
+            return
+
+        for chat_id, progress in self._chats.items():
+            self._write_progress(chat_id, progress)
+        self.stream.flush()
+        self._last_report = timestamp
+
+    def handle(self, event, timestamp: float) -> None:
+        if isinstance(event, FileQueued):
+            self._chat(event.chat_id).queued += 1
+        elif isinstance(event, FileDone):
+            progress = self._chat(event.chat_id)
+            progress.queued = max(0, progress.queued - 1)
+            progress.files += 1
+            progress.bytes += event.size
+        elif isinstance(event, ChatStarted):
+            self._chat(event.chat_id).title = event.title
+            self._write(f"📥 Iniciando download de mídias do chat: {event.title}")
+        elif isinstance(event, ChatFinished):
+            progress = self._chats.pop(event.chat_id, None)
+            if progress is not None:
+                self._write_progress(event.chat_id, progress)
+        elif isinstance(event, FileSkipped):
+            self._write(f"⚠️ {event.reason}. Pulando {event.filename}")
+        elif isinstance(event, ResolveAttempt):
+            if event.ok:
+                self._write(f"   ✅ {event.title}: acessado via {event.method}")
+            elif event.method == "all":
+                self._write(f"   ❌ Todas as tentativas falharam para: {event.title}")
+        elif isinstance(event, ErrorEvent):
+            target = f" (msg {event.message_id})" if event.message_id else ""
+            self._write(f"❌ Erro em {event.stage}{target}: {event.error}")
+        elif isinstance(event, FloodWait):
+            self._write(f"⏳ Flood wait de {event.seconds}s em {event.context}")
+
+        self._report_progress(timestamp)
+
+    def close(self) -> None:
+        self._report_progress(time.time(), force=True)
+
+
+class JsonLogSink(EventSink):
+    """One JSON object per line, for log pipelines"""
+
+    def __init__(self, path: str = EVENT_LOG_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def handle(self, event, timestamp: float) -> None:
+        self._file.write(
+            json.dumps(event_to_dict(event, timestamp), ensure_ascii=False)
+        )
+        self._file.write("\n")
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class MetricsSink(EventSink):
+    """Running counters, read with snapshot() (e.g. by the API)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+
+    def _add(self, name: str, value: float = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def handle(self, event, timestamp: float) -> None:
+        with self._lock:
+            self._add(f"events_{type(event).__name__}")
+            if isinstance(event, FileDone):
+                self._add("bytes_downloaded", event.size)
+                self._add("download_seconds", event.seconds)
+            elif isinstance(event, FloodWait):
+                self._add("flood_wait_seconds", event.seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+
+class EventBus:
+    """
+    Decouples event producers from sinks
+
+    emit() only puts the event on a queue; a daemon thread delivers it
+    to every sink. Once queue_size events are waiting, high-volume file
+    progress events are dropped and counted instead of slowing down
+    downloads; chat, error and flood wait events are always delivered.
+    """
+
+    def __init__(self, sinks: List[EventSink], queue_size: int = EVENT_QUEUE_SIZE):
+        self.sinks = list(sinks)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._dispatch, name="event-bus", daemon=True
+        )
+        self._thread.start()
+
+    def emit(self, event) -> None:
+        """Publish an event (never blocks)"""
+        if (
+            isinstance(event, _DROPPABLE_EVENTS)
+            and self._queue.qsize() >= self.queue_size
+        ):
+            self.dropped += 1
+            return
+        self._queue.put_nowait((event, time.time()))
+
+    def flush(self) -> None:
+        """Wait until every emitted event has been delivered (blocking)"""
+        self._queue.join()
+        for sink in self.sinks:
+            sink.flush()
+
+    async def aflush(self) -> None:
+        """flush() from a coroutine, without blocking the event loop"""
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def get_sink(self, sink_type: type) -> Optional[EventSink]:
+        """Return the first sink of the given type"""
+        for sink in self.sinks:
+            if isinstance(sink, sink_type):
+                return sink
+        return None
+
+    def close(self) -> None:
+        """Deliver pending events and close the sinks"""
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+    def _report_dropped(self) -> None:
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            sys.stderr.write(
+                f"⚠️ {dropped - self._reported_dropped} eventos de progresso "
+                f"descartados (fila de eventos cheia)\n"
+            )
+            self._reported_dropped = dropped
+
+    def _dispatch(self) -> None:
+        while True:
+            event, timestamp = self._queue.get()
+            self._report_dropped()
+            try:
+                for sink in self.sinks:
+                    try:
+                        sink.handle(event, timestamp)
+                    except Exception as e:
+                        sys.stderr.write(
+                            f"⚠️ Erro no sink {type(sink).__name__}: {e}\n"
+                        )
+            finally:
+                self._queue.task_done()
+
+
+_SINK_FACTORIES = {
+    "console": ConsoleSink,
+    "json": JsonLogSink,
+    "metrics": MetricsSink,
+}
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """Return the event bus with the sinks selected by EVENT_SINKS"""
+    global _event_bus
+
+    if _event_bus is None:
+        unknown = set(EVENT_SINKS) - set(_SINK_FACTORIES)
+        if unknown:
+            raise ValueError(f"EVENT_SINKS inválido: {', '.join(sorted(unknown))}")
+        _event_bus = EventBus([_SINK_FACTORIES[name]() for name in EVENT_SINKS])
+
+    return _event_bus
+
+
+def set_event_bus(bus: EventBus) -> None:
+    """Replace the active event bus (e.g. with custom sinks)"""
+    global _event_bus
+    _event_bus = bus
+
+
+def emit(event) -> None:
+    """Publish an event on the active event bus"""
+    get_event_bus().emit(event)
@@ -0,0 +1,325 @@
+"""
+Export planner module for Telegram Media Downloader
+Estimates media counts, bytes and download time per chat and forum
+topic without downloading anything, using Telegram search counters and
+a small sample of media sizes
+
+Usage:
+    python export_planner.py [--sort bytes|count|seconds] [--json plan.json] <chat> ...
+"""
+
+import asyncio
+import json
+from typing import Dict, List, Optional, Set
+
+from config import (
+    MAX_FILE_SIZE,
+    PLAN_SAMPLE_SIZE,
+    PLAN_THROUGHPUT_BYTES_PER_SEC,
+)
+from file_utils import format_file_size, get_media_size
+
+# Media types and the search filter that counts them
+MEDIA_FILTERS = {
+    "photo": "InputMessagesFilterPhotos",
+    "video": "InputMessagesFilterVideo",
+    "document": "InputMessagesFilterDocument",
+    "audio": "InputMessagesFilterMusic",
+    "voice": "InputMessagesFilterVoice",
+}
+
+PLAN_SORT_KEYS = ("bytes", "count", "seconds")
+
+
+def _media_filter(media_type: str):
+    from telethon.tl import types
+
+    return getattr(types, MEDIA_FILTERS[media_type])()
+
+
+async def count_media(
+    client, entity, top_msg_id: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Count the media of each type in a chat (or forum topic) in one request
+
+    Args:
+        client: Authenticated Telegram client
+        entity: Chat entity
+        top_msg_id: Forum topic ID to restrict the counts to
+
+    Returns:
+        Dictionary mapping media type to message count
+    """
+    from telethon.tl.functions.messages import GetSearchCountersRequest
+
+    media_types = list(MEDIA_FILTERS)
+    kwargs = {"top_msg_id": top_msg_id} if top_msg_id else {}
+    counters = await client(
+        GetSearchCountersRequest(
+            peer=entity,
+            filters=[_media_filter(media_type) for media_type in media_types],
+            **kwargs,
+        )
+    )
+
+    # Counters come back in the order of the filters
+    return {
+        media_type: counter.count for media_type, counter in zip(media_types, counters)
+    }
+
+
+async def sample_media_size(
+    client,
+    entity,
+    media_type: str,
+    sample_size: int = PLAN_SAMPLE_SIZE,
+    dc_ids: Optional[Set[int]] = None,
+) -> Optional[float]:
+    """
+    Average size of the most recent media of one type
+
+    Files over MAX_FILE_SIZE are left out, since exports skip them.
+
+    Args:
+        client: Authenticated Telegram client
+        entity: Chat entity
+        media_type: Key of MEDIA_FILTERS
+        sample_size: Number of recent messages to sample
+        dc_ids: Set that collects the data centers the sampled media is in
+
+    Returns:
+        Average size in bytes, or None if no size could be sampled
+    """
+    from download_pipeline import get_media_location
+
+    sizes = []
+    async for message in client.iter_messages(
+        entity, limit=sample_size, filter=_media_filter(media_type)
+    ):
+        size = get_media_size(message)
+        if size and size <= MAX_FILE_SIZE:
+            sizes.append(size)
+        if dc_ids is not None:
+            dc_id, _ = get_media_location(message)
+            if dc_id is not None:
+                dc_ids.add(dc_id)
+
+    return sum(sizes) / len(sizes) if sizes else None
+
+
+def _estimate(counts: Dict[str, int], avg_sizes: Dict[str, Optional[float]]) -> Dict:
+    media = {}
+    for media_type, count in counts.items():
+        est_bytes = int(count * (avg_sizes.get(media_type) or 0))
+        media[media_type] = {"count": count, "est_bytes": est_bytes}
+
+    total_bytes = sum(item["est_bytes"] for item in media.values())
+    return {
+        "media": media,
+        "count": sum(counts.values()),
+        "bytes": total_bytes,
+        "seconds": round(total_bytes / PLAN_THROUGHPUT_BYTES_PER_SEC),
+    }
+
+
+async def plan_chat(
+    client,
+    entity,
+    topics: Optional[Dict[int, str]] = None,
+    sample_size: int = PLAN_SAMPLE_SIZE,
+) -> Dict:
+    """
+    Estimate the export of one chat
+
+    Args:
+        client: Authenticated Telegram client
+        entity: Chat entity
+        topics: Forum topics (ID -> name) to estimate individually
+        sample_size: Recent messages sampled per media type for sizes
+
+    Returns:
+        Plan dictionary with chat_id, title, media (count, avg_size and
+        est_bytes per type), count, bytes, seconds, topics and dc_ids
+        (data centers seen in the sample)
+    """
+    counts = await count_media(client, entity)
+
+    avg_sizes = {}
+    dc_ids: Set[int] = set()
+    for media_type, count in counts.items():
+        avg_sizes[media_type] = (
+            await sample_media_size(client, entity, media_type, sample_size, dc_ids)
+            if count
+            else None
+        )
+
+    plan = {
+        "chat_id": entity.id,
+        "title": getattr(entity, "title", f"Chat_{entity.id}"),
+        **_estimate(counts, avg_sizes),
+        "topics": [],
+        "dc_ids": sorted(dc_ids),
+    }
+    for media_type, average in avg_sizes.items():
+        plan["media"][media_type]["avg_size"] = int(average) if average else None
+
+    # Topics reuse the chat-wide average sizes
+    for topic_id, topic_name in (topics or {}).items():
+        topic_counts = await count_media(client, entity, top_msg_id=topic_id)
+        plan["topics"].append(
+            {
+                "topic_id": topic_id,
+                "title": topic_name,
+                **_estimate(topic_counts, avg_sizes),
+            }
+        )
+
+    return plan
+
+
+def sort_plans(plans: List[Dict], sort_by: str = "bytes") -> List[Dict]:
+    """
+    Sort chat plans biggest first
+
+    Args:
+        plans: Plans from plan_chat
+        sort_by: "bytes", "count" or "seconds"
+
+    Returns:
+        New sorted list
+    """
+    if sort_by not in PLAN_SORT_KEYS:
+        raise ValueError(
+            f"Ordenação inválida: {sort_by} (use {', '.join(PLAN_SORT_KEYS)})"
+        )
+    return sorted(plans, key=lambda plan: plan[sort_by], reverse=True)
+
+
+async def plan_chats(
+    client,
+    chat_list: List[Dict],
+    sort_by: str = "bytes",
+    sample_size: int = PLAN_SAMPLE_SIZE,
+) -> List[Dict]:
+    """
+    Estimate the export of several chats, biggest first
+
+    Args:
+        client: Authenticated Telegram client
+        chat_list: Chat information dictionaries
+        sort_by: "bytes", "count" or "seconds"
+        sample_size: Recent messages sampled per media type for sizes
+
+    Returns:
+        Sorted list of plans; chats that could not be planned get an
+        "error" entry and sort last
+    """
+    from telethon_handlers import get_chat_entity_safe, get_forum_topics
+
+    plans = []
+    for chat_info in chat_list:
+        try:
+            entity = await get_chat_entity_safe(client, chat_info)
+            if not entity:
+                raise RuntimeError("chat_not_accessible")
+            topics = await get_forum_topics(client, entity)
+            plan = await plan_chat(client, entity, topics, sample_size)
+        except Exception as e:
+            plan = {
+                "chat_id": chat_info["id"],
+                "title": chat_info["title"],
+                "error": str(e),
+                "count": 0,
+                "bytes": 0,
+                "seconds": 0,
+                "dc_ids": [],
+            }
+
+        # The chat dictionary the plan was made for
+        plan["ref"] = chat_info
+        plans.append(plan)
+
+    return sort_plans(plans, sort_by)
+
+
+def print_export_plan(plans: List[Dict]) -> None:
+    """Display chat plans with per-type and per-topic estimates"""
+    print(f"\n🧮 ESTIMATIVA DE EXPORTAÇÃO ({len(plans)} chats)")
+    print("-" * 80)
+
+    for plan in plans:
+        if plan.get("error"):
+            print(f"❌ {plan['title']}: {plan['error']}")
+            continue
+
+        hours = plan["seconds"] / 3600
+        print(
+            f"📂 {plan['title'][:50]:<50} | {plan['count']:>8} mídias | "
+            f"{format_file_size(plan['bytes']):>10} | ~{hours:.1f}h"
+        )
+        for media_type, item in plan["media"].items():
+            if item["count"]:
+                print(
+                    f"     - {media_type:<9} {item['count']:>8} | "
+                    f"{format_file_size(item['est_bytes']):>10}"
+                )
+        for topic in plan["topics"]:
+            print(
+                f"     📁 {topic['title'][:40]:<40} {topic['count']:>8} | "
+                f"{format_file_size(topic['bytes']):>10}"
+            )
+
+    total_bytes = sum(plan["bytes"] for plan in plans)
+    total_hours = sum(plan["seconds"] for plan in plans) / 3600
+    print("-" * 80)
+    print(f"📊 Total estimado: {format_file_size(total_bytes)} (~{total_hours:.1f}h)")
+
+
+async def _main(args: List[str]) -> int:
+    from batch_jobs import resolve_chat_ref
+    from chat_catalog import load_chat_catalog
+    from telethon_handlers import connect_saved_session
+
+    sort_by = "bytes"
+    json_path = None
+    refs = []
+    options = iter(args)
+    for arg in options:
+        if arg == "--sort":
+            sort_by = next(options, sort_by)
+        elif arg == "--json":
+            json_path = next(options, None)
+        else:
+            refs.append(arg)
+
+    if not refs:
+        print(__doc__)
+        return 1
+
+    catalog = load_chat_catalog()
+    chat_list = [resolve_chat_ref(ref, catalog) for ref in refs]
+
+    client = await connect_saved_session()
+    if client is None:
+        print("❌ Nenhuma sessão autorizada. Faça login antes.")
+        return 1
+
+    try:
+        plans = await plan_chats(client, chat_list, sort_by)
+    finally:
+        await client.disconnect()
+
+    print_export_plan(plans)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(plans, f, ensure_ascii=False, indent=2)
+        print(f"📄 Plano salvo em: {json_path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -3,6 +3,7 @@ File utilities module for Telegram Media Downloader
 Handles file and directory operations, sanitization, and organization
 """
 
+import json
 import os
 import re
 from typing import Dict, List
@@ -66,11 +67,17 @@ def ensure_directories_exist(directories: Dict[str, str]) -> None:
     """
     Create all directories in the provided dictionary
 
+    Directories are created through the active storage backend, so object
+    stores (which have no directories) skip this step.
+
     Args:
         directories: Dictionary of directory paths to create
     """
+    from storage import get_storage_backend
+
+    storage = get_storage_backend()
     for dir_path in directories.values():
-        os.makedirs(dir_path, exist_ok=True)
+        storage.makedirs(dir_path)
 
 
 def get_file_extension(message) -> str:
@@ -131,13 +138,81 @@ def get_media_type_name(message) -> str:
         return "other"
 
 
-def generate_filename(message, topic_name: str = None) -> str:
+def get_media_size(message) -> int:
+    """
+    Get the expected size of the message media in bytes
+
+    Args:
+        message: Telethon message object with media
+
+    Returns:
+        Size in bytes, or 0 when Telegram does not report it
+    """
+    document = getattr(message, "document", None)
+    if document is not None and getattr(document, "size", None):
+        return document.size
+
+    photo = getattr(message, "photo", None)
+    if photo is not None and getattr(photo, "sizes", None):
+        # Downloads use the largest available size of the photo
+        largest = 0
+        for photo_size in photo.sizes:
+            if getattr(photo_size, "size", None):
+                largest = max(largest, photo_size.size)
+            elif getattr(photo_size, "sizes", None):
+                largest = max(largest, max(photo_size.sizes))
+        return largest
+
+    return 0
+
+
+def get_mime_type(message) -> str:
+    """
+    Get the MIME type of the message media
+
+    Args:
+        message: Telethon message object with media
+
+    Returns:
+        MIME type string, or None if unknown
+    """
+    if message.photo:
+        return "image/jpeg"
+
+    document = getattr(message, "document", None)
+    if document is not None:
+        return getattr(document, "mime_type", None)
+
+    return None
+
+
+def get_original_filename(message) -> str:
+    """
+    Get the original file name sent with a document, if any
+
+    Args:
+        message: Telethon message object with media
+
+    Returns:
+        Original file name or None
+    """
+    document = getattr(message, "document", None)
+    if document is not None and hasattr(document, "attributes"):
+        for attr in document.attributes:
+            if hasattr(attr, "file_name") and attr.file_name:
+                return attr.file_name
+
+    return None
+
+
+def generate_filename(message, topic_name: str = None, album_id: int = None) -> str:
     """
     Generate organized filename with timestamp and metadata
 
     Args:
         message: Telethon message object
         topic_name: Optional topic name for prefix
+        album_id: Optional album grouped_id shared by all album members
 
     Returns:
         Generated filename string
@@ -148,15 +223,51 @@ def generate_filename(message, topic_name: str = None) -> str:
     # Add topic prefix if specified
     topic_prefix = f"[{sanitize_filename(topic_name)}]_" if topic_name else ""
 
+    # Album members share a common prefix
+    album_prefix = f"album{album_id}_" if album_id else ""
+
     # Get appropriate file extension
     extension = get_file_extension(message)
 
     # Generate final filename
-    filename = f"{topic_prefix}{timestamp}_msg{message.id}{extension}"
+    filename = f"{topic_prefix}{timestamp}_{album_prefix}msg{message.id}{extension}"
 
     return filename
 
 
+def build_media_record(
+    message,
+    filename: str,
+    topic_id: int = None,
+    topic_name: str = None,
+) -> Dict:
+    """
+    Build a metadata record describing the media of a message
+
+    Args:
+        message: Telethon message object with media
+        filename: Filename generated for the media
+        topic_id: Optional forum topic ID
+        topic_name: Optional forum topic name
+
+    Returns:
+        Dictionary with JSON serializable media metadata
+    """
+    return {
+        "message_id": message.id,
+        "date": message.date.isoformat() if message.date else None,
+        "media_type": get_media_type_name(message),
+        "mime_type": get_mime_type(message),
+        "size": get_media_size(message),
+        "file_name": filename,
+        "original_name": get_original_filename(message),
+        "topic_id": topic_id,
+        "topic_name": topic_name,
+        "sender_id": getattr(message, "sender_id", None),
+        "grouped_id": getattr(message, "grouped_id", None),
+    }
+
+
 def write_download_log(
     log_file_path: str,
     filename: str,
@@ -188,6 +299,51 @@ def write_download_log(
         log.write(log_entry)
 
 
+def write_download_record(records_path: str, record: Dict) -> None:
+    """
+    Append a structured download record to a JSON Lines file
+
+    Later entries for the same message ID update earlier ones, so results
+    computed after the download can be added without rewriting the file.
+
+    Args:
+        records_path: Path to the records file
+        record: Record dictionary containing at least "message_id"
+    """
+    with open(records_path, "a", encoding="utf-8") as records:
+        records.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def load_download_records(records_path: str) -> Dict[int, Dict]:
+    """
+    Load download records merged by message ID
+
+    Args:
+        records_path: Path to the records file
+
+    Returns:
+        Dictionary mapping message ID to its merged record
+    """
+    records = {}
+
+    if not os.path.exists(records_path):
+        return records
+
+    with open(records_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Ignore a partially written last line after a crash
+                continue
+            records.setdefault(entry["message_id"], {}).update(entry)
+
+    return records
+
+
 def format_file_size(size_bytes: int) -> str:
     """
     Format file size in human readable format
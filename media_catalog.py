@@ -0,0 +1,76 @@
+"""
+Media catalog module for Telegram Media Downloader
+Streams media metadata to a compressed JSON Lines catalog without
+downloading any file
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, Iterator
+
+
+class MediaCatalogWriter:
+    """
+    Append media metadata records to a gzip compressed JSON Lines file
+
+    Records are written one at a time, so memory usage stays constant
+    regardless of how many messages are cataloged.
+    """
+
+    def __init__(self, path: str, flush_every: int = 1000):
+        """
+        Args:
+            path: Path of the catalog file (usually ending in .jsonl.gz)
+            flush_every: Number of records between explicit flushes
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, record: Dict) -> None:
+        """
+        Write a single record to the catalog
+
+        Args:
+            record: JSON serializable metadata dictionary
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str))
+        self._file.write("\n")
+        self.count += 1
+
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Flush pending data and close the catalog file"""
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_media_catalog(path: str) -> Iterator[Dict]:
+    """
+    Iterate over the records of a media catalog
+
+    Args:
+        path: Path of the catalog file
+
+    Yields:
+        Metadata dictionaries in the order they were written
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as catalog:
+        for line in catalog:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,373 @@
+"""
+Message index module for Telegram Media Downloader
+Full-text index (SQLite FTS5) of the text, captions, file names and
+senders of exported messages, linked to the paths of their downloaded
+media
+
+Usage:
+    python message_index.py "fatura março" [--chat CHAT_ID] [--type MEDIA_TYPE] [--limit N]
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    MESSAGE_INDEX_PATH,
+    MESSAGE_INDEX_BATCH_SIZE,
+    MESSAGE_INDEX_RANK_CANDIDATES,
+)
+from file_utils import get_media_type_name, get_original_filename
+
+_UPSERT_MESSAGE = """
+    INSERT INTO messages (chat_id, message_id, chat, date, sender, media_type,
+                          file_name, text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (chat_id, message_id) DO UPDATE SET
+        chat = excluded.chat,
+        date = excluded.date,
+        sender = excluded.sender,
+        media_type = excluded.media_type,
+        file_name = excluded.file_name,
+        text = excluded.text
+"""
+
+_UPSERT_PATH = """
+    INSERT INTO messages (chat_id, message_id, path, member)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (chat_id, message_id) DO UPDATE SET
+        path = excluded.path,
+        member = excluded.member
+"""
+
+
+def is_available() -> bool:
+    """Whether the SQLite library of this Python was built with FTS5"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def get_sender_name(message) -> Optional[str]:
+    """
+    Display name of the sender of a message
+
+    iter_messages attaches the sender entity from the same response, so
+    this costs no request; channel posts fall back to their signature.
+
+    Args:
+        message: Telethon message object
+
+    Returns:
+        Name, @username or ID of the sender, or None if unknown
+    """
+    sender = getattr(message, "sender", None)
+    if sender is not None:
+        title = getattr(sender, "title", None)
+        if title:
+            return title
+        names = [
+            getattr(sender, "first_name", None),
+            getattr(sender, "last_name", None),
+        ]
+        name = " ".join(part for part in names if part)
+        if name:
+            return name
+        if getattr(sender, "username", None):
+            return f"@{sender.username}"
+
+    if getattr(message, "post_author", None):
+        return message.post_author
+
+    sender_id = getattr(message, "sender_id", None)
+    return str(sender_id) if sender_id is not None else None
+
+
+class MessageIndex:
+    """
+    Full-text index of exported messages stored in a SQLite database
+
+    Rows live in a regular table keyed by (chat_id, message_id) and an
+    external content FTS5 table kept in sync by triggers indexes text,
+    file_name and sender. Writes are buffered and applied in one
+    transaction per batch, so indexing adds little to an export; reads
+    answer in milliseconds on millions of rows (see search()).
+    """
+
+    def __init__(
+        self,
+        path: str = MESSAGE_INDEX_PATH,
+        batch_size: int = MESSAGE_INDEX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            path: Database file (created if missing)
+            batch_size: Buffered writes applied per transaction
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.batch_size = batch_size
+        self._messages: List[Tuple] = []
+        self._paths: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                chat TEXT,
+                date TEXT,
+                sender TEXT,
+                media_type TEXT,
+                file_name TEXT,
+                text TEXT,
+                path TEXT,
+                member TEXT,
+                UNIQUE (chat_id, message_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                text, file_name, sender,
+                content='messages', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, text, file_name, sender)
+                VALUES (new.id, new.text, new.file_name, new.sender);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text, file_name, sender)
+                VALUES ('delete', old.id, old.text, old.file_name, old.sender);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_au
+            AFTER UPDATE OF text, file_name, sender ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text, file_name, sender)
+                VALUES ('delete', old.id, old.text, old.file_name, old.sender);
+                INSERT INTO messages_fts (rowid, text, file_name, sender)
+                VALUES (new.id, new.text, new.file_name, new.sender);
+            END;
+            """)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def add(self, message, chat_id: int, chat: Optional[str] = None) -> None:
+        """
+        Buffer a message (with or without media) for indexing
+
+        Args:
+            message: Telethon message object
+            chat_id: ID of the chat the message belongs to
+            chat: Chat title, stored for display
+        """
+        has_media = getattr(message, "media", None) is not None
+        text = getattr(message, "message", None) or None
+        if not text and not has_media:
+            return
+
+        self._messages.append(
+            (
+                chat_id,
+                message.id,
+                chat,
+                message.date.isoformat() if message.date else None,
+                get_sender_name(message),
+                get_media_type_name(message) if has_media else None,
+                get_original_filename(message) if has_media else None,
+                text,
+            )
+        )
+        if len(self._messages) + len(self._paths) >= self.batch_size:
+            self.flush()
+
+    def set_path(
+        self,
+        chat_id: int,
+        message_id: int,
+        path: str,
+        member: Optional[str] = None,
+    ) -> None:
+        """
+        Buffer the storage location of a downloaded media
+
+        Args:
+            chat_id: ID of the chat the message belongs to
+            message_id: ID of the message
+            path: Stored file, or archive shard in archive mode
+            member: Name of the media inside the shard (archive mode)
+        """
+        self._paths.append((chat_id, message_id, path, member))
+        if len(self._messages) + len(self._paths) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Apply buffered writes in a single transaction"""
+        messages, self._messages = self._messages, []
+        paths, self._paths = self._paths, []
+        if not messages and not paths:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Messages first: paths are always buffered after their message
+                self._conn.executemany(_UPSERT_MESSAGE, messages)
+                self._conn.executemany(_UPSERT_PATH, paths)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def search(
+        self,
+        query: str,
+        chat_id: Optional[int] = None,
+        media_type: Optional[str] = None,
+        limit: int = 50,
+        candidates: int = MESSAGE_INDEX_RANK_CANDIDATES,
+    ) -> List[Dict]:
+        """
+        Find messages matching a full-text query, best matches first
+
+        Ranking every match of a common word costs seconds on millions
+        of rows, so only the most recently indexed candidates are ranked
+        (FTS5 yields them in rowid order without a sort) and snippets are
+        built for the returned rows only.
+
+        Args:
+            query: FTS5 query (words, "phrases", prefix*, OR, NOT,
+                column filters like sender:joão)
+            chat_id: Only messages of this chat
+            media_type: Only messages with this media type
+            limit: Maximum number of results
+            candidates: Matches ranked by relevance (0 = all)
+
+        Returns:
+            List of message dictionaries with a highlighted "snippet"
+
+        Raises:
+            ValueError: If the query is not valid FTS5 syntax
+        """
+        sql = """
+            SELECT messages_fts.rowid AS id, bm25(messages_fts) AS score
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params: List = [query]
+        if chat_id is not None:
+            sql += " AND m.chat_id = ?"
+            params.append(chat_id)
+        if media_type is not None:
+            sql += " AND m.media_type = ?"
+            params.append(media_type)
+        if candidates:
+            sql += " ORDER BY messages_fts.rowid DESC LIMIT ?"
+            params.append(candidates)
+        sql = f"SELECT id FROM ({sql}) ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        try:
+            ids = [row[0] for row in self._conn.execute(sql, params)]
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            rows = self._conn.execute(
+                f"""
+                SELECT m.id, m.chat_id, m.message_id, m.chat, m.date, m.sender,
+                       m.media_type, m.file_name, m.text, m.path, m.member,
+                       snippet(messages_fts, -1, '[', ']', '…', 12) AS snippet
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ? AND messages_fts.rowid IN ({placeholders})
+                """,
+                [query, *ids],
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Consulta inválida: {e}")
+
+        by_id = {row["id"]: dict(row) for row in rows}
+        results = []
+        for row_id in ids:
+            result = by_id[row_id]
+            del result["id"]
+            results.append(result)
+        return results
+
+    def close(self) -> None:
+        """Apply pending writes and close the database"""
+        self.flush()
+        self._conn.close()
+
+
+_indexes: Dict[str, MessageIndex] = {}
+
+
+def get_message_index(path: str = MESSAGE_INDEX_PATH) -> MessageIndex:
+    """Return the shared index stored at path, opening it on first use"""
+    if path not in _indexes:
+        _indexes[path] = MessageIndex(path)
+    return _indexes[path]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    options = {"--chat": None, "--type": None, "--limit": "20"}
+    query_words = []
+    i = 0
+    while i < len(args):
+        if args[i] in options and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        else:
+            query_words.append(args[i])
+            i += 1
+
+    if not os.path.exists(MESSAGE_INDEX_PATH):
+        print(f"❌ Índice não encontrado: {MESSAGE_INDEX_PATH}")
+        sys.exit(1)
+
+    index = MessageIndex()
+    started = time.monotonic()
+    try:
+        results = index.search(
+            " ".join(query_words),
+            chat_id=int(options["--chat"]) if options["--chat"] else None,
+            media_type=options["--type"],
+            limit=int(options["--limit"]),
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    elapsed_ms = (time.monotonic() - started) * 1000
+
+    print(f"🔎 {len(results)} resultados em {elapsed_ms:.1f} ms")
+    for result in results:
+        location = result["path"] or "(sem arquivo)"
+        if result["member"]:
+            location += f" → {result['member']}"
+        print(f"\n📅 {result['date']} | 💬 {result['chat']} | 👤 {result['sender']}")
+        print(f"   {result['snippet']}")
+        print(f"   📁 {location}")
+    index.close()
@@ -0,0 +1,268 @@
+"""
+Near-duplicate detection module for Telegram Media Downloader
+Hashes the small thumbnail of a media with a perceptual hash (dHash)
+before the full download and compares it against the hashes of media
+already downloaded, so re-encoded reposts can be skipped or deferred
+
+Requires Pillow; NumPy is optional and vectorizes the index lookups.
+"""
+
+import asyncio
+import importlib.util
+import io
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from config import NEAR_DUPLICATE_INDEX_PATH
+
+
+def is_available() -> bool:
+    """Whether Pillow is installed (required to hash thumbnails)"""
+    return importlib.util.find_spec("PIL") is not None
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    Difference hash of an image
+
+    The image is reduced to (hash_size + 1) x hash_size grayscale pixels
+    and each bit says whether a pixel is brighter than its right
+    neighbour, so re-encoding, rescaling and small edits barely change
+    the hash.
+
+    Args:
+        image_bytes: Encoded image (e.g. a JPEG thumbnail)
+        hash_size: Bits per side; the index stores 64-bit hashes (8)
+
+    Returns:
+        Hash as an integer
+    """
+    from PIL import Image
+
+    width = hash_size + 1
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        small = image.convert("L").resize((width, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def get_thumbnail_source(message) -> Optional[Tuple]:
+    """
+    Find the cheapest thumbnail of a photo or document message
+
+    Inline ("stripped") thumbnails come with the message and cost no
+    request; otherwise the smallest downloadable thumbnail is used.
+
+    Args:
+        message: Telethon message object with media
+
+    Returns:
+        ("inline", jpeg_bytes), ("file", dc_id, input location), or None
+        if the media has no thumbnail
+    """
+    from telethon.tl.types import (
+        InputDocumentFileLocation,
+        InputPhotoFileLocation,
+        PhotoStrippedSize,
+    )
+    from telethon.utils import stripped_photo_to_jpg
+
+    photo = getattr(message, "photo", None)
+    document = getattr(message, "document", None)
+    if photo is not None:
+        media, sizes = photo, getattr(photo, "sizes", None) or []
+    elif document is not None:
+        media, sizes = document, getattr(document, "thumbs", None) or []
+    else:
+        return None
+
+    for size in sizes:
+        if isinstance(size, PhotoStrippedSize):
+            return "inline", stripped_photo_to_jpg(size.bytes)
+
+    # Smallest thumbnail with a file behind it
+    files = [size for size in sizes if getattr(size, "size", None)]
+    if not files:
+        return None
+    smallest = min(files, key=lambda size: size.size)
+
+    location_type = (
+        InputPhotoFileLocation if photo is not None else InputDocumentFileLocation
+    )
+    return (
+        "file",
+        media.dc_id,
+        location_type(
+            id=media.id,
+            access_hash=media.access_hash,
+            file_reference=media.file_reference,
+            thumb_size=smallest.type,
+        ),
+    )
+
+
+async def fetch_thumbnail(client, source: Tuple) -> bytes:
+    """Return the thumbnail bytes of a source from get_thumbnail_source"""
+    if source[0] == "inline":
+        return source[1]
+
+    _, dc_id, location = source
+    return await client.download_file(location, file=bytes, dc_id=dc_id)
+
+
+class PerceptualHashIndex:
+    """
+    Hashes of downloaded media, searched by Hamming distance
+
+    With NumPy the hashes live in a uint64 array and a lookup XORs the
+    query against all of them and counts the differing bits at once;
+    without it a plain loop is used. Entries are appended to a JSON
+    Lines file so the index covers every previous export.
+
+    Media still downloading are reserved as pending (reserve()), so a
+    repost queued in the same run finds its first copy before that copy
+    is stored; add() or release() resolves the reservation.
+    """
+
+    def __init__(self, path: Optional[str] = NEAR_DUPLICATE_INDEX_PATH):
+        """
+        Args:
+            path: JSON Lines file that persists the index (None: memory only)
+        """
+        self.path = path
+        self.paths: List[str] = []
+        self._pending: List[Tuple[int, asyncio.Future]] = []
+
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        self._np = numpy
+        self._hashes = numpy.zeros(1024, dtype=numpy.uint64) if numpy else []
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._append(int(entry["hash"], 16), entry["path"])
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _append(self, value: int, path: str) -> None:
+        count = len(self.paths)
+        if self._np is None:
+            self._hashes.append(value)
+        else:
+            if count == len(self._hashes):
+                self._hashes = self._np.concatenate(
+                    [self._hashes, self._np.zeros_like(self._hashes)]
+                )
+            self._hashes[count] = value
+        self.paths.append(path)
+
+    def add(self, value: int, path: str, **details) -> None:
+        """
+        Add the hash of a downloaded media
+
+        Args:
+            value: Perceptual hash
+            path: Where the media was stored
+            details: Extra fields persisted with the entry (e.g. chat_id)
+        """
+        self._append(value, path)
+        self.release(value, path)
+
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            entry = {"hash": f"{value:x}", "path": path, **details}
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def nearest(self, value: int) -> Optional[Tuple[int, str]]:
+        """
+        Find the closest stored hash
+
+        Args:
+            value: Perceptual hash
+
+        Returns:
+            Tuple of (Hamming distance, path), or None if the index is empty
+        """
+        count = len(self.paths)
+        if not count:
+            return None
+
+        if self._np is None:
+            distances = [bin(value ^ stored).count("1") for stored in self._hashes]
+            best = min(range(count), key=distances.__getitem__)
+            return distances[best], self.paths[best]
+
+        np = self._np
+        differing = np.bitwise_xor(self._hashes[:count], np.uint64(value))
+        bits = np.unpackbits(differing.view(np.uint8).reshape(count, 8), axis=1)
+        distances = bits.sum(axis=1)
+        best = int(distances.argmin())
+        return int(distances[best]), self.paths[best]
+
+    def find(self, value: int, max_distance: int) -> Optional[str]:
+        """Path of a stored media within max_distance bits, if any"""
+        match = self.nearest(value)
+        if match is not None and match[0] <= max_distance:
+            return match[1]
+        return None
+
+    def reserve(self, value: int) -> None:
+        """Register the hash of a media whose download is starting"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((value, future))
+
+    def release(self, value: int, path: Optional[str] = None) -> None:
+        """
+        Resolve the reservation of a hash
+
+        Args:
+            value: Perceptual hash passed to reserve()
+            path: Where the media was stored, or None if its download failed
+        """
+        for i, (pending, future) in enumerate(self._pending):
+            if pending == value:
+                del self._pending[i]
+                if not future.done():
+                    future.set_result(path)
+                return
+
+    def find_pending(self, value: int, max_distance: int) -> Optional[asyncio.Future]:
+        """
+        Reservation of a media within max_distance bits, if any
+
+        Returns:
+            Future resolved with the stored path (None if the download failed)
+        """
+        for pending, future in self._pending:
+            if bin(value ^ pending).count("1") <= max_distance:
+                return future
+        return None
+
+
+_indexes: Dict[str, PerceptualHashIndex] = {}
+
+
+def get_near_duplicate_index(
+    path: str = NEAR_DUPLICATE_INDEX_PATH,
+) -> PerceptualHashIndex:
+    """Return the shared index stored at path, loading it on first use"""
+    if path not in _indexes:
+        _indexes[path] = PerceptualHashIndex(path)
+    return _indexes[path]
@@ -0,0 +1,257 @@
+"""
+Post-download processing module for Telegram Media Downloader
+Runs checksums, validation and media info extraction for completed
+downloads in a worker pool, away from the asyncio event loop
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    POST_PROCESSORS,
+    POST_PROCESSING_WORKERS,
+    POST_PROCESSING_QUEUE_SIZE,
+    POST_PROCESSING_EXECUTOR,
+)
+from file_utils import write_download_record
+from event_bus import emit, ErrorEvent
+
+# Registry of available processors: name -> callable(path, record) -> dict
+_PROCESSORS: Dict[str, Callable[[str, Dict], Dict]] = {}
+
+
+def register_processor(name: str, func: Callable[[str, Dict], Dict]) -> None:
+    """
+    Register a post-processing step
+
+    Processors receive the local file path and the download record and
+    return a dictionary that is merged into the record results. They run
+    inside the worker pool, so they may block. With the "process"
+    executor, processors must be importable module-level functions.
+
+    Args:
+        name: Name used to enable the processor in POST_PROCESSORS
+        func: Processor callable
+    """
+    _PROCESSORS[name] = func
+
+
+def compute_sha256(path: str, record: Dict) -> Dict:
+    """Compute the SHA-256 checksum of a downloaded file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest()}
+
+
+def validate_size(path: str, record: Dict) -> Dict:
+    """Compare the size on disk against the size reported by Telegram"""
+    actual_size = os.path.getsize(path)
+    expected_size = record.get("size") or 0
+
+    return {
+        "actual_size": actual_size,
+        # Photos may not report an exact size, so only validate when known
+        "size_ok": actual_size > 0
+        and (not expected_size or actual_size == expected_size),
+    }
+
+
+def extract_media_info(path: str, record: Dict) -> Dict:
+    """
+    Extract EXIF data from images and duration from audio/video files
+
+    Uses Pillow and ffprobe when available; missing tools are skipped.
+    """
+    info = {}
+    media_type = record.get("media_type")
+
+    if media_type == "photo":
+        try:
+            from PIL import ExifTags, Image
+        except ImportError:
+            return info
+
+        try:
+            with Image.open(path) as image:
+                info["width"], info["height"] = image.size
+                exif = image.getexif()
+                if exif:
+                    info["exif"] = {
+                        ExifTags.TAGS.get(tag, str(tag)): str(value)
+                        for tag, value in exif.items()
+                    }
+        except Exception as e:
+            info["media_info_error"] = str(e)
+
+    elif media_type in ("video", "audio", "voice"):
+        ffprobe = shutil.which("ffprobe")
+        if not ffprobe:
+            return info
+
+        try:
+            result = subprocess.run(
+                [
+                    ffprobe,
+                    "-v",
+                    "error",
+                    "-show_entries",
+                    "format=duration",
+                    "-of",
+                    "json",
+                    path,
+                ],
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            duration = json.loads(result.stdout).get("format", {}).get("duration")
+            if duration is not None:
+                info["duration"] = float(duration)
+        except Exception as e:
+            info["media_info_error"] = str(e)
+
+    return info
+
+
+register_processor("sha256", compute_sha256)
+register_processor("size", validate_size)
+register_processor("media_info", extract_media_info)
+
+
+def run_processors(path: str, record: Dict, processor_names: List[str]) -> Dict:
+    """
+    Run the selected processors for one file (executed in the worker pool)
+
+    Args:
+        path: Local path of the downloaded file
+        record: Download record of the file
+        processor_names: Names of the processors to run
+
+    Returns:
+        Merged processor results
+    """
+    results = {}
+
+    if not os.path.exists(path):
+        return {"error": "file_not_found"}
+
+    for name in processor_names:
+        processor = _PROCESSORS.get(name)
+        if processor is None:
+            continue
+        try:
+            results.update(processor(path, record))
+        except Exception as e:
+            results[f"{name}_error"] = str(e)
+
+    return results
+
+
+class PostProcessor:
+    """
+    Bounded post-processing stage fed by completed downloads
+
+    Completed files are queued with submit(); worker tasks hand each one
+    to a thread or process pool and append the results to the download
+    records file. When the queue is full, submit() waits, applying
+    backpressure instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        processors: Optional[List[str]] = None,
+        workers: int = POST_PROCESSING_WORKERS,
+        queue_size: int = POST_PROCESSING_QUEUE_SIZE,
+        executor: str = POST_PROCESSING_EXECUTOR,
+    ):
+        """
+        Args:
+            processors: Names of the processors to run (default POST_PROCESSORS)
+            workers: Number of pool workers
+            queue_size: Maximum number of files waiting to be processed
+            executor: "thread" or "process"
+        """
+        self.processors = list(processors or POST_PROCESSORS)
+        self.workers = max(1, workers)
+        self.executor_kind = executor
+        self.processed_count = 0
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._executor: Optional[Executor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Create the worker pool and start consuming the queue"""
+        if self.executor_kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="post-process"
+            )
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, path: str, record: Dict, records_path: str) -> None:
+        """
+        Queue a completed download for processing
+
+        Args:
+            path: Local path of the downloaded file
+            record: Download record of the file
+            records_path: Download records file receiving the results
+        """
+        await self._queue.put((path, record, records_path))
+
+    async def close(self) -> None:
+        """Wait for queued files to be processed and stop the workers"""
+        await self._queue.join()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            path, record, records_path = await self._queue.get()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, run_processors, path, record, self.processors
+                )
+                write_download_record(
+                    records_path,
+                    {"message_id": record["message_id"], "post_processing": results},
+                )
+                self.processed_count += 1
+            except Exception as e:
+                emit(
+                    ErrorEvent(
+                        "post_processing",
+                        f"{path}: {e}",
+                        record.get("chat_id"),
+                        record["message_id"],
+                    )
+                )
+            finally:
+                self._queue.task_done()
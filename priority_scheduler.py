@@ -0,0 +1,203 @@
+"""
+Priority scheduler module for Telegram Media Downloader
+Shares the download slots of the process between priority classes
+(interactive requests, incremental syncs, bulk backfills) and lets
+lower classes give their slot up at file and chunk boundaries
+"""
+
+import asyncio
+import heapq
+import inspect
+import itertools
+from typing import List, Optional, Tuple
+
+from config import SCHEDULER_SLOTS
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "incremental": 1, "bulk": 2}
+
+
+def priority_level(priority: str) -> int:
+    """
+    Rank of a priority class (lower is more urgent)
+
+    Raises:
+        ValueError: If the class is unknown
+    """
+    try:
+        return PRIORITIES[priority]
+    except KeyError:
+        raise ValueError(
+            f"Prioridade inválida: {priority} (use {', '.join(PRIORITIES)})"
+        )
+
+
+class PriorityScheduler:
+    """
+    Download slots granted by priority
+
+    Waiters are served most urgent class first, then in arrival order. A
+    download holding a slot calls checkpoint() between chunks; when a
+    more urgent download is waiting and no slot is free, it hands its
+    slot over and waits for the next one, so an interactive request runs
+    within a chunk of arriving without cancelling the bulk job.
+    """
+
+    def __init__(self, slots: int = SCHEDULER_SLOTS):
+        """
+        Args:
+            slots: Downloads that may run at the same time in the process
+        """
+        self.slots = slots
+        self.in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    def _grant(self) -> None:
+        while self._waiters and self.in_use < self.slots:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.in_use += 1
+                future.set_result(None)
+
+    async def acquire(self, level: int) -> None:
+        """Wait for a slot at the given priority level"""
+        if self.in_use < self.slots and not self._waiters:
+            self.in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._sequence), future))
+        self._grant()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted right before the cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Give a slot back"""
+        self.in_use -= 1
+        self._grant()
+
+    def urgent_waiting(self, level: int) -> bool:
+        """Whether a more urgent download is waiting for a slot"""
+        return any(
+            waiter[0] < level and not waiter[2].done() for waiter in self._waiters
+        )
+
+    def slot(self, priority: str, *semaphores: asyncio.Semaphore) -> "SchedulerSlot":
+        """
+        Slot for one download
+
+        Args:
+            priority: Priority class (key of PRIORITIES)
+            semaphores: Other limits held together with the slot (e.g.
+                the data center limit), released while preempted
+
+        Returns:
+            SchedulerSlot, to be used as an async context manager
+        """
+        return SchedulerSlot(self, priority_level(priority), semaphores)
+
+    def status(self) -> dict:
+        """Slots in use and waiting downloads per priority class"""
+        waiting = {name: 0 for name in PRIORITIES}
+        names = {level: name for name, level in PRIORITIES.items()}
+        for level, _, future in self._waiters:
+            if not future.done():
+                waiting[names[level]] += 1
+        return {"slots": self.slots, "in_use": self.in_use, "waiting": waiting}
+
+
+class SchedulerSlot:
+    """
+    Slot of a running download, preemptible at chunk boundaries
+
+    The scheduler slot is always taken before the extra semaphores and
+    both are given up together, so a preempted download holds nothing
+    that the more urgent one could be waiting for.
+    """
+
+    def __init__(
+        self,
+        scheduler: PriorityScheduler,
+        level: int,
+        semaphores: Tuple[asyncio.Semaphore, ...] = (),
+    ):
+        self.scheduler = scheduler
+        self.level = level
+        self.semaphores = semaphores
+        self.preemptions = 0
+        self._held = False
+
+    async def acquire(self) -> None:
+        await self.scheduler.acquire(self.level)
+        acquired = []
+        try:
+            for semaphore in self.semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            self.scheduler.release()
+            raise
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            for semaphore in self.semaphores:
+                semaphore.release()
+            self.scheduler.release()
+
+    async def checkpoint(self) -> None:
+        """Yield the slot if a more urgent download is waiting for one"""
+        if self._held and self.scheduler.urgent_waiting(self.level):
+            self.preemptions += 1
+            self.release()
+            await self.acquire()
+
+    def wrap(self, file) -> "PreemptibleWriter":
+        """Wrap a download target so every chunk passes a checkpoint"""
+        return PreemptibleWriter(file, self)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class PreemptibleWriter:
+    """Download target that checkpoints its slot before each chunk"""
+
+    def __init__(self, file, slot: SchedulerSlot):
+        self._file = file
+        self._slot = slot
+
+    async def write(self, data: bytes):
+        await self._slot.checkpoint()
+        result = self._file.write(data)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def flush(self) -> None:
+        if callable(getattr(self._file, "flush", None)):
+            self._file.flush()
+
+
+_scheduler: Optional[PriorityScheduler] = None
+
+
+def get_scheduler() -> PriorityScheduler:
+    """Return the process-wide priority scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PriorityScheduler()
+    return _scheduler
@@ -0,0 +1,189 @@
+"""
+Session manager module for Telegram Media Downloader
+Owns the lifetime of the Telegram client of a session: one connection
+reused by every API request, with a supervisor that checks it
+periodically and reconnects with exponential backoff when it drops
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from config import (
+    API_ID,
+    API_HASH,
+    SESSION_NAME,
+    SESSION_HEALTH_INTERVAL,
+    SESSION_PING_TIMEOUT,
+    SESSION_RECONNECT_MIN_DELAY,
+    SESSION_RECONNECT_MAX_DELAY,
+)
+from dc_pool import close_dc_pool
+from event_bus import emit, ErrorEvent
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+# Connection states reported by SessionManager.status()
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+
+
+class SessionManager:
+    """
+    Single connected client per session file
+
+    Telethon keeps a lock on the session file, so opening a second client
+    for the same session (e.g. on every login request) leaks sockets and
+    fails with "database is locked". All callers share the client
+    returned by get_client() instead.
+    """
+
+    def __init__(self, session_name: str = SESSION_NAME):
+        """
+        Args:
+            session_name: Session file name (without .session)
+        """
+        self.session_name = session_name
+        self.client: Optional[TelegramClient] = None
+        self.authorized = False
+
+        self.state = DISCONNECTED
+        self.latency_ms: Optional[float] = None
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reconnects = 0
+
+        self._lock = asyncio.Lock()
+        self._supervisor: Optional[asyncio.Task] = None
+
+    async def get_client(self) -> TelegramClient:
+        """
+        Return the connected client, creating and connecting it if needed
+
+        Returns:
+            Connected (not necessarily authorized) Telegram client
+        """
+        async with self._lock:
+            if self.client is None:
+                from telethon import TelegramClient
+
+                self.client = TelegramClient(self.session_name, API_ID, API_HASH)
+
+            if not self.client.is_connected():
+                self.state = CONNECTING
+                try:
+                    await self.client.connect()
+                except Exception as e:
+                    self.state = DISCONNECTED
+                    self.last_error = str(e)
+                    raise
+                self.state = CONNECTED
+
+            if self._supervisor is None or self._supervisor.done():
+                self._supervisor = asyncio.create_task(self._supervise())
+
+            return self.client
+
+    async def ping(self) -> float:
+        """
+        Measure the round trip of a lightweight RPC
+
+        Returns:
+            Latency in milliseconds
+
+        Raises:
+            asyncio.TimeoutError: If no answer arrives within
+                SESSION_PING_TIMEOUT seconds (e.g. a half-open connection)
+        """
+        from telethon.tl.functions.help import GetNearestDcRequest
+
+        started = time.monotonic()
+        await asyncio.wait_for(self.client(GetNearestDcRequest()), SESSION_PING_TIMEOUT)
+        self.latency_ms = round((time.monotonic() - started) * 1000, 1)
+        self.last_check = time.time()
+        return self.latency_ms
+
+    async def _reconnect(self) -> None:
+        self.state = RECONNECTING
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+        await self.client.connect()
+        self.reconnects += 1
+        self.state = CONNECTED
+
+    async def _supervise(self) -> None:
+        delay = SESSION_RECONNECT_MIN_DELAY
+        interval = SESSION_HEALTH_INTERVAL
+
+        while True:
+            try:
+                if not self.client.is_connected():
+                    await self._reconnect()
+                await self.ping()
+                self.state = CONNECTED
+                self.last_error = None
+                delay = SESSION_RECONNECT_MIN_DELAY
+                interval = SESSION_HEALTH_INTERVAL
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                # Reconnect on the next round, backing off while it keeps failing
+                self.state = DISCONNECTED
+                self.last_error = str(e)
+                self.latency_ms = None
+                emit(ErrorEvent("session", str(e)))
+                try:
+                    await self.client.disconnect()
+                except Exception:
+                    pass
+                interval = delay
+                delay = min(delay * 2, SESSION_RECONNECT_MAX_DELAY)
+            except Exception as e:
+                # RPC-level errors (flood waits, server errors) leave the
+                # connection usable: back off without tearing it down
+                self.last_error = str(e)
+                emit(ErrorEvent("session", str(e)))
+                interval = max(delay, getattr(e, "seconds", 0) or 0)
+                delay = min(delay * 2, SESSION_RECONNECT_MAX_DELAY)
+
+            await asyncio.sleep(interval)
+
+    def status(self) -> Dict:
+        """Connection state, last RPC latency and reconnect count"""
+        return {
+            "state": self.state,
+            "authorized": self.authorized,
+            "latency_ms": self.latency_ms,
+            "last_check": self.last_check,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+    async def close(self) -> None:
+        """Stop the supervisor and disconnect the client"""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+
+        if self.client is not None:
+            await close_dc_pool(self.client)
+            await self.client.disconnect()
+            self.client = None
+
+        self.authorized = False
+        self.state = DISCONNECTED
+
+
+_session_managers: Dict[str, SessionManager] = {}
+
+
+def get_session_manager(session_name: str = SESSION_NAME) -> SessionManager:
+    """Return the manager of a session, creating it on first use"""
+    if session_name not in _session_managers:
+        _session_managers[session_name] = SessionManager(session_name)
+    return _session_managers[session_name]
@@ -0,0 +1,524 @@
+"""
+Storage backend module for Telegram Media Downloader
+Abstracts where downloaded media is written: the local filesystem or an
+S3-compatible object store (AWS S3, MinIO, ...)
+"""
+
+import asyncio
+import errno
+import os
+import time
+from typing import List, Optional
+
+from config import (
+    EXPORTS_DIR,
+    STORAGE_BACKEND,
+    S3_ENDPOINT_URL,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    S3_REGION,
+    S3_MULTIPART_PART_SIZE,
+    LOCAL_WRITE_BUFFER_SIZE,
+    LOCAL_PREALLOCATE,
+    LOCAL_FSYNC_MODE,
+    LOCAL_FSYNC_BATCH_FILES,
+    LOCAL_FSYNC_BATCH_SECONDS,
+)
+from event_bus import emit, ErrorEvent
+
+
+class StorageWriter:
+    """
+    Writable destination for one downloaded file
+
+    Telethon accepts any object with a write() method as download target
+    (awaitable results are awaited), so writers are passed directly to
+    download_media. Use as an async context manager: the file is committed
+    on success and aborted if the download raises.
+    """
+
+    bytes_written = 0
+
+    def write(self, data: bytes):
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    async def commit(self) -> None:
+        raise NotImplementedError
+
+    async def abort(self) -> None:
+        raise NotImplementedError
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.abort()
+
+
+class StorageBackend:
+    """Base class for media storage backends"""
+
+    name = "base"
+
+    def makedirs(self, path: str) -> None:
+        """Create a directory (no-op for object stores)"""
+
+    def open_writer(
+        self, path: str, expected_size: Optional[int] = None
+    ) -> StorageWriter:
+        """Open a writer for the media file at path (of expected_size bytes)"""
+        raise NotImplementedError
+
+    async def sync(self) -> None:
+        """Make every committed file durable (no-op when already durable)"""
+
+    def size(self, path: str) -> Optional[int]:
+        """Return the stored size of path, or None if it does not exist"""
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        return self.size(path) is not None
+
+    def local_path(self, path: str) -> Optional[str]:
+        """Return a local filesystem path for path, or None if remote"""
+        return None
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FsyncBatcher:
+    """
+    Groups the fsyncs of committed files
+
+    Files are renamed into place right away and synced together once
+    LOCAL_FSYNC_BATCH_FILES have accumulated or the oldest one is
+    LOCAL_FSYNC_BATCH_SECONDS old (a timer covers exports that go quiet),
+    followed by one fsync per directory. A failed timer-driven sync is
+    reported as an ErrorEvent and raised by the next sync() call.
+    A power loss can only damage the last unsynced batch, which
+    verify_repair.py detects and re-downloads.
+    """
+
+    def __init__(
+        self,
+        max_files: int = LOCAL_FSYNC_BATCH_FILES,
+        max_seconds: float = LOCAL_FSYNC_BATCH_SECONDS,
+    ):
+        self.max_files = max_files
+        self.max_seconds = max_seconds
+        self._paths: List[str] = []
+        self._first_added = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        self._timer_error: Optional[BaseException] = None
+
+    async def add(self, path: str) -> None:
+        """Register a committed file, syncing the batch when it is due"""
+        if not self._paths:
+            self._first_added = time.monotonic()
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_seconds, self._on_timer
+            )
+        self._paths.append(path)
+
+        if (
+            len(self._paths) >= self.max_files
+            or time.monotonic() - self._first_added >= self.max_seconds
+        ):
+            await self._sync_pending()
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._timer_task = asyncio.ensure_future(self._sync_pending())
+        self._timer_task.add_done_callback(self._on_timer_done)
+
+    def _on_timer_done(self, task: asyncio.Task) -> None:
+        if task is self._timer_task:
+            self._timer_task = None
+        if not task.cancelled() and task.exception() is not None:
+            self._timer_error = task.exception()
+            emit(ErrorEvent("fsync", str(self._timer_error)))
+
+    async def _sync_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        paths, self._paths = self._paths, []
+        if paths:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._sync_paths, paths)
+
+    async def sync(self) -> None:
+        """
+        Sync every pending file and its directory
+
+        Raises:
+            OSError: If this sync, or a timer-driven one since the last
+                call, failed
+        """
+        if self._timer_task is not None:
+            await asyncio.wait([self._timer_task])
+        await self._sync_pending()
+
+        error, self._timer_error = self._timer_error, None
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _sync_paths(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                _fsync_path(path)
+            except OSError:
+                # Removed or replaced since the commit
+                pass
+        for directory in {os.path.dirname(path) or "." for path in paths}:
+            _fsync_path(directory)
+
+
+class LocalFileWriter(StorageWriter):
+    """
+    Writer for a file on the local filesystem
+
+    Data goes to a hidden ".part" file next to the target, which is
+    preallocated to the expected size (in a worker thread, on entering
+    the context) and renamed over the final name on commit, so an
+    interrupted download never leaves a partial file under the final
+    name. Small Telethon chunks are gathered into writes that are whole
+    multiples of LOCAL_WRITE_BUFFER_SIZE (only the tail is shorter),
+    which keeps files contiguous on disks and network volumes. The writes
+    run in a worker thread so they do not stall other downloads; the tail
+    is written on commit.
+    """
+
+    # Cleared once a filesystem reports that fallocate is unsupported
+    _fallocate_supported = hasattr(os, "posix_fallocate")
+
+    def __init__(
+        self,
+        path: str,
+        expected_size: Optional[int] = None,
+        buffer_size: int = LOCAL_WRITE_BUFFER_SIZE,
+        preallocate: bool = LOCAL_PREALLOCATE,
+        fsync_mode: str = LOCAL_FSYNC_MODE,
+        fsync_batcher: Optional[FsyncBatcher] = None,
+    ):
+        """
+        Args:
+            path: Final path of the file
+            expected_size: Size to preallocate, if known
+            buffer_size: Write granularity in bytes
+            preallocate: Reserve expected_size bytes up front
+            fsync_mode: "none", "file" or "batch"
+            fsync_batcher: Batcher used in "batch" mode
+        """
+        directory, name = os.path.split(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.temp_path = os.path.join(directory, f".{name}.part")
+        self.bytes_written = 0
+        self.buffer_size = buffer_size
+        self.fsync_mode = fsync_mode
+
+        self.expected_size = expected_size
+        self.preallocate = preallocate
+
+        self._fsync_batcher = fsync_batcher
+        self._buffer = bytearray()
+        self._file = open(self.temp_path, "wb", buffering=0)
+        self._preallocated = False
+
+    def _preallocate(self) -> None:
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, self.expected_size)
+            self._preallocated = True
+        except OSError as e:
+            # Not supported by every filesystem: stop trying
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                LocalFileWriter._fallocate_supported = False
+
+    async def __aenter__(self):
+        if self.preallocate and self.expected_size and self._fallocate_supported:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._preallocate)
+        return self
+
+    def _write_all(self, data) -> None:
+        # Unbuffered files may write less than requested
+        view = memoryview(data)
+        while view:
+            written = self._file.write(view)
+            if not written:
+                raise OSError(errno.EIO, f"Escrita incompleta em {self.temp_path}")
+            view = view[written:]
+
+    async def _write_block(self, block) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_all, block)
+
+    async def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+
+        if len(self._buffer) >= self.buffer_size:
+            aligned = len(self._buffer) - len(self._buffer) % self.buffer_size
+            # Detached from the buffer before the thread writes it
+            block = self._buffer[:aligned]
+            del self._buffer[:aligned]
+            await self._write_block(block)
+
+        return len(data)
+
+    async def commit(self) -> None:
+        if self._buffer:
+            block, self._buffer = self._buffer, bytearray()
+            await self._write_block(block)
+        if self._preallocated:
+            # Drop the reserved space beyond the real size
+            self._file.truncate(self.bytes_written)
+        if self.fsync_mode == "file":
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, os.fsync, self._file.fileno())
+        self._file.close()
+
+        os.replace(self.temp_path, self.path)
+        if self.fsync_mode == "batch" and self._fsync_batcher is not None:
+            await self._fsync_batcher.add(self.path)
+
+    async def abort(self) -> None:
+        self._file.close()
+        self._buffer = bytearray()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class LocalStorage(StorageBackend):
+    """Store media on the local filesystem (default)"""
+
+    name = "local"
+
+    def __init__(self, fsync_mode: str = LOCAL_FSYNC_MODE):
+        """
+        Args:
+            fsync_mode: "none", "file" (fsync before every rename) or
+                "batch" (group fsyncs through an FsyncBatcher)
+        """
+        if fsync_mode not in ("none", "file", "batch"):
+            raise ValueError(f"LOCAL_FSYNC_MODE inválido: {fsync_mode}")
+        self.fsync_mode = fsync_mode
+        self._fsync_batcher = FsyncBatcher()
+
+    def makedirs(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+
+    def open_writer(
+        self, path: str, expected_size: Optional[int] = None
+    ) -> StorageWriter:
+        return LocalFileWriter(
+            path,
+            expected_size,
+            fsync_mode=self.fsync_mode,
+            fsync_batcher=self._fsync_batcher,
+        )
+
+    async def sync(self) -> None:
+        await self._fsync_batcher.sync()
+
+    def size(self, path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def local_path(self, path: str) -> Optional[str]:
+        return path
+
+
+class S3MultipartWriter(StorageWriter):
+    """
+    Stream a download to an S3 object through multipart upload
+
+    Data is buffered only up to one part; each full part is uploaded in a
+    worker thread while the download waits, so no local copy is made.
+    Files smaller than one part are stored with a single PutObject.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+
+        self._s3 = s3_client
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    async def _run(self, func, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(**kwargs))
+
+    async def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            response = await self._run(
+                self._s3.create_multipart_upload, Bucket=self.bucket, Key=self.key
+            )
+            self._upload_id = response["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = await self._run(
+            self._s3.upload_part,
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    async def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+
+        if len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            await self._upload_part(part)
+
+        return len(data)
+
+    async def commit(self) -> None:
+        if self._upload_id is None:
+            await self._run(
+                self._s3.put_object,
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+            )
+            self._buffer = bytearray()
+            return
+
+        if self._buffer:
+            await self._upload_part(bytes(self._buffer))
+            self._buffer = bytearray()
+
+        await self._run(
+            self._s3.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    async def abort(self) -> None:
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            await self._run(
+                self._s3.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+            )
+            self._upload_id = None
+
+
+class S3Storage(StorageBackend):
+    """Store media in an S3-compatible bucket (requires boto3)"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        prefix: str = S3_PREFIX,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        part_size: int = S3_MULTIPART_PART_SIZE,
+        s3_client=None,
+    ):
+        """
+        Args:
+            bucket: Destination bucket
+            prefix: Key prefix prepended to every object
+            endpoint_url: Custom endpoint (e.g. http://localhost:9000 for MinIO)
+            part_size: Multipart part size in bytes (S3 minimum is 5MB)
+            s3_client: Pre-built boto3 S3 client (mainly for tests)
+        """
+        if s3_client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("boto3 é necessário para STORAGE_BACKEND='s3'")
+
+            s3_client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                aws_access_key_id=S3_ACCESS_KEY,
+                aws_secret_access_key=S3_SECRET_KEY,
+                region_name=S3_REGION,
+            )
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = part_size
+        self._s3 = s3_client
+
+    def object_key(self, path: str) -> str:
+        """Map an export path (under EXPORTS_DIR) to an object key"""
+        relative = os.path.relpath(path, EXPORTS_DIR).replace(os.sep, "/")
+        return f"{self.prefix}/{relative}" if self.prefix else relative
+
+    def open_writer(
+        self, path: str, expected_size: Optional[int] = None
+    ) -> StorageWriter:
+        return S3MultipartWriter(
+            self._s3, self.bucket, self.object_key(path), self.part_size
+        )
+
+    def size(self, path: str) -> Optional[int]:
+        try:
+            response = self._s3.head_object(
+                Bucket=self.bucket, Key=self.object_key(path)
+            )
+        except Exception:
+            return None
+        return response.get("ContentLength")
+
+
+_storage_backend: Optional[StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """Return the storage backend selected by STORAGE_BACKEND"""
+    global _storage_backend
+
+    if _storage_backend is None:
+        if STORAGE_BACKEND == "s3":
+            _storage_backend = S3Storage()
+        elif STORAGE_BACKEND == "local":
+            _storage_backend = LocalStorage()
+        else:
+            raise ValueError(f"STORAGE_BACKEND inválido: {STORAGE_BACKEND}")
+
+    return _storage_backend
+
+
+def set_storage_backend(backend: StorageBackend) -> None:
+    """Replace the active storage backend (e.g. a MinIO-backed S3Storage)"""
+    global _storage_backend
+    _storage_backend = backend
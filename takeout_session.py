@@ -0,0 +1,171 @@
+"""
+Takeout session module for Telegram Media Downloader
+Runs bulk exports through a Telegram takeout session (the account data
+export API), which has much higher flood limits for history and file
+requests, and falls back to the regular session when Telegram refuses
+the takeout, keeps it pending or invalidates it mid-run
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from config import MAX_FILE_SIZE
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+
+def is_takeout_error(error: Exception) -> bool:
+    """Whether an error means the takeout session can no longer be used"""
+    from telethon import errors
+
+    return isinstance(error, (errors.TakeoutInvalidError, errors.TakeoutRequiredError))
+
+
+def _install_file_takeout(client: TelegramClient) -> None:
+    """
+    Send file chunks of the home data center inside the takeout session
+
+    The takeout client only wraps requests sent with client(request);
+    download_file sends GetFileRequest through client._call, which is
+    wrapped on this client instance while client._takeout_files is set.
+    Exported senders of other data centers are left untouched.
+    """
+    if hasattr(client, "_takeout_files"):
+        return
+
+    from telethon.tl.functions import InvokeWithTakeoutRequest
+
+    original_call = client._call
+
+    async def call(sender, request, *args, **kwargs):
+        takeout_id = client.session.takeout_id
+        if (
+            client._takeout_files
+            and takeout_id is not None
+            and sender is client._sender
+            and type(request).__name__ == "GetFileRequest"
+        ):
+            request = InvokeWithTakeoutRequest(takeout_id, request)
+        return await original_call(sender, request, *args, **kwargs)
+
+    client._call = call
+    client._takeout_files = False
+
+
+class TakeoutSession:
+    """
+    Export client backed by a takeout session when Telegram grants one
+
+    Use as an async context manager and send every export request
+    through the client attribute: the takeout client while the session
+    is active, the regular client otherwise. Telegram only starts a
+    takeout after the user approves it in the app ("pending"), so the
+    first run usually falls back and the next ones use it.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        enabled: bool = True,
+        max_file_size: int = MAX_FILE_SIZE,
+    ):
+        """
+        Args:
+            client: Authenticated Telegram client
+            enabled: Try to open a takeout session (False: regular client)
+            max_file_size: Largest file the takeout may download (bytes)
+        """
+        self.client = client
+        self.enabled = enabled
+        self.max_file_size = max_file_size
+        self.active = False
+        self._regular = client
+        self._takeout = None
+
+    def _request(self):
+        # Private chats need "users"; groups are "chats" or "megagroups"
+        return self._regular.takeout(
+            finalize=True,
+            users=True,
+            chats=True,
+            megagroups=True,
+            channels=True,
+            files=True,
+            max_file_size=self.max_file_size,
+        )
+
+    async def _start(self):
+        from telethon import errors
+
+        try:
+            try:
+                return await self._request().__aenter__()
+            except ValueError:
+                # Takeout left open by an interrupted run: finish it and retry
+                await self._regular.end_takeout(success=False)
+                return await self._request().__aenter__()
+        except ValueError as e:
+            print(f"⚠️ Takeout anterior ainda aberto nesta sessão: {e}")
+        except errors.TakeoutInitDelayError as e:
+            hours = e.seconds // 3600
+            print(
+                f"⏳ Takeout pendente: aprove a exportação de dados no app do "
+                f"Telegram (ou aguarde ~{hours}h) e execute novamente"
+            )
+        except errors.RPCError as e:
+            print(f"⚠️ Takeout recusado pelo Telegram: {e}")
+        return None
+
+    async def __aenter__(self) -> "TakeoutSession":
+        if self.enabled:
+            self._takeout = await self._start()
+
+        if self._takeout is None:
+            if self.enabled:
+                print("ℹ️ Continuando com a sessão normal")
+            return self
+
+        _install_file_takeout(self._regular)
+        self._regular._takeout_files = True
+        self.client = self._takeout
+        self.active = True
+        print("📦 Sessão takeout iniciada (limites de exportação em massa)")
+        return self
+
+    def fallback(self, error: Exception) -> bool:
+        """
+        Switch to the regular client after a takeout error
+
+        Args:
+            error: Exception raised by a request of the export
+
+        Returns:
+            True if the export should be retried with self.client
+        """
+        if not self.active or not is_takeout_error(error):
+            return False
+
+        print(f"⚠️ Sessão takeout encerrada pelo Telegram ({error}); usando a normal")
+        self.client = self._regular
+        self.active = False
+        self._regular._takeout_files = False
+        return True
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self._takeout is None:
+            return
+
+        self._regular._takeout_files = False
+        try:
+            await self._takeout.__aexit__(
+                exc_type or (None if self.active else RuntimeError), None, None
+            )
+        except Exception as e:
+            print(f"⚠️ Não foi possível finalizar a sessão takeout: {e}")
+        # A takeout id left in the session would block the next takeout
+        self._regular.session.takeout_id = None
+        self._takeout = None
+        self.client = self._regular
+        self.active = False
@@ -8,10 +8,13 @@ following the MVP specifications from the PRD.
 
 import asyncio
 import sys
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from config import DEFAULT_LIMIT_PER_CHAT
+from config import DEFAULT_LIMIT_PER_CHAT, USE_TAKEOUT
+from chat_catalog import ChatCatalog, parse_chat_link
+from dc_pool import close_dc_pool
 from telethon_handlers import login_with_qr, export_chat_list, export_all_chats_media
+from watch_mode import watch_chats
 
 
 def print_banner():
@@ -66,31 +69,28 @@ Para grupos com tópicos, subdiretórios serão criados automaticamente.
     print(instructions)
 
 
-def display_chat_summary(chat_list: List[Dict]) -> None:
+def display_chat_summary(
+    chat_list: List[Dict], catalog: Optional[ChatCatalog] = None
+) -> None:
     """
     Display summary of found chats
 
     Args:
         chat_list: List of chat information dictionaries
+        catalog: Indexed catalog of chat_list (built if not provided)
     """
     if not chat_list:
         print("❌ Nenhum chat encontrado")
         return
 
+    catalog = catalog or ChatCatalog(chat_list)
+
     print(f"\n📋 RESUMO DOS CHATS ENCONTRADOS ({len(chat_list)} total):")
     print("-" * 80)
 
-    # Group by type
-    by_type = {}
-    for chat in chat_list:
-        chat_type = chat["type"]
-        if chat_type not in by_type:
-            by_type[chat_type] = []
-        by_type[chat_type].append(chat)
-
     # Display summary by type
-    for chat_type, chats in by_type.items():
-        print(f"📂 {chat_type}: {len(chats)} chats")
+    for chat_type, count in catalog.count_by_type().items():
+        print(f"📂 {chat_type}: {count} chats")
 
     print("-" * 80)
 
@@ -108,16 +108,21 @@ def display_chat_summary(chat_list: List[Dict]) -> None:
         print(f"    ... e mais {len(chat_list) - 10} chats")
 
 
-async def interactive_chat_selection(chat_list: List[Dict]) -> List[Dict]:
+async def interactive_chat_selection(
+    chat_list: List[Dict], catalog: Optional[ChatCatalog] = None
+) -> List[Dict]:
     """
     Allow user to interactively select which chats to process
 
     Args:
         chat_list: List of all available chats
+        catalog: Indexed catalog of chat_list (built if not provided)
 
     Returns:
         List of selected chats to process
     """
+    catalog = catalog or ChatCatalog(chat_list)
+
     print(f"\n🎯 SELEÇÃO DE CHATS PARA DOWNLOAD")
     print("Escolha uma das opções:")
     print("1. 📋 Selecionar da lista de chats")
@@ -131,7 +136,7 @@ async def interactive_chat_selection(chat_list: List[Dict]) -> List[Dict]:
         if choice == "1":
             return await select_from_chat_list(chat_list)
         elif choice == "2":
-            return await select_by_chat_id(chat_list)
+            return await select_by_chat_id(catalog)
         elif choice == "3":
             return await select_by_chat_link()
         elif choice == "4":
@@ -189,7 +194,7 @@ async def select_from_chat_list(chat_list: List[Dict]) -> List[Dict]:
             continue
 
 
-async def select_by_chat_id(chat_list: List[Dict]) -> List[Dict]:
+async def select_by_chat_id(catalog: ChatCatalog) -> List[Dict]:
     """Select chat by specific ID"""
     print(f"\n🆔 SELEÇÃO POR ID DO CHAT")
     print("💡 Você pode inserir um ou múltiplos IDs separados por vírgula")
@@ -212,11 +217,7 @@ async def select_by_chat_id(chat_list: List[Dict]) -> List[Dict]:
             # Find chats by ID
             selected_chats = []
             for chat_id in chat_ids:
-                found_chat = None
-                for chat in chat_list:
-                    if chat["id"] == chat_id:
-                        found_chat = chat
-                        break
+                found_chat = catalog.get(chat_id)
 
                 if found_chat:
                     selected_chats.append(found_chat)
@@ -279,56 +280,13 @@ async def select_by_chat_link() -> List[Dict]:
         selected_chats = []
 
         for link_str in links_input.split(","):
-            link = link_str.strip()
-
-            # Parse different link formats
-            username = None
-            chat_id = None
-
-            if link.startswith("https://t.me/c/"):
-                # Private chat link: https://t.me/c/1234567890/1
-                try:
-                    parts = link.split("/")
-                    chat_id = int(parts[4])
-                    # Convert to proper chat ID format
-                    chat_id = int(f"-100{chat_id}")
-                except:
-                    print(f"❌ Link inválido: {link}")
-                    continue
-
-            elif link.startswith("https://t.me/"):
-                # Public chat link: https://t.me/username
-                username = link.split("/")[-1]
-
-            elif link.startswith("@"):
-                # Username format: @username
-                username = link[1:]
+            try:
+                custom_chat = parse_chat_link(link_str)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
 
-            else:
-                # Assume it's a username
-                username = link
-
-            # Create chat entry
-            if chat_id:
-                custom_chat = {
-                    "id": chat_id,
-                    "title": f"Chat_Link_{abs(chat_id)}",
-                    "type": "Channel",
-                    "username": None,
-                    "participants_count": 0,
-                    "is_forum": False,
-                    "access_hash": None,
-                }
-            elif username:
-                custom_chat = {
-                    "id": 0,  # Will be resolved later
-                    "title": f"@{username}",
-                    "type": "Channel",
-                    "username": username,
-                    "participants_count": 0,
-                    "is_forum": False,
-                }
-            else:
+            if custom_chat is None:
                 continue
 
             selected_chats.append(custom_chat)
@@ -407,12 +365,17 @@ def parse_selection_input(selection: str, max_count: int) -> List[int]:
     return sorted(list(indices))
 
 
-async def main():
+async def main(metadata_only: bool = False, watch: bool = False, takeout: bool = False):
     """
     Main application function that orchestrates the entire process:
     1. QR Code Login
     2. Chat List Export
     3. Organized Media Download
+
+    Args:
+        metadata_only: Only catalog media metadata instead of downloading
+        watch: Keep running and download new media as it arrives
+        takeout: Export through a takeout session (higher flood limits)
     """
     print_banner()
 
@@ -435,23 +398,37 @@ async def main():
             return
 
         # Step 3: Display chat summary
-        display_chat_summary(chat_list)
+        catalog = ChatCatalog(chat_list)
+        display_chat_summary(chat_list, catalog)
 
         # Step 4: Chat selection (for MVP, automatic selection)
         print("\n🎯 ETAPA 3: SELEÇÃO DE CHATS")
-        selected_chats = await interactive_chat_selection(chat_list)
+        selected_chats = await interactive_chat_selection(chat_list, catalog)
 
         if not selected_chats:
             print("ℹ️ Nenhum chat selecionado para download")
             await client.disconnect()
             return
 
+        # Step 5 (watch mode): download new media until interrupted
+        if watch:
+            print("\n👀 ETAPA 4: MONITORAMENTO DE NOVAS MÍDIAS (Ctrl+C para sair)")
+            await watch_chats(client, selected_chats)
+            return
+
         # Step 5: Media download
-        print("\n📥 ETAPA 4: DOWNLOAD DE MÍDIAS")
+        if metadata_only:
+            print("\n🗂️ ETAPA 4: CATÁLOGO DE METADADOS (sem download)")
+        else:
+            print("\n📥 ETAPA 4: DOWNLOAD DE MÍDIAS")
         print(f"🎯 Limite de mensagens por chat: {DEFAULT_LIMIT_PER_CHAT}")
 
         successful, failed = await export_all_chats_media(
-            client, selected_chats, DEFAULT_LIMIT_PER_CHAT
+            client,
+            selected_chats,
+            DEFAULT_LIMIT_PER_CHAT,
+            metadata_only,
+            takeout=takeout,
         )
 
         # Final report
@@ -479,6 +456,7 @@ async def main():
     finally:
         # Always disconnect client
         if "client" in locals() and client:
+            await close_dc_pool(client)
             await client.disconnect()
             print("🔌 Cliente desconectado")
 
@@ -504,10 +482,33 @@ def check_configuration():
 if __name__ == "__main__":
     print("🚀 Iniciando Telegram Media Downloader...")
 
+    # Optional flag: catalog media metadata without downloading files
+    metadata_only = "--metadata-only" in sys.argv
+
+    # Optional flag: keep running and download new media as it arrives
+    watch = "--watch" in sys.argv
+
+    # Optional flag: export through a takeout session (bulk export limits)
+    takeout = "--takeout" in sys.argv or USE_TAKEOUT
+
     # Check configuration first
     if not check_configuration():
         sys.exit(1)
 
+    # Unattended mode: run a JSON job spec without any prompt
+    # (--job spec.json [--dry-run]); the exit code reports the result
+    if "--job" in sys.argv:
+        from batch_jobs import EXIT_JOB_ERROR, run_batch_job
+
+        job_index = sys.argv.index("--job") + 1
+        if job_index >= len(sys.argv):
+            print("❌ Uso: python telegram_downloader.py --job spec.json [--dry-run]")
+            sys.exit(EXIT_JOB_ERROR)
+
+        sys.exit(
+            asyncio.run(run_batch_job(sys.argv[job_index], "--dry-run" in sys.argv))
+        )
+
     # Print usage instructions
     print_usage_instructions()
 
@@ -520,7 +521,7 @@ if __name__ == "__main__":
 
     # Run the main application
     try:
-        asyncio.run(main())
+        asyncio.run(main(metadata_only, watch, takeout))
     except KeyboardInterrupt:
         print("\n❌ Aplicação interrompida pelo usuário")
     except Exception as e:
@@ -4,17 +4,17 @@ Contains all Telethon-specific functionality including authentication,
 chat listing, media downloading, and forum topic handling
 """
 
-import asyncio
+from __future__ import annotations
+
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from telethon import TelegramClient
-from telethon.tl.functions.channels import GetForumTopicsRequest
-from telethon.tl.functions.messages import GetDialogsRequest
-from telethon.tl.types import Channel, InputPeerEmpty
-from qrcode import QRCode
-from tqdm import tqdm
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+# Telethon, qrcode and tqdm are imported where they are used, so the API
+# (which never prints QR codes or progress bars) starts quickly
+if TYPE_CHECKING:
+    from telethon import TelegramClient
 
 from config import (
     API_ID,
@@ -23,20 +23,34 @@ from config import (
     EXPORTS_DIR,
     MAX_FILE_SIZE,
     CONCURRENT_DOWNLOADS,
+    METADATA_CATALOG_FILENAME,
+    OUTPUT_MODE,
+    USE_TAKEOUT,
+)
+from file_utils import generate_filename, build_media_record, get_media_type_name
+from media_catalog import MediaCatalogWriter
+from chat_catalog import CHAT_LIST_FILENAME
+from event_bus import (
+    emit,
+    get_event_bus,
+    ChatFinished,
+    ChatStarted,
+    ErrorEvent,
+    ResolveAttempt,
 )
-from file_utils import (
-    sanitize_filename,
-    create_media_directories,
-    ensure_directories_exist,
-    get_media_type_name,
-    generate_filename,
-    write_download_log,
-    format_file_size,
+from download_pipeline import (
+    ChatDownloadPipeline,
+    get_chat_base_dir,
+    resolve_message_topic,
 )
+from trace_replay import get_trace_recorder, trace_chat
+from takeout_session import TakeoutSession, is_takeout_error
 
 
 def generate_qr_code(token: str) -> None:
     """Generate and display QR code in terminal"""
+    from qrcode import QRCode
+
     qr = QRCode()
     qr.clear()
     qr.add_data(token)
@@ -58,6 +72,8 @@ async def login_with_qr(max_attempts: int = 5) -> Optional[TelegramClient]:
     Returns:
         Authenticated Telegram client or None if failed
     """
+    from telethon import TelegramClient
+
     print("=== INICIANDO LOGIN VIA QR CODE ===")
 
     client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
@@ -91,7 +107,7 @@ async def login_with_qr(max_attempts: int = 5) -> Optional[TelegramClient]:
         except TimeoutError:
             print("⏰ QR Code expirou, gerando novo...")
             await qr_login.recreate()
-        
+
         except Exception as e:
             error_str = str(e)
             if "SessionPasswordNeededError" in error_str:
@@ -118,6 +134,34 @@ async def login_with_qr(max_attempts: int = 5) -> Optional[TelegramClient]:
     return client
 
 
+async def connect_saved_session(
+    session_name: str = SESSION_NAME,
+) -> Optional[TelegramClient]:
+    """
+    Connect with the saved session without any interactive step
+
+    Args:
+        session_name: Session file name (without .session)
+
+    Returns:
+        Authenticated Telegram client, or None if there is no authorized
+        session (log in once with login_with_qr first)
+    """
+    from telethon import TelegramClient
+
+    if not os.path.exists(f"{session_name}.session"):
+        return None
+
+    client = TelegramClient(session_name, API_ID, API_HASH)
+    await client.connect()
+
+    if await client.is_user_authorized():
+        return client
+
+    await client.disconnect()
+    return None
+
+
 async def export_chat_list(client: TelegramClient) -> List[Dict]:
     """
     Export complete list of chats, groups and channels
@@ -128,6 +172,9 @@ async def export_chat_list(client: TelegramClient) -> List[Dict]:
     Returns:
         List of chat information dictionaries
     """
+    from telethon.tl.functions.messages import GetDialogsRequest
+    from telethon.tl.types import InputPeerEmpty
+
     print("📋 Exportando lista de chats...")
 
     try:
@@ -159,7 +206,7 @@ async def export_chat_list(client: TelegramClient) -> List[Dict]:
 
         # Save to JSON file
         os.makedirs(EXPORTS_DIR, exist_ok=True)
-        json_path = os.path.join(EXPORTS_DIR, "chat_list.json")
+        json_path = os.path.join(EXPORTS_DIR, CHAT_LIST_FILENAME)
 
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(chat_list, f, ensure_ascii=False, indent=2, default=str)
@@ -183,6 +230,17 @@ async def get_forum_topics(client: TelegramClient, chat_entity) -> Dict[int, str
     Returns:
         Dictionary mapping topic ID to topic name
     """
+    try:
+        from telethon.tl.functions.messages import GetForumTopicsRequest
+
+        peer_arg = "peer"
+    except ImportError:
+        # Older Telethon releases keep it under channels
+        from telethon.tl.functions.channels import GetForumTopicsRequest
+
+        peer_arg = "channel"
+    from telethon.tl.types import Channel
+
     topics = {}
 
     try:
@@ -191,7 +249,7 @@ async def get_forum_topics(client: TelegramClient, chat_entity) -> Dict[int, str
 
             result = await client(
                 GetForumTopicsRequest(
-                    channel=chat_entity,
+                    **{peer_arg: chat_entity},
                     offset_date=None,
                     offset_id=0,
                     offset_topic=0,
@@ -215,7 +273,17 @@ async def get_forum_topics(client: TelegramClient, chat_entity) -> Dict[int, str
 
 
 async def export_media_organized(
-    client: TelegramClient, chat_entity, limit: int = 1000
+    client: TelegramClient,
+    chat_entity,
+    limit: int = 1000,
+    output_mode: str = OUTPUT_MODE,
+    media_types: Optional[List[str]] = None,
+    concurrency: int = CONCURRENT_DOWNLOADS,
+    min_id: int = 0,
+    max_id: int = 0,
+    priority: str = "bulk",
+    stats: Optional[Dict] = None,
+    skip_recorded: bool = False,
 ) -> int:
     """
     Export media from a chat in organized structure
@@ -224,49 +292,55 @@ async def export_media_organized(
         client: Telegram client
         chat_entity: Chat entity to download from
         limit: Maximum number of messages to process
+        output_mode: "files" for one file per media, "tar" or "zip" to
+            store media in size-capped archive shards
+        media_types: Only download these media types (default: all)
+        concurrency: Maximum simultaneous downloads for this chat
+        min_id: Only messages with a greater ID (0 = no lower bound)
+        max_id: Only messages with a smaller ID (0 = no upper bound)
+        priority: "interactive", "incremental" or "bulk" download priority
+        stats: Optional dictionary filled with the "downloaded", "failed",
+            "near_duplicates" and "recorded" counts of the export and the
+            "failed_ids" of the messages whose download failed
+        skip_recorded: Skip media that already have a download record
 
     Returns:
         Number of files downloaded
     """
+    from tqdm import tqdm
+
+    # Opt-in trace of the RPCs of this export (TRACE_RECORD_PATH)
+    recorder = get_trace_recorder()
+    if recorder is not None:
+        recorder.install(client)
+
     # Get chat information
     chat_info = await client.get_entity(chat_entity)
     chat_name = getattr(chat_info, "title", f"Chat_{chat_info.id}")
-    chat_name_clean = sanitize_filename(chat_name)
-
-    print(f"📥 Iniciando download de mídias do chat: {chat_name}")
 
     # Get forum topics if applicable
     topics = await get_forum_topics(client, chat_info)
     is_forum = len(topics) > 0
+    if recorder is not None:
+        recorder.record_history(len(topics))
+    emit(ChatStarted(chat_info.id, chat_name, len(topics)))
+
+    # Create directory structure, logs and post-processing stage
+    pipeline = ChatDownloadPipeline(
+        client,
+        chat_info,
+        topics,
+        output_mode,
+        concurrency,
+        media_types,
+        priority,
+        skip_recorded,
+    )
+    await pipeline.start()
 
-    # Create base directory structure
-    base_dir = os.path.join(EXPORTS_DIR, f"{chat_name_clean}_{chat_info.id}")
-
-    # Main media directories (for messages without topics)
-    main_media_dirs = create_media_directories(base_dir)
-    ensure_directories_exist(main_media_dirs)
-
-    # Topic-specific directories (if forum)
-    topic_media_dirs = {}
-    if is_forum:
-        for topic_id, topic_name in topics.items():
-            topic_dirs = create_media_directories(base_dir, topic_name)
-            topic_media_dirs[topic_id] = topic_dirs
-            ensure_directories_exist(topic_dirs)
-
-    # Setup logging
-    log_file = os.path.join(base_dir, "download_log.txt")
-
-    # Counters
-    downloaded_count = 0
-    topic_counts = {}
     processed_count = 0
 
-    # Semaphore for concurrent downloads
-    semaphore = asyncio.Semaphore(CONCURRENT_DOWNLOADS)
-    download_tasks = []
-
-    print(f"📁 Estrutura de diretórios criada em: {base_dir}")
+    print(f"📁 Estrutura de diretórios criada em: {pipeline.base_dir}")
     if is_forum:
         print(f"📂 Grupo com tópicos detectado - {len(topics)} tópicos organizados")
 
@@ -276,107 +350,222 @@ async def export_media_organized(
     # Initialize progress bar manually for async iteration
     pbar = tqdm(total=limit, desc="Analisando mensagens", unit="msg")
 
-    async for message in client.iter_messages(chat_entity, limit=limit):
+    # Album members arrive consecutively and are batched by grouped_id
+    album_messages = []
+
+    def flush_album():
+        if album_messages:
+            try:
+                # History is iterated newest first; albums are stored in order
+                pipeline.enqueue_album(list(reversed(album_messages)))
+            except Exception as e:
+                emit(ErrorEvent("album", str(e), chat_info.id, album_messages[0].id))
+            album_messages.clear()
+
+    async for message in client.iter_messages(
+        chat_entity, limit=limit, min_id=min_id, max_id=max_id
+    ):
+        if pipeline.takeout_error is not None:
+            # Every further file request would fail the same way
+            break
+
         processed_count += 1
         pbar.update(1)
 
-        # Skip messages without media
-        if message.media is None:
-            continue
-
-        try:
-            # Determine message topic (if applicable)
-            topic_id = None
-            topic_name = None
-            current_dirs = main_media_dirs
-
-            if (
-                is_forum
-                and hasattr(message, "reply_to")
-                and message.reply_to
-                and hasattr(message.reply_to, "reply_to_top_id")
-            ):
-
-                top_msg_id = message.reply_to.reply_to_top_id
-                if top_msg_id in topics:
-                    topic_id = top_msg_id
-                    topic_name = topics[top_msg_id]
-                    current_dirs = topic_media_dirs.get(top_msg_id, main_media_dirs)
-
-                    # Initialize topic counter
-                    if topic_name not in topic_counts:
-                        topic_counts[topic_name] = 0
-
-            # Determine media type and target directory
-            media_type = get_media_type_name(message)
-            target_dir = current_dirs.get(media_type, current_dirs["other"])
-
-            # Generate filename
-            filename = generate_filename(message, topic_name)
-            filepath = os.path.join(target_dir, filename)
-
-            # Skip if document size exceeds limit
-            if (
-                hasattr(message, "document")
-                and hasattr(message.document, "size")
-                and message.document.size
-                and message.document.size > MAX_FILE_SIZE
-            ):
-                size_str = format_file_size(message.document.size)
-                print(
-                    f"⚠️ Tamanho excede o limite ({size_str}). Pulando {filename}"
-                )
-                continue
+        if pipeline.message_index is not None:
+            pipeline.message_index.add(message, chat_info.id, chat_name)
 
-            async def download_and_log():
-                async with semaphore:
-                    print(f"📥 Baixando: {filename}")
-                    await client.download_media(message, file=filepath)
-                write_download_log(
-                    log_file,
-                    filename,
-                    media_type,
-                    message.id,
-                    message.date,
-                    topic_name,
-                )
-                return topic_name
+        grouped_id = getattr(message, "grouped_id", None)
+        if grouped_id and message.media is not None:
+            if album_messages and album_messages[0].grouped_id != grouped_id:
+                flush_album()
+            album_messages.append(message)
+            continue
 
-            download_tasks.append(asyncio.create_task(download_and_log()))
+        flush_album()
 
+        try:
+            pipeline.enqueue(message)
         except Exception as e:
-            print(f"❌ Erro ao baixar mídia da mensagem {message.id}: {e}")
+            emit(ErrorEvent("enqueue", str(e), chat_info.id, message.id))
             continue
 
+    flush_album()
+
     # Close progress bar and wait for downloads
     pbar.close()
+    await pipeline.close()
 
-    results = await asyncio.gather(*download_tasks, return_exceptions=True)
-    for res in results:
-        if isinstance(res, Exception):
-            print(f"❌ Erro em tarefa de download: {res}")
-            continue
-        downloaded_count += 1
-        if res:
-            topic_counts[res] += 1
+    if pipeline.takeout_error is not None:
+        # Handled like takeout errors of history requests (session fallback)
+        raise pipeline.takeout_error
+
+    emit(
+        ChatFinished(
+            chat_info.id, chat_name, pipeline.downloaded_count, pipeline.failed_count
+        )
+    )
+    # Let pending progress lines print before the report
+    await get_event_bus().aflush()
 
     # Final report
     print(f"\n✅ Download concluído!")
     print(f"📊 Estatísticas:")
     print(f"   - Mensagens processadas: {processed_count}")
-    print(f"   - Arquivos baixados: {downloaded_count}")
-    print(f"   - Diretório: {base_dir}")
-
-    if topic_counts:
+    print(f"   - Arquivos baixados: {pipeline.downloaded_count}")
+    if pipeline.failed_count:
+        print(f"   - Falhas: {pipeline.failed_count}")
+    if pipeline.near_duplicate_count:
+        print(f"   - Quase duplicadas: {pipeline.near_duplicate_count}")
+    if pipeline.recorded_count:
+        print(f"   - Já baixados anteriormente: {pipeline.recorded_count}")
+    print(f"   - Diretório: {pipeline.base_dir}")
+    if pipeline.use_archive:
+        print(f"   - Pacotes ({output_mode}): {pipeline.archive_dir}")
+
+    if pipeline.topic_counts:
         print(f"📁 Downloads por tópico:")
-        for topic, count in topic_counts.items():
+        for topic, count in pipeline.topic_counts.items():
             print(f"   - {topic}: {count} arquivos")
 
-    return downloaded_count
+    if stats is not None:
+        stats.update(
+            downloaded=pipeline.downloaded_count,
+            failed=pipeline.failed_count,
+            near_duplicates=pipeline.near_duplicate_count,
+            recorded=pipeline.recorded_count,
+            failed_ids=sorted(pipeline.failed_ids),
+        )
+    return pipeline.downloaded_count
+
+
+async def export_media_metadata(
+    client: TelegramClient,
+    chat_entity,
+    limit: int = 1000,
+    media_types: Optional[List[str]] = None,
+) -> int:
+    """
+    Catalog media metadata from a chat without downloading any file
+
+    Args:
+        client: Telegram client
+        chat_entity: Chat entity to catalog
+        limit: Maximum number of messages to process
+        media_types: Only catalog these media types (default: all)
+
+    Returns:
+        Number of media records written to the catalog
+    """
+    chat_info = await client.get_entity(chat_entity)
+    chat_name = getattr(chat_info, "title", f"Chat_{chat_info.id}")
+
+    print(f"🗂️ Catalogando mídias do chat: {chat_name}")
+
+    topics = await get_forum_topics(client, chat_info)
+
+    base_dir = get_chat_base_dir(chat_info)
+    catalog_path = os.path.join(base_dir, METADATA_CATALOG_FILENAME)
+
+    processed_count = 0
+
+    with MediaCatalogWriter(catalog_path) as catalog:
+        async for message in client.iter_messages(chat_entity, limit=limit):
+            processed_count += 1
+
+            if message.media is None:
+                continue
+            if media_types and get_media_type_name(message) not in media_types:
+                continue
+
+            try:
+                topic_id, topic_name = resolve_message_topic(message, topics)
+                filename = generate_filename(
+                    message, topic_name, getattr(message, "grouped_id", None)
+                )
+
+                record = build_media_record(message, filename, topic_id, topic_name)
+                record["chat_id"] = chat_info.id
+                record["exceeds_size_limit"] = record["size"] > MAX_FILE_SIZE
+                catalog.write(record)
+
+            except Exception as e:
+                print(f"❌ Erro ao catalogar mensagem {message.id}: {e}")
+                continue
+
+    print(f"✅ Catálogo concluído!")
+    print(f"📊 Estatísticas:")
+    print(f"   - Mensagens processadas: {processed_count}")
+    print(f"   - Mídias catalogadas: {catalog.count}")
+    print(f"   - Arquivo: {catalog_path}")
+
+    return catalog.count
+
+
+async def _export_chat_media(
+    client: TelegramClient,
+    chat_info: Dict,
+    limit_per_chat: int,
+    metadata_only: bool,
+    output_mode: str,
+    priority: str,
+) -> Optional[bool]:
+    """
+    Export the media of one chat of export_all_chats_media
+
+    Returns:
+        True if something was exported, None if the chat has no media,
+        False if the chat could not be read
+    """
+    # Opt-in trace (TRACE_RECORD_PATH) starts before the first chat RPC
+    trace_chat(client)
+
+    # Get entity using improved resolution
+    entity = await get_chat_entity_safe(client, chat_info)
+
+    if not entity:
+        print(f"❌ Não foi possível acessar o chat: {chat_info['title']}")
+        return False
+
+    # Check read permissions
+    try:
+        async for _ in client.iter_messages(entity, limit=1):
+            break
+        print(f"✅ Permissão de leitura confirmada")
+    except Exception as e:
+        if is_takeout_error(e):
+            raise
+        print(f"❌ Sem permissão para ler histórico: {e}")
+        return False
+
+    # Export media (or only its metadata)
+    if metadata_only:
+        cataloged = await export_media_metadata(client, entity, limit_per_chat)
+        if cataloged > 0:
+            print(f"✅ Concluído: {cataloged} mídias catalogadas")
+            return True
+        print(f"ℹ️ Nenhuma mídia encontrada neste chat")
+        return None
+
+    downloaded = await export_media_organized(
+        client, entity, limit_per_chat, output_mode, priority=priority
+    )
+
+    if downloaded > 0:
+        print(f"✅ Concluído: {downloaded} arquivos baixados")
+        return True
+    print(f"ℹ️ Nenhuma mídia encontrada neste chat")
+    return None
 
 
 async def export_all_chats_media(
-    client: TelegramClient, chat_list: List[Dict], limit_per_chat: int = 500
+    client: TelegramClient,
+    chat_list: List[Dict],
+    limit_per_chat: int = 500,
+    metadata_only: bool = False,
+    output_mode: str = OUTPUT_MODE,
+    priority: str = "bulk",
+    takeout: bool = USE_TAKEOUT,
 ) -> Tuple[int, int]:
     """
     Export media from multiple chats
@@ -385,6 +574,12 @@ async def export_all_chats_media(
         client: Telegram client
         chat_list: List of chat information dictionaries
         limit_per_chat: Message limit per chat
+        metadata_only: Only catalog media metadata instead of downloading
+        output_mode: "files", "tar" or "zip" (see export_media_organized)
+        priority: Download priority class; more urgent exports take over
+            the download slots of less urgent ones between chunks
+        takeout: Run through a takeout session (higher flood limits),
+            falling back to the regular session if it is not granted
 
     Returns:
         Tuple of (successful_exports, failed_exports)
@@ -394,43 +589,34 @@ async def export_all_chats_media(
 
     print(f"🚀 Iniciando exportação de {len(chat_list)} chats...")
 
-    for i, chat_info in enumerate(chat_list, 1):
-        print(f"\n{'='*60}")
-        print(f"📱 Processando chat {i}/{len(chat_list)}: {chat_info['title']}")
-        print(f"   ID: {chat_info['id']} | Tipo: {chat_info['type']}")
-
-        try:
-            # Get entity using improved resolution
-            entity = await get_chat_entity_safe(client, chat_info)
-
-            if not entity:
-                print(f"❌ Não foi possível acessar o chat: {chat_info['title']}")
-                failed_exports += 1
-                continue
-
-            # Check read permissions
-            try:
-                async for _ in client.iter_messages(entity, limit=1):
-                    break
-                print(f"✅ Permissão de leitura confirmada")
-            except Exception as e:
-                print(f"❌ Sem permissão para ler histórico: {e}")
-                failed_exports += 1
-                continue
-
-            # Export media
-            downloaded = await export_media_organized(client, entity, limit_per_chat)
+    async with TakeoutSession(client, takeout) as session:
+        for i, chat_info in enumerate(chat_list, 1):
+            print(f"\n{'='*60}")
+            print(f"📱 Processando chat {i}/{len(chat_list)}: {chat_info['title']}")
+            print(f"   ID: {chat_info['id']} | Tipo: {chat_info['type']}")
 
-            if downloaded > 0:
+            while True:
+                try:
+                    exported = await _export_chat_media(
+                        session.client,
+                        chat_info,
+                        limit_per_chat,
+                        metadata_only,
+                        output_mode,
+                        priority,
+                    )
+                except Exception as e:
+                    # Takeout invalidated: redo the chat with the regular session
+                    if session.fallback(e):
+                        continue
+                    print(f"❌ Erro ao processar chat {chat_info['title']}: {e}")
+                    exported = False
+                break
+
+            if exported:
                 successful_exports += 1
-                print(f"✅ Concluído: {downloaded} arquivos baixados")
-            else:
-                print(f"ℹ️ Nenhuma mídia encontrada neste chat")
-
-        except Exception as e:
-            print(f"❌ Erro ao processar chat {chat_info['title']}: {e}")
-            failed_exports += 1
-            continue
+            elif exported is False:
+                failed_exports += 1
 
     return successful_exports, failed_exports
 
@@ -439,6 +625,8 @@ async def get_chat_entity_safe(client: TelegramClient, chat_info: Dict):
     """
     Safely get chat entity with multiple fallback methods
 
+    Each attempt is reported as a ResolveAttempt event.
+
     Args:
         client: Telegram client
         chat_info: Chat information dictionary
@@ -446,67 +634,49 @@ async def get_chat_entity_safe(client: TelegramClient, chat_info: Dict):
     Returns:
         Chat entity or None if failed
     """
-    entity = None
     chat_title = chat_info.get("title", "Unknown")
-
-    print(f"🔍 Tentando acessar chat: {chat_title}")
+    attempts = []
 
     # Method 1: Try username first (most reliable for public chats)
     if chat_info.get("username"):
-        try:
-            print(f"   📝 Tentativa 1: Username @{chat_info['username']}")
-            entity = await client.get_entity(chat_info["username"])
-            print(f"   ✅ Sucesso via username")
-            return entity
-        except Exception as e:
-            print(f"   ❌ Falha via username: {e}")
+        attempts.append(("username", chat_info["username"]))
 
     # Method 2: Try by ID
     if chat_info.get("id") and chat_info["id"] != 0:
-        try:
-            print(f"   🆔 Tentativa 2: ID {chat_info['id']}")
-            entity = await client.get_entity(chat_info["id"])
-            print(f"   ✅ Sucesso via ID")
-            return entity
-        except Exception as e:
-            print(f"   ❌ Falha via ID: {e}")
+        attempts.append(("id", chat_info["id"]))
 
     # Method 3: Try with access_hash if available
     if chat_info.get("access_hash"):
-        try:
-            print(f"   🔑 Tentativa 3: ID + access_hash")
-            from telethon.tl.types import PeerChannel, PeerChat, PeerUser
-
-            chat_id = chat_info["id"]
-            if chat_id < 0:
-                if str(chat_id).startswith("-100"):
-                    # Channel/Supergroup
-                    peer = PeerChannel(int(str(chat_id)[4:]))
-                else:
-                    # Legacy group
-                    peer = PeerChat(-chat_id)
-            else:
-                # User
-                peer = PeerUser(chat_id)
+        from telethon.tl.types import PeerChannel, PeerChat, PeerUser
 
-            entity = await client.get_entity(peer)
-            print(f"   ✅ Sucesso via access_hash")
-            return entity
-        except Exception as e:
-            print(f"   ❌ Falha via access_hash: {e}")
+        chat_id = chat_info["id"]
+        if chat_id < 0:
+            if str(chat_id).startswith("-100"):
+                # Channel/Supergroup
+                peer = PeerChannel(int(str(chat_id)[4:]))
+            else:
+                # Legacy group
+                peer = PeerChat(-chat_id)
+        else:
+            # User
+            peer = PeerUser(chat_id)
+        attempts.append(("access_hash", peer))
 
     # Method 4: Try resolving username without @ prefix
     if chat_info.get("username"):
+        attempts.append(("username_clean", chat_info["username"].lstrip("@")))
+
+    for method, reference in attempts:
         try:
-            username_clean = chat_info["username"].lstrip("@")
-            print(f"   📝 Tentativa 4: Username limpo '{username_clean}'")
-            entity = await client.get_entity(username_clean)
-            print(f"   ✅ Sucesso via username limpo")
+            entity = await client.get_entity(reference)
+            emit(ResolveAttempt(chat_title, method, True))
             return entity
         except Exception as e:
-            print(f"   ❌ Falha via username limpo: {e}")
+            if is_takeout_error(e):
+                raise
+            emit(ResolveAttempt(chat_title, method, False, str(e)))
 
-    print(f"   ❌ Todas as tentativas falharam para: {chat_title}")
+    emit(ResolveAttempt(chat_title, "all", False))
     return None
 
 
@@ -520,11 +690,17 @@ async def validate_chat_access(client: TelegramClient, entity) -> bool:
 
     Returns:
         True if access is available, False otherwise
+
+    Raises:
+        Exception: Takeout errors, so the caller can fall back to the
+            regular session
     """
     try:
         async for _ in client.iter_messages(entity, limit=1):
             return True
-    except:
+    except Exception as e:
+        if is_takeout_error(e):
+            raise
         return False
 
     return False
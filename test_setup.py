@@ -88,6 +88,49 @@ def test_modules():
     return all_ok
 
 
+def test_import_time():
+    """Testa se a API importa dentro do orçamento de tempo de inicialização"""
+    print("\n⏱️ Testando tempo de importação da API...")
+
+    import subprocess
+    import time
+
+    from config import IMPORT_TIME_BUDGET_SECONDS
+
+    # Fresh interpreter, so nothing is already cached in sys.modules
+    code = (
+        "import sys, time; start = time.perf_counter(); import api; "
+        "elapsed = time.perf_counter() - start; "
+        "heavy = [m for m in ('telethon', 'qrcode', 'tqdm') if m in sys.modules]; "
+        "print(elapsed); print(','.join(heavy))"
+    )
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+    total = time.perf_counter() - start
+
+    if result.returncode != 0:
+        print(f"❌ Erro ao importar api.py: {result.stderr.strip().splitlines()[-1:]}")
+        return False
+
+    # Last two lines: import time and the heavy modules that got loaded
+    import_time, heavy_modules = result.stdout.split("\n")[-3:-1]
+    import_time = float(import_time)
+
+    print(f"   Importação de api: {import_time:.3f}s (processo completo: {total:.3f}s)")
+    if heavy_modules:
+        print(f"⚠️ Módulos pesados carregados na importação: {heavy_modules}")
+
+    if import_time > IMPORT_TIME_BUDGET_SECONDS:
+        print(f"❌ Acima do orçamento de {IMPORT_TIME_BUDGET_SECONDS}s")
+        return False
+
+    print(f"✅ Dentro do orçamento de {IMPORT_TIME_BUDGET_SECONDS}s")
+    return True
+
+
 def test_file_structure():
     """Testa se a estrutura de arquivos está correta"""
     print("\n📁 Testando estrutura de arquivos...")
@@ -144,6 +187,7 @@ def main():
         ("Dependências", test_dependencies),
         ("Estrutura de Arquivos", test_file_structure),
         ("Módulos do Projeto", test_modules),
+        ("Tempo de Importação", test_import_time),
         ("Configuração", test_config),
         ("Diretório de Exports", create_exports_dir),
     ]
@@ -0,0 +1,36 @@
+"""
+Shared pytest setup: the modules live at the repository root
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import event_bus  # noqa: E402
+
+
+class RecordingSink(event_bus.EventSink):
+    """Keeps every delivered event"""
+
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event, timestamp):
+        self.events.append(event)
+
+    def of_type(self, event_type):
+        return [event for event in self.events if isinstance(event, event_type)]
+
+
+@pytest.fixture(autouse=True)
+def events():
+    """Route events to a recording sink instead of the console"""
+    sink = RecordingSink()
+    bus = event_bus.EventBus([sink])
+    event_bus.set_event_bus(bus)
+    yield sink
+    bus.flush()
+    event_bus.set_event_bus(None)
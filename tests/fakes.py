@@ -0,0 +1,82 @@
+"""
+Minimal stand-ins for Telethon messages and clients used by the tests
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+DATE = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def make_document(size=1000, mime_type="application/pdf", file_name=None, doc_id=1):
+    attributes = [SimpleNamespace(file_name=file_name)] if file_name else []
+    return SimpleNamespace(
+        id=doc_id,
+        access_hash=0,
+        file_reference=b"",
+        dc_id=2,
+        size=size,
+        mime_type=mime_type,
+        attributes=attributes,
+        thumbs=None,
+    )
+
+
+def make_message(message_id, document=None, text="", grouped_id=None, **fields):
+    """Message with a document (or no media when document is None)"""
+    values = dict(
+        id=message_id,
+        date=DATE,
+        message=text,
+        media=SimpleNamespace(document=document) if document else None,
+        document=document,
+        photo=None,
+        video=None,
+        voice=None,
+        audio=None,
+        sticker=None,
+        grouped_id=grouped_id,
+        sender_id=42,
+        reply_to=None,
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+class FakeClient:
+    """Serves a fixed message list through iter_messages"""
+
+    def __init__(self, messages=(), entity=None):
+        self.messages = list(messages)
+        self.entity = entity or SimpleNamespace(id=1, title="Chat")
+
+    async def get_entity(self, entity):
+        return self.entity
+
+    async def iter_messages(
+        self, entity, limit=None, min_id=0, max_id=0, reverse=False, **kwargs
+    ):
+        messages = sorted(self.messages, key=lambda m: m.id, reverse=not reverse)
+        messages = [
+            m for m in messages if m.id > min_id and (not max_id or m.id < max_id)
+        ]
+        for message in messages[:limit] if limit else messages:
+            yield message
+
+
+class DownloadClient(FakeClient):
+    """FakeClient that also serves file downloads"""
+
+    def __init__(self, messages=(), entity=None, fail=()):
+        super().__init__(messages, entity)
+        self.session = SimpleNamespace(dc_id=2, takeout_id=None)
+        self.fail = set(fail)
+        self.downloaded = []
+
+    async def download_file(self, location, file=None, file_size=None, dc_id=None):
+        if location.id in self.fail:
+            raise ConnectionError(f"download {location.id} failed")
+        self.downloaded.append(location.id)
+        result = file.write(b"x" * (file_size or 1))
+        if hasattr(result, "__await__"):
+            await result
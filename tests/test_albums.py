@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+from fakes import DownloadClient, make_document, make_message
+from file_utils import generate_filename, load_download_records
+
+
+def test_album_members_share_a_filename_prefix():
+    first = make_message(10, make_document(file_name="a.jpg"), grouped_id=555)
+    second = make_message(11, make_document(file_name="b.jpg"), grouped_id=555)
+
+    names = [generate_filename(m, album_id=555) for m in (first, second)]
+
+    assert names == [
+        "20240501_123000_album555_msg10.jpg",
+        "20240501_123000_album555_msg11.jpg",
+    ]
+
+
+def _album(grouped_id, first_id, count):
+    return [
+        make_message(
+            first_id + i,
+            make_document(100 + i, doc_id=first_id + i, file_name=f"{i}.jpg"),
+            grouped_id=grouped_id,
+        )
+        for i in range(count)
+    ]
+
+
+def _run_album(tmp_path, monkeypatch, messages, fail=()):
+    pytest.importorskip("telethon")
+    from download_pipeline import ChatDownloadPipeline
+
+    monkeypatch.chdir(tmp_path)
+    client = DownloadClient(fail=fail)
+
+    async def run():
+        pipeline = ChatDownloadPipeline(client, client.entity, {}, "files")
+        await pipeline.start()
+        result = await pipeline.enqueue_album(messages)
+        await pipeline.close()
+        return pipeline, result
+
+    pipeline, result = asyncio.run(run())
+    return client, pipeline, result
+
+
+def test_album_is_downloaded_and_logged_as_one_batch(tmp_path, monkeypatch):
+    messages = _album(555, 10, 3)
+
+    client, pipeline, result = _run_album(tmp_path, monkeypatch, messages)
+
+    assert result == (None, 3, 0)
+    assert sorted(client.downloaded) == [10, 11, 12]
+    with open(pipeline.log_file, encoding="utf-8") as log:
+        lines = log.readlines()
+    assert len(lines) == 1 and "album555 (3/3 arquivos)" in lines[0]
+    records = load_download_records(pipeline.records_file)
+    assert {record["album_id"] for record in records.values()} == {555}
+    assert all(os.path.exists(record["path"]) for record in records.values())
+
+
+def test_failed_album_member_is_counted_not_fatal(tmp_path, monkeypatch):
+    messages = _album(555, 10, 3)
+
+    client, pipeline, result = _run_album(tmp_path, monkeypatch, messages, fail={11})
+
+    assert result == (None, 2, 1)
+    assert (pipeline.downloaded_count, pipeline.failed_count) == (2, 1)
+    assert sorted(load_download_records(pipeline.records_file)) == [10, 12]
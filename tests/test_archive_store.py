@@ -0,0 +1,83 @@
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from archive_store import ShardedArchiveWriter, iter_archived_item, load_archive_index
+
+
+def _payload(message_id):
+    return bytes([message_id % 256]) * (700 + message_id)
+
+
+async def _store(writer, message_ids):
+    return await asyncio.gather(
+        *[
+            writer.add(
+                message_id,
+                f"msg{message_id}_nome_bem_longo_{'x' * 120}.bin",
+                io.BytesIO(_payload(message_id)),
+                len(_payload(message_id)),
+            )
+            for message_id in message_ids
+        ]
+    )
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "zip"])
+def test_index_offsets_point_at_member_data(tmp_path, archive_format):
+    writer = ShardedArchiveWriter(str(tmp_path), "chat", archive_format, 2000)
+    entries = asyncio.run(_store(writer, range(1, 7)))
+    writer.close()
+
+    # Shards are capped, so six ~700 byte items need several of them
+    assert len({entry["shard"] for entry in entries}) >= 3
+
+    index = load_archive_index(writer.index_path)
+    assert sorted(index) == list(range(1, 7))
+    for message_id, entry in index.items():
+        data = b"".join(iter_archived_item(str(tmp_path), entry, chunk_size=256))
+        assert data == _payload(message_id)
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "zip"])
+def test_shards_stay_valid_archives(tmp_path, archive_format):
+    writer = ShardedArchiveWriter(str(tmp_path), "chat", archive_format)
+    entries = asyncio.run(_store(writer, [1, 2]))
+    writer.close()
+
+    shard = tmp_path / entries[0]["shard"]
+    if archive_format == "tar":
+        with tarfile.open(shard) as archive:
+            member = archive.extractfile(entries[1]["member"]).read()
+    else:
+        with zipfile.ZipFile(shard) as archive:
+            member = archive.read(entries[1]["member"])
+    assert member == _payload(2)
+
+
+def test_new_writer_never_rewrites_existing_shards(tmp_path):
+    first = ShardedArchiveWriter(str(tmp_path), "chat")
+    asyncio.run(_store(first, [1]))
+    first.close()
+    before = (tmp_path / "chat_00001.tar").read_bytes()
+
+    second = ShardedArchiveWriter(str(tmp_path), "chat")
+    (entry,) = asyncio.run(_store(second, [2]))
+    second.close()
+
+    assert entry["shard"] == "chat_00002.tar"
+    assert (tmp_path / "chat_00001.tar").read_bytes() == before
+    assert sorted(load_archive_index(second.index_path)) == [1, 2]
+
+
+def test_truncated_shard_is_reported(tmp_path):
+    writer = ShardedArchiveWriter(str(tmp_path), "chat", "zip")
+    (entry,) = asyncio.run(_store(writer, [1]))
+    writer.close()
+
+    entry = dict(entry, size=entry["size"] + 10**6)
+    with pytest.raises(IOError):
+        list(iter_archived_item(str(tmp_path), entry))
@@ -0,0 +1,95 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+
+import bandwidth
+from bandwidth import BandwidthShaper
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Virtual time: sleeping advances the clock instantly"""
+    now = [0.0]
+
+    async def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(bandwidth, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(bandwidth, "asyncio", SimpleNamespace(sleep=sleep))
+    return now
+
+
+def test_token_bucket_holds_the_average_rate(clock):
+    shaper = BandwidthShaper(rate=1000, burst_seconds=1)
+
+    async def run():
+        async with shaper.active("chat"):
+            for _ in range(10):
+                await shaper.consume("chat", 500)
+
+    asyncio.run(run())
+
+    assert clock[0] == pytest.approx(5.0)
+
+
+def test_idle_time_only_builds_up_one_burst(clock):
+    shaper = BandwidthShaper(rate=1000, burst_seconds=1)
+
+    async def run():
+        async with shaper.active("chat"):
+            await shaper.consume("chat", 1000)
+            clock[0] += 60
+            started = clock[0]
+            # The first second is covered by the burst, the rest waits
+            await shaper.consume("chat", 3000)
+            return clock[0] - started
+
+    assert asyncio.run(run()) == pytest.approx(2.0)
+
+
+def test_active_flows_share_the_rate_by_weight(clock):
+    shaper = BandwidthShaper(rate=400)
+    shaper.set_weight("bulk", 1)
+    shaper.set_weight("urgent", 3)
+
+    async def run():
+        async with shaper.active("bulk"):
+            alone = shaper.status()["active"]
+            async with shaper.active("urgent"):
+                shared = shaper.status()["active"]
+        return alone, shared
+
+    alone, shared = asyncio.run(run())
+
+    assert alone == {"bulk": 400}
+    assert shared == {"bulk": 100, "urgent": 300}
+    assert shaper.status()["active"] == {}
+
+
+def test_unlimited_rate_never_waits(clock):
+    shaper = BandwidthShaper(rate=0)
+
+    asyncio.run(shaper.consume("chat", 10**9))
+
+    assert clock[0] == 0
+    with pytest.raises(ValueError):
+        shaper.set_rate(-1)
+    with pytest.raises(ValueError):
+        shaper.set_weight("chat", 0)
+
+
+def test_throttled_writer_pays_for_each_chunk(clock):
+    shaper = BandwidthShaper(rate=100, burst_seconds=1)
+    target = io.BytesIO()
+    writer = shaper.throttle(target, "chat")
+
+    async def run():
+        for chunk in (b"a" * 100, b"b" * 100):
+            await writer.write(chunk)
+
+    asyncio.run(run())
+
+    assert target.getvalue() == b"a" * 100 + b"b" * 100
+    assert clock[0] == pytest.approx(2.0)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import batch_jobs
+import telethon_handlers
+from batch_jobs import (
+    EXIT_CHAT_FAILURES,
+    EXIT_JOB_ERROR,
+    EXIT_OK,
+    compile_job_plan,
+    run_batch_job,
+)
+from chat_catalog import ChatCatalog
+
+CATALOG = ChatCatalog(
+    [
+        {"id": 10, "title": "Canal", "type": "Channel", "username": "canal"},
+        {"id": 20, "title": "Grupo", "type": "Chat", "username": None},
+    ]
+)
+
+
+class Client:
+    """Connected client as returned by connect_saved_session"""
+
+    async def disconnect(self):
+        pass
+
+
+def test_plan_merges_defaults_and_resolves_chats():
+    spec = {
+        "chats": ["@canal", {"chat": 20, "limit": 5, "media_types": ["photo"]}, 10],
+        "defaults": {"limit": 50, "output_mode": "zip"},
+        "concurrency": 3,
+    }
+
+    plan = compile_job_plan(spec, CATALOG)
+
+    # "@canal" and 10 are the same chat: planned once
+    assert [task["chat"]["title"] for task in plan["tasks"]] == ["Canal", "Grupo"]
+    assert plan["tasks"][0]["limit"] == 50
+    assert plan["tasks"][0]["output_mode"] == "zip"
+    assert plan["tasks"][1]["limit"] == 5
+    assert plan["tasks"][1]["media_types"] == ["photo"]
+    assert (plan["concurrency"], plan["order"], plan["takeout"]) == (3, "spec", False)
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"chats": [10], "defaults": {"limite": 5}},
+        {"chats": [{"chat": 10, "limit": 0}]},
+        {"chats": [{"chat": 10, "output_mode": "rar"}]},
+        {"chats": [{"chat": 10, "media_types": ["gif"]}]},
+        {"chats": [{"chat": 10, "bandwidth_weight": 0}]},
+        {"chats": [10], "order": "random"},
+        {"chats": [10], "concurrency": 0},
+        {"chats": [10], "takeout": "yes"},
+        {"chats": [[10]]},
+    ],
+)
+def test_invalid_specs_are_rejected_before_running(spec):
+    with pytest.raises(ValueError):
+        compile_job_plan(spec, CATALOG)
+
+
+@pytest.fixture
+def fake_exports(monkeypatch):
+    """Per chat ID: (files downloaded, files failed) or an exception"""
+    outcomes = {}
+
+    async def get_entity(client, chat):
+        if chat["id"] == 404:
+            return None
+        return SimpleNamespace(id=chat["id"], title=chat["title"])
+
+    async def validate(client, entity):
+        return True
+
+    async def export(client, entity, *args, stats=None, **kwargs):
+        outcome = outcomes[entity.id]
+        if isinstance(outcome, Exception):
+            raise outcome
+        downloaded, failed = outcome
+        stats.update(downloaded=downloaded, failed=failed, near_duplicates=0)
+        return downloaded
+
+    async def connect(*args):
+        return Client()
+
+    monkeypatch.setattr(telethon_handlers, "get_chat_entity_safe", get_entity)
+    monkeypatch.setattr(telethon_handlers, "validate_chat_access", validate)
+    monkeypatch.setattr(telethon_handlers, "export_media_organized", export)
+    monkeypatch.setattr(telethon_handlers, "connect_saved_session", connect)
+    monkeypatch.setattr(batch_jobs, "load_chat_catalog", lambda: ChatCatalog([]))
+    return outcomes
+
+
+def _run(tmp_path, chats):
+    spec_path = tmp_path / "job.json"
+    summary_path = tmp_path / "summary.json"
+    spec = {"chats": chats, "summary_path": str(summary_path)}
+    spec_path.write_text(json.dumps(spec))
+
+    code = asyncio.run(run_batch_job(str(spec_path)))
+    return code, json.loads(summary_path.read_text())
+
+
+def test_summary_statuses_and_exit_code(tmp_path, fake_exports):
+    fake_exports.update({1: (3, 0), 2: (0, 0), 3: (2, 1), 4: (0, 2)})
+    fake_exports[5] = RuntimeError("boom")
+
+    code, summary = _run(tmp_path, [1, 2, 3, 4, 5, 404])
+
+    statuses = {result["chat_id"]: result["status"] for result in summary["results"]}
+    assert statuses == {
+        1: "ok",
+        2: "empty",
+        3: "partial",
+        4: "failed",
+        5: "failed",
+        404: "failed",
+    }
+    assert summary["chats_ok"] == 1
+    assert summary["chats_partial"] == 1
+    assert summary["chats_failed"] == 4
+    assert summary["files"] == 5
+    assert code == EXIT_CHAT_FAILURES
+
+
+def test_successful_job_exits_ok(tmp_path, fake_exports):
+    fake_exports.update({1: (3, 0), 2: (0, 0)})
+
+    code, summary = _run(tmp_path, [1, 2])
+
+    assert code == EXIT_OK
+    assert summary["chats_failed"] == 0
+
+
+@pytest.mark.parametrize("failure", ["connect", "export"])
+def test_job_errors_exit_with_job_error_and_a_summary(
+    tmp_path, fake_exports, monkeypatch, failure
+):
+    async def connect(*args):
+        if failure == "connect":
+            raise ConnectionError("sem rede")
+        return Client()
+
+    async def export_chat_list(client):
+        raise ConnectionError("sem rede")
+
+    monkeypatch.setattr(telethon_handlers, "connect_saved_session", connect)
+    monkeypatch.setattr(telethon_handlers, "export_chat_list", export_chat_list)
+    monkeypatch.setattr(batch_jobs, "load_chat_catalog", lambda: None)
+
+    code, summary = _run(tmp_path, [1])
+
+    assert code == EXIT_JOB_ERROR
+    assert summary["error"] == "ConnectionError: sem rede"
+    assert summary["results"] == []
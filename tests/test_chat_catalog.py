@@ -0,0 +1,134 @@
+import hashlib
+import json
+
+import pytest
+
+from chat_catalog import (
+    ChatCatalog,
+    load_chat_catalog,
+    normalize_text,
+    parse_chat_link,
+)
+
+CHATS = [
+    {"id": 1, "title": "Família Silva", "type": "Chat", "username": None},
+    {"id": 2, "title": "Notícias Tech", "type": "Channel", "username": "TechNews"},
+    {"id": 3, "title": "Grupo da Família", "type": "Channel", "is_forum": True},
+    {"id": 1234567890, "title": "Fotos", "type": "Channel", "username": "fotos"},
+    {"id": 5, "title": "Fam", "type": "User"},
+]
+
+
+@pytest.fixture
+def catalog():
+    return ChatCatalog(CHATS)
+
+
+def _ids(chats):
+    return [chat["id"] for chat in chats]
+
+
+def test_normalize_text_ignores_case_and_accents():
+    assert normalize_text("  FAMÍLIA Ção ") == "familia cao"
+
+
+def test_search_puts_prefix_matches_first(catalog):
+    assert _ids(catalog.search("familia")) == [1, 3]
+    assert _ids(catalog.search("fam")) == [1, 5, 3]
+    assert _ids(catalog.search("fam", prefix_only=True)) == [1, 5]
+    assert _ids(catalog.search("da fa")) == [3]
+    assert catalog.search("inexistente") == []
+
+
+def test_search_filters(catalog):
+    assert _ids(catalog.search(chat_type="Channel")) == [2, 3, 1234567890]
+    assert _ids(catalog.search(is_forum=True)) == [3]
+    assert _ids(catalog.search("familia", chat_type="Chat")) == [1]
+    assert _ids(catalog.search(chat_type="Channel", limit=2)) == [2, 3]
+    assert catalog.count_by_type() == {"Chat": 1, "Channel": 3, "User": 1}
+
+
+def test_lookup_by_id_and_username(catalog):
+    assert catalog.get(2)["title"] == "Notícias Tech"
+    # Marked channel IDs resolve to the stored bare ID
+    assert catalog.get(-1001234567890)["title"] == "Fotos"
+    assert catalog.get(99) is None
+    assert catalog.get_by_username("@technews")["id"] == 2
+    assert catalog.get_by_username("ninguem") is None
+
+
+def test_parse_chat_link():
+    assert parse_chat_link("https://t.me/c/1234567890/15")["id"] == -1001234567890
+    assert parse_chat_link("https://t.me/canal/")["username"] == "canal"
+    assert parse_chat_link("@canal")["username"] == "canal"
+    assert parse_chat_link("   ") is None
+    with pytest.raises(ValueError):
+        parse_chat_link("https://t.me/c/abc")
+
+
+def test_pages_follow_the_cursor_until_the_end(catalog):
+    first = catalog.page(limit=2)
+    second = catalog.page(cursor=first["next_cursor"], limit=2)
+    last = catalog.page(cursor=second["next_cursor"], limit=2)
+
+    assert (first["total"], first["count"]) == (5, 2)
+    assert _ids(first["chats"] + second["chats"] + last["chats"]) == _ids(CHATS)
+    assert last["next_cursor"] is None
+
+
+def test_page_filters_and_projects_fields(catalog):
+    page = catalog.page(chat_type="Channel", limit=1, fields=["id", "username"])
+
+    assert page["total"] == 3
+    assert page["chats"] == [{"id": 2, "username": "TechNews"}]
+    with pytest.raises(ValueError, match="invalid_fields"):
+        catalog.page(fields=["id", "phone"])
+
+
+def test_cursors_expire_when_the_chat_list_changes(catalog):
+    cursor = catalog.page(limit=2)["next_cursor"]
+    changed = ChatCatalog(CHATS + [{"id": 6, "title": "Novo", "type": "Chat"}])
+
+    with pytest.raises(ValueError, match="cursor_expired"):
+        changed.page(cursor=cursor)
+    with pytest.raises(ValueError, match="invalid_cursor"):
+        catalog.page(cursor="não-é-um-cursor")
+
+
+def test_catalog_is_reloaded_only_when_the_file_changes(tmp_path):
+    path = tmp_path / "chat_list.json"
+    raw = json.dumps(CHATS).encode()
+    path.write_bytes(raw)
+
+    catalog = load_chat_catalog(str(path))
+
+    assert load_chat_catalog(str(path)) is catalog
+    assert catalog.etag == hashlib.sha1(raw).hexdigest()
+    path.write_text(json.dumps(CHATS[:2]))
+    assert len(load_chat_catalog(str(path))) == 2
+    assert load_chat_catalog(str(tmp_path / "missing.json")) is None
+
+
+def test_chats_endpoint_pages_and_answers_not_modified(tmp_path, monkeypatch):
+    pytest.importorskip("httpx")
+    testclient = pytest.importorskip("fastapi.testclient")
+    import api
+
+    path = tmp_path / "chat_list.json"
+    path.write_text(json.dumps(CHATS))
+    monkeypatch.setattr(api, "load_chat_catalog", lambda: load_chat_catalog(str(path)))
+    client = testclient.TestClient(api.app)
+
+    response = client.get("/chats", params={"limit": 2, "fields": "id,title"})
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200
+    assert response.json()["chats"] == [
+        {"id": 1, "title": "Família Silva"},
+        {"id": 2, "title": "Notícias Tech"},
+    ]
+    assert client.get("/chats", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/chats", params={"limit": 0}).status_code == 400
+    assert client.get("/chats", params={"cursor": "x"}).json()["detail"] == (
+        "invalid_cursor"
+    )
@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+
+import dc_pool
+from dc_pool import DCSenderPool, get_dc_pool
+from event_bus import ErrorEvent, get_event_bus
+
+
+class SenderClient:
+    """Client that lends one sender per data center"""
+
+    def __init__(self, failing=()):
+        self.session = SimpleNamespace(dc_id=2)
+        self.failing = set(failing)
+        self.borrowed = []
+        self.returned = []
+
+    async def _borrow_exported_sender(self, dc_id):
+        self.borrowed.append(dc_id)
+        await asyncio.sleep(0)
+        if dc_id in self.failing:
+            raise ConnectionError(f"DC {dc_id} offline")
+        return f"sender{dc_id}"
+
+    async def _return_exported_sender(self, sender):
+        self.returned.append(sender)
+
+
+def test_prewarm_authorizes_each_foreign_dc_once():
+    client = SenderClient()
+    pool = DCSenderPool(client)
+
+    async def run():
+        await pool.prewarm([1, 2, 4, 4, None])
+        # Already warm: later media of these DCs start no new warm-up
+        assert pool.ensure_warm(4) is None
+        await pool.close()
+
+    asyncio.run(run())
+
+    # The home DC (2) needs no exported sender
+    assert sorted(client.borrowed) == [1, 4]
+    assert sorted(client.returned) == ["sender1", "sender4"]
+    assert pool.warm_dcs == []
+
+
+def test_failed_warmup_backs_off_exponentially(monkeypatch, events):
+    client = SenderClient(failing={5})
+    pool = DCSenderPool(client)
+    now = [100.0]
+    monkeypatch.setattr(dc_pool, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(dc_pool, "DC_WARM_RETRY_MIN_DELAY", 2)
+    monkeypatch.setattr(dc_pool, "DC_WARM_RETRY_MAX_DELAY", 5)
+
+    async def run():
+        # Concurrent requests share one warm-up
+        first = pool.ensure_warm(5)
+        assert pool.ensure_warm(5) is first
+        await first
+        assert pool._retry_at[5] == 102
+        assert pool.ensure_warm(5) is None
+
+        now[0] = 102
+        await pool.ensure_warm(5)
+        assert pool._retry_at[5] == 106
+
+        now[0] = 106
+        await pool.ensure_warm(5)
+        # Capped at the maximum delay
+        assert pool._retry_at[5] == 111
+
+        client.failing.clear()
+        now[0] = 111
+        await pool.ensure_warm(5)
+
+    asyncio.run(run())
+
+    assert client.borrowed == [5, 5, 5, 5]
+    assert pool.warm_dcs == [5]
+    assert 5 not in pool._retry_at
+    get_event_bus().flush()
+    assert [e.stage for e in events.of_type(ErrorEvent)] == ["dc_pool:5"] * 3
+
+
+def test_downloads_share_one_semaphore_per_dc():
+    client = SenderClient()
+    pool = get_dc_pool(client)
+
+    assert get_dc_pool(client) is pool
+    assert pool.semaphore(4) is pool.semaphore(4)
+    assert pool.semaphore(4) is not pool.semaphore(1)
+    assert pool.semaphore(4)._value == pool.max_concurrent
+
+
+def test_senders_dropped_by_a_reconnect_are_warmed_again():
+    class Sender:
+        def __init__(self, dc_id):
+            self.dc_id = dc_id
+            self.connected = True
+
+        def is_connected(self):
+            return self.connected
+
+    class ReconnectingClient(SenderClient):
+        async def _borrow_exported_sender(self, dc_id):
+            await super()._borrow_exported_sender(dc_id)
+            return Sender(dc_id)
+
+    client = ReconnectingClient()
+    pool = get_dc_pool(client)
+
+    async def run():
+        await pool.prewarm([4])
+        # The client reconnected: Telethon closed and forgot the sender
+        pool._senders[4].connected = False
+        assert pool.warm_dcs == []
+        await pool.ensure_warm(4)
+        assert pool.warm_dcs == [4]
+        await dc_pool.close_dc_pool(client)
+
+    asyncio.run(run())
+
+    assert client.borrowed == [4, 4]
+    assert len(client.returned) == 1 and client.returned[0].connected
+    # Closed pools are discarded: the next pipeline starts a fresh one
+    assert get_dc_pool(client) is not pool
@@ -0,0 +1,204 @@
+import asyncio
+import gc
+import weakref
+from types import SimpleNamespace
+
+import pytest
+
+from fakes import DownloadClient, make_document, make_message
+from file_utils import load_download_records
+
+
+class Message(SimpleNamespace):
+    """Fake message that can be weakly referenced"""
+
+
+def test_enqueued_messages_are_freed_before_their_download(tmp_path, monkeypatch):
+    pytest.importorskip("telethon")
+    from download_pipeline import ChatDownloadPipeline
+
+    monkeypatch.chdir(tmp_path)
+    client = DownloadClient()
+
+    async def run():
+        pipeline = ChatDownloadPipeline(client, client.entity, {}, "files")
+        await pipeline.start()
+
+        refs = []
+        for message_id in (1, 2):
+            message = Message(
+                **vars(make_message(message_id, make_document(50, doc_id=message_id)))
+            )
+            refs.append(weakref.ref(message))
+            pipeline.enqueue(message)
+            del message
+
+        gc.collect()
+        assert [ref() for ref in refs] == [None, None]
+        assert client.downloaded == []
+
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    assert sorted(client.downloaded) == [1, 2]
+    records = load_download_records(pipeline.records_file)
+    assert sorted(records) == [1, 2]
+    assert records[1]["size"] == 50
+    assert records[1]["chat_id"] == client.entity.id
+
+
+def test_descriptor_keeps_only_what_the_download_needs(tmp_path, monkeypatch):
+    pytest.importorskip("telethon")
+    from download_pipeline import ChatDownloadPipeline
+
+    monkeypatch.chdir(tmp_path)
+    client = DownloadClient()
+    pipeline = ChatDownloadPipeline(client, client.entity, {}, "files")
+    message = make_message(3, make_document(70, doc_id=3), text="legenda" * 100)
+
+    descriptor = pipeline.describe(message, album_id=9)
+
+    assert not hasattr(descriptor, "__dict__")
+    assert (descriptor.message_id, descriptor.size, descriptor.dc_id) == (3, 70, 2)
+    assert descriptor.location.id == 3
+    # Media with a file location is downloaded without the media object
+    assert descriptor.media is None
+    assert descriptor.record["album_id"] == 9
+    assert "album9_msg3" in descriptor.filename
+
+
+class RefreshClient:
+    """Serves get_messages by ID and counts the requests"""
+
+    def __init__(self, missing=(), error=None):
+        self.missing = set(missing)
+        self.error = error
+        self.requests = []
+
+    async def get_messages(self, entity, ids):
+        self.requests.append(list(ids))
+        if self.error:
+            raise self.error
+        return [None if i in self.missing else make_message(i) for i in ids]
+
+
+def test_refreshes_within_the_delay_share_one_request():
+    from download_pipeline import MessageRefresher
+
+    client = RefreshClient(missing={3})
+    refresher = MessageRefresher(client, None, batch_size=100, delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*[refresher.refresh(i) for i in (1, 2, 3, 2)])
+
+    messages = asyncio.run(run())
+
+    assert client.requests == [[1, 2, 3]]
+    assert [m and m.id for m in messages] == [1, 2, None, 2]
+
+
+def test_full_batch_is_fetched_without_waiting():
+    from download_pipeline import MessageRefresher
+
+    client = RefreshClient()
+    refresher = MessageRefresher(client, None, batch_size=2, delay=60)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*[refresher.refresh(i) for i in range(1, 5)]), 1
+        )
+
+    asyncio.run(run())
+
+    assert client.requests == [[1, 2], [3, 4]]
+
+
+def test_failed_refresh_fails_every_waiting_download():
+    from download_pipeline import MessageRefresher
+
+    refresher = MessageRefresher(RefreshClient(error=ConnectionError("down")), None)
+    refresher.delay = 0
+
+    async def run():
+        return await asyncio.gather(
+            refresher.refresh(1), refresher.refresh(2), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert [type(result) for result in results] == [ConnectionError] * 2
+
+
+def test_expired_references_are_refreshed_and_retried(tmp_path, monkeypatch):
+    pytest.importorskip("telethon")
+    from telethon.errors import FileReferenceExpiredError
+
+    from download_pipeline import ChatDownloadPipeline
+
+    class ExpiringClient(DownloadClient):
+        def __init__(self, messages):
+            super().__init__(messages)
+            self.requests = []
+
+        async def download_file(self, location, file=None, **kwargs):
+            if location.file_reference != b"new":
+                raise FileReferenceExpiredError(None)
+            return await super().download_file(location, file, **kwargs)
+
+        async def get_messages(self, entity, ids):
+            self.requests.append(list(ids))
+            fresh = []
+            for i in ids:
+                document = make_document(10, doc_id=i)
+                document.file_reference = b"new"
+                fresh.append(None if i == 3 else make_message(i, document))
+            return fresh
+
+    monkeypatch.chdir(tmp_path)
+    messages = [make_message(i, make_document(10, doc_id=i)) for i in range(1, 5)]
+    client = ExpiringClient(messages)
+
+    async def run():
+        pipeline = ChatDownloadPipeline(client, client.entity, {}, "files")
+        pipeline.refresher.delay = 0.05
+        await pipeline.start()
+        for message in messages:
+            pipeline.enqueue(message)
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    # One request for the whole wave of expired references
+    assert client.requests == [[1, 2, 3, 4]]
+    assert sorted(client.downloaded) == [1, 2, 4]
+    assert (pipeline.downloaded_count, pipeline.failed_count) == (3, 1)
+
+
+def test_retry_skips_recorded_media_and_lists_failures(tmp_path, monkeypatch):
+    pytest.importorskip("telethon")
+    from download_pipeline import ChatDownloadPipeline
+
+    monkeypatch.chdir(tmp_path)
+    messages = [make_message(i, make_document(10, doc_id=i)) for i in range(1, 4)]
+
+    async def run(client):
+        pipeline = ChatDownloadPipeline(
+            client, client.entity, {}, "files", skip_recorded=True
+        )
+        await pipeline.start()
+        for message in messages:
+            pipeline.enqueue(message)
+        await pipeline.close()
+        return pipeline
+
+    first = asyncio.run(run(DownloadClient(fail={2})))
+    client = DownloadClient()
+    retry = asyncio.run(run(client))
+
+    assert first.failed_ids == [2]
+    # Only the media that failed before is downloaded again
+    assert client.downloaded == [2]
+    assert (retry.recorded_count, retry.failed_ids) == (2, [])
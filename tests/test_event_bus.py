@@ -0,0 +1,105 @@
+import asyncio
+import importlib
+import io
+import json
+import threading
+import time
+
+import config
+
+from event_bus import (
+    ChatFinished,
+    ChatStarted,
+    ConsoleSink,
+    ErrorEvent,
+    EventBus,
+    EventSink,
+    FileDone,
+    FileQueued,
+    JsonLogSink,
+)
+
+MB = 1024 * 1024
+
+
+class BlockingSink(EventSink):
+    """Holds the dispatcher thread on its first event until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.events = []
+
+    def handle(self, event, timestamp):
+        self.release.wait()
+        self.events.append(event)
+
+
+def test_progress_is_dropped_and_counted_but_errors_are_kept():
+    sink = BlockingSink()
+    bus = EventBus([sink], queue_size=2)
+
+    bus.emit(ChatStarted(1, "Chat"))
+    while not bus._queue.empty():
+        time.sleep(0.001)  # Until the dispatcher holds the first event
+    for message_id in range(5):
+        bus.emit(FileQueued(1, message_id, f"msg{message_id}.jpg"))
+    bus.emit(ErrorEvent("download", "boom", 1, 3))
+
+    sink.release.set()
+    asyncio.run(bus.aflush())
+
+    assert bus.dropped == 3
+    assert [type(event) for event in sink.events] == [
+        ChatStarted,
+        FileQueued,
+        FileQueued,
+        ErrorEvent,
+    ]
+
+
+def test_console_keeps_progress_of_parallel_chats_apart():
+    stream = io.StringIO()
+    sink = ConsoleSink(interval=60, stream=stream)
+
+    sink.handle(ChatStarted(1, "Alfa"), 0)
+    sink.handle(ChatStarted(2, "Beta"), 0)
+    for chat_id, size in [(1, MB), (2, 2 * MB), (1, MB)]:
+        sink.handle(FileQueued(chat_id, 0, "f", size), 1)
+        sink.handle(FileDone(chat_id, 0, "f", size, 0.5), 1)
+    sink.handle(FileQueued(2, 9, "g"), 1)
+    sink.handle(ChatFinished(1, "Alfa", 2, 0), 1)
+    sink.close()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[:2] == [
+        "📥 Iniciando download de mídias do chat: Alfa",
+        "📥 Iniciando download de mídias do chat: Beta",
+    ]
+    # Progress is only reported at the interval, the end of a chat or close
+    assert lines[2:] == [
+        "📥 Alfa: 2 arquivos baixados (2.0 MB), 0 na fila",
+        "📥 Beta: 1 arquivos baixados (2.0 MB), 1 na fila",
+    ]
+
+
+def test_json_log_has_one_event_per_line(tmp_path):
+    path = tmp_path / "logs" / "events.jsonl"
+    bus = EventBus([JsonLogSink(str(path))])
+
+    bus.emit(ErrorEvent("resolve", "timeout", chat_id=5))
+    bus.emit(FileDone(5, 7, "msg7.jpg", 10, 0.1))
+    bus.close()
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [entry["event"] for entry in entries] == ["ErrorEvent", "FileDone"]
+    assert entries[0]["chat_id"] == 5
+    assert entries[1]["size"] == 10
+
+
+def test_sink_names_from_the_environment_are_trimmed(monkeypatch):
+    monkeypatch.setenv("EVENT_SINKS", " console, json,,metrics ")
+    try:
+        assert importlib.reload(config).EVENT_SINKS == ["console", "json", "metrics"]
+    finally:
+        monkeypatch.delenv("EVENT_SINKS")
+        importlib.reload(config)
@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import export_planner
+import telethon_handlers
+from export_planner import plan_chat, plan_chats, sort_plans
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    """Fake search counters and size samples, per topic"""
+    counts = {
+        None: {"photo": 10, "video": 2, "document": 0, "audio": 0, "voice": 0},
+        5: {"photo": 4, "video": 1, "document": 0, "audio": 0, "voice": 0},
+    }
+    averages = {"photo": 1 * MB, "video": 50 * MB}
+    sampled = []
+
+    async def count_media(client, entity, top_msg_id=None):
+        return dict(counts[top_msg_id])
+
+    async def sample_media_size(client, entity, media_type, sample_size, dc_ids):
+        sampled.append(media_type)
+        dc_ids.add(4 if media_type == "video" else 2)
+        return averages.get(media_type)
+
+    monkeypatch.setattr(export_planner, "count_media", count_media)
+    monkeypatch.setattr(export_planner, "sample_media_size", sample_media_size)
+    monkeypatch.setattr(export_planner, "PLAN_THROUGHPUT_BYTES_PER_SEC", MB)
+    return sampled
+
+
+def test_chat_plan_multiplies_counts_by_sampled_sizes(counters):
+    entity = SimpleNamespace(id=1, title="Fórum")
+
+    plan = asyncio.run(plan_chat(None, entity, {5: "Avisos"}))
+
+    # Only types with media are sampled
+    assert counters == ["photo", "video"]
+    assert plan["media"]["photo"] == {"count": 10, "est_bytes": 10 * MB, "avg_size": MB}
+    assert plan["media"]["document"]["avg_size"] is None
+    assert (plan["count"], plan["bytes"], plan["seconds"]) == (12, 110 * MB, 110)
+    assert plan["dc_ids"] == [2, 4]
+    # Topics reuse the chat-wide averages
+    assert plan["topics"] == [
+        {
+            "topic_id": 5,
+            "title": "Avisos",
+            "media": {
+                "photo": {"count": 4, "est_bytes": 4 * MB},
+                "video": {"count": 1, "est_bytes": 50 * MB},
+                "document": {"count": 0, "est_bytes": 0},
+                "audio": {"count": 0, "est_bytes": 0},
+                "voice": {"count": 0, "est_bytes": 0},
+            },
+            "count": 5,
+            "bytes": 54 * MB,
+            "seconds": 54,
+        }
+    ]
+
+
+def test_unplannable_chats_sort_last(counters, monkeypatch):
+    entities = {1: SimpleNamespace(id=1, title="Grande"), 3: None}
+
+    async def get_chat_entity_safe(client, chat_info):
+        return entities[chat_info["id"]]
+
+    async def get_forum_topics(client, entity):
+        return {}
+
+    monkeypatch.setattr(telethon_handlers, "get_chat_entity_safe", get_chat_entity_safe)
+    monkeypatch.setattr(telethon_handlers, "get_forum_topics", get_forum_topics)
+    chat_list = [{"id": 3, "title": "Privado"}, {"id": 1, "title": "Grande"}]
+
+    plans = asyncio.run(plan_chats(None, chat_list, sort_by="count"))
+
+    assert [plan["chat_id"] for plan in plans] == [1, 3]
+    assert plans[1]["error"] == "chat_not_accessible"
+    assert plans[1]["ref"] is chat_list[0]
+
+
+def test_sort_plans_rejects_unknown_keys():
+    plans = [{"bytes": 1, "count": 9}, {"bytes": 5, "count": 2}]
+
+    assert sort_plans(plans)[0]["bytes"] == 5
+    assert sort_plans(plans, "count")[0]["count"] == 9
+    with pytest.raises(ValueError):
+        sort_plans(plans, "size")
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("telethon", "qrcode", "tqdm")
+
+
+def _loaded_heavy_modules(module):
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "telegram_downloader",
+        "telethon_handlers",
+        "api_helpers",
+        "watch_mode",
+        "batch_jobs",
+        "distributed",
+    ],
+)
+def test_import_does_not_load_heavy_modules(module):
+    assert _loaded_heavy_modules(module) == ""
+
+
+def test_api_import_does_not_load_heavy_modules():
+    pytest.importorskip("fastapi")
+    assert _loaded_heavy_modules("api") == ""
+
+
+def test_resume_session_without_saved_session(tmp_path, monkeypatch):
+    import api_helpers
+
+    monkeypatch.chdir(tmp_path)
+    # No session file: nothing to resume and no client is created
+    assert asyncio.run(api_helpers.resume_session()) is False
+    assert api_helpers.get_session_manager().client is None
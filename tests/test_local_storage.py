@@ -0,0 +1,148 @@
+import asyncio
+import threading
+
+import pytest
+
+from event_bus import ErrorEvent, get_event_bus
+from storage import FsyncBatcher, LocalFileWriter, LocalStorage
+
+
+class ShortWrites:
+    """Unbuffered file that accepts at most limit bytes per write"""
+
+    def __init__(self, file, limit):
+        self._file = file
+        self.limit = limit
+        self.requested = []
+
+    def write(self, data):
+        self.requested.append(len(data))
+        return self._file.write(bytes(data[: self.limit]))
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def test_commit_renames_the_part_file_into_place(tmp_path):
+    path = tmp_path / "fotos" / "msg1.jpg"
+
+    async def run():
+        async with LocalFileWriter(str(path), expected_size=4096) as writer:
+            await writer.write(b"abc")
+            await writer.write(b"def")
+            # Nothing under the final name until the download completes
+            assert not path.exists()
+            assert (tmp_path / "fotos" / ".msg1.jpg.part").exists()
+        return writer
+
+    writer = asyncio.run(run())
+
+    # Preallocated space beyond the real size is given back
+    assert path.read_bytes() == b"abcdef"
+    assert writer.bytes_written == 6
+    assert not (tmp_path / "fotos" / ".msg1.jpg.part").exists()
+
+
+def test_failed_download_leaves_no_file(tmp_path):
+    path = tmp_path / "msg2.mp4"
+
+    async def run():
+        async with LocalFileWriter(str(path)) as writer:
+            await writer.write(b"partial")
+            raise ConnectionError("dropped")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_writes_are_buffer_aligned_and_survive_short_writes(tmp_path):
+    path = tmp_path / "msg3.bin"
+    data = bytes(range(256)) * 10
+    blocks = []
+    threads = set()
+
+    def record(block):
+        blocks.append(len(block))
+        threads.add(threading.get_ident())
+
+    async def run():
+        writer = LocalFileWriter(str(path), buffer_size=512, preallocate=False)
+        writer._file = ShortWrites(writer._file, limit=100)
+        write_all = writer._write_all
+        writer._write_all = lambda block: record(block) or write_all(block)
+        async with writer:
+            for start in range(0, len(data), 300):
+                await writer.write(data[start : start + 300])
+        return writer._file
+
+    file = asyncio.run(run())
+
+    assert path.read_bytes() == data
+    # Each block is a multiple of the buffer size, only the tail is not
+    assert all(size % 512 == 0 for size in blocks[:-1])
+    assert sum(blocks) == len(data)
+    # Every block needed several short writes
+    assert len(file.requested) > len(blocks)
+    # None of them blocked the event loop
+    assert threading.get_ident() not in threads
+
+
+def test_batch_is_synced_when_full_or_when_the_timer_fires(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(FsyncBatcher, "_sync_paths", staticmethod(synced.append))
+
+    async def run():
+        batcher = FsyncBatcher(max_files=2, max_seconds=0.05)
+        await batcher.add("a")
+        assert synced == []
+        await batcher.add("b")
+        assert synced == [["a", "b"]]
+
+        # A lone file is synced by the timer
+        await batcher.add("c")
+        await asyncio.sleep(0.2)
+        assert synced == [["a", "b"], ["c"]]
+
+    asyncio.run(run())
+
+
+def test_failed_timer_sync_is_reported_and_raised(monkeypatch, events):
+    def fail(paths):
+        raise OSError(5, "disco removido")
+
+    monkeypatch.setattr(FsyncBatcher, "_sync_paths", staticmethod(fail))
+
+    async def run():
+        batcher = FsyncBatcher(max_files=10, max_seconds=0.01)
+        await batcher.add("a")
+        await asyncio.sleep(0.1)
+        with pytest.raises(OSError):
+            await batcher.sync()
+        # Reported once
+        await batcher.sync()
+
+    asyncio.run(run())
+
+    get_event_bus().flush()
+    assert [e.stage for e in events.of_type(ErrorEvent)] == ["fsync"]
+
+
+def test_batch_mode_syncs_committed_files(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(FsyncBatcher, "_sync_paths", staticmethod(synced.extend))
+    storage = LocalStorage(fsync_mode="batch")
+    path = str(tmp_path / "msg4.pdf")
+
+    async def run():
+        async with storage.open_writer(path, 3) as writer:
+            await writer.write(b"pdf")
+        await storage.sync()
+
+    asyncio.run(run())
+
+    assert synced == [path]
+    assert storage.size(path) == 3
+    with pytest.raises(ValueError):
+        LocalStorage(fsync_mode="always")
@@ -0,0 +1,59 @@
+import asyncio
+import gzip
+
+import pytest
+
+from fakes import FakeClient, make_document, make_message
+from file_utils import build_media_record
+from media_catalog import MediaCatalogWriter, read_media_catalog
+
+
+def test_catalog_round_trip(tmp_path):
+    path = str(tmp_path / "catalog" / "media_catalog.jsonl.gz")
+    records = [{"message_id": i, "name": f"arquivo_{i}.pdf"} for i in range(5)]
+
+    with MediaCatalogWriter(path, flush_every=2) as catalog:
+        for record in records:
+            catalog.write(record)
+
+    assert catalog.count == 5
+    assert list(read_media_catalog(path)) == records
+    # Plain gzip JSON Lines, readable without this module
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+
+def test_build_media_record_uses_document_metadata():
+    document = make_document(2048, "video/mp4", "clip.mp4")
+    message = make_message(7, document, grouped_id=99)
+
+    record = build_media_record(message, "20240501_123000_msg7.mp4", 3, "Geral")
+
+    assert record["message_id"] == 7
+    assert record["date"] == "2024-05-01T12:30:00+00:00"
+    assert record["media_type"] == "document"
+    assert record["mime_type"] == "video/mp4"
+    assert record["size"] == 2048
+    assert record["original_name"] == "clip.mp4"
+    assert (record["topic_id"], record["topic_name"]) == (3, "Geral")
+    assert record["grouped_id"] == 99
+
+
+def test_export_media_metadata_catalogs_without_downloading(tmp_path, monkeypatch):
+    pytest.importorskip("telethon")
+    from telethon_handlers import export_media_metadata
+
+    monkeypatch.chdir(tmp_path)
+    messages = [
+        make_message(1, make_document(10, file_name="a.pdf")),
+        make_message(2),  # text only
+        make_message(3, make_document(20, file_name="b.pdf")),
+    ]
+    client = FakeClient(messages)
+
+    count = asyncio.run(export_media_metadata(client, client.entity, limit=10))
+
+    assert count == 2
+    catalog = tmp_path / "exports" / "Chat_1" / "media_catalog.jsonl.gz"
+    ids = [record["message_id"] for record in read_media_catalog(str(catalog))]
+    assert sorted(ids) == [1, 3]
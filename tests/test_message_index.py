@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+
+import message_index
+from fakes import make_document, make_message
+from message_index import MessageIndex, get_sender_name
+
+pytestmark = pytest.mark.skipif(
+    not message_index.is_available(), reason="SQLite sem FTS5"
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MessageIndex(str(tmp_path / "index" / "messages.db"), batch_size=100)
+    yield index
+    index.close()
+
+
+def _sender(first_name):
+    return SimpleNamespace(title=None, first_name=first_name, last_name=None)
+
+
+def test_search_matches_text_file_names_and_senders(index):
+    invoice = make_document(file_name="fatura_05.pdf", doc_id=1)
+    index.add(make_message(1, text="Segue a fatura de março"), chat_id=10)
+    index.add(make_message(2, invoice, sender=_sender("João")), chat_id=10)
+    index.add(make_message(3, text="Bom dia a todos"), chat_id=20, chat="Grupo")
+    index.add(make_message(4), chat_id=20)  # No text, no media: not indexed
+    index.set_path(10, 2, "exports/Chat_10/documentos/msg2.pdf")
+    index.flush()
+
+    assert len(index) == 3
+    # Accents are ignored and prefixes match
+    assert {r["message_id"] for r in index.search("marco")} == {1}
+    assert {r["message_id"] for r in index.search("fatura*")} == {1, 2}
+    assert [r["message_id"] for r in index.search("sender:joao")] == [2]
+
+    result = index.search("sender:joao")[0]
+    assert result["path"] == "exports/Chat_10/documentos/msg2.pdf"
+    assert result["media_type"] == "document"
+    assert result["file_name"] == "fatura_05.pdf"
+    assert "[" in index.search("bom")[0]["snippet"]
+
+
+def test_search_filters_by_chat_and_media_type(index):
+    for message_id, chat_id in [(1, 10), (2, 20)]:
+        document = make_document(file_name=f"relatorio{message_id}.pdf")
+        index.add(make_message(message_id, document, text="relatório"), chat_id)
+    index.add(make_message(3, text="relatório sem anexo"), chat_id=20)
+    index.flush()
+
+    assert [r["message_id"] for r in index.search("relatorio", chat_id=20)] == [3, 2]
+    assert {
+        r["message_id"] for r in index.search("relatorio", media_type="document")
+    } == {1, 2}
+    assert len(index.search("relatorio", limit=1)) == 1
+
+
+def test_reindexed_messages_replace_their_text(index):
+    index.add(make_message(1, text="texto antigo"), chat_id=10)
+    index.flush()
+    index.add(make_message(1, text="texto editado"), chat_id=10)
+    index.flush()
+
+    assert index.search("antigo") == []
+    assert len(index.search("editado")) == 1
+    assert len(index) == 1
+
+
+def test_writes_are_applied_in_batches(tmp_path):
+    index = MessageIndex(str(tmp_path / "messages.db"), batch_size=3)
+    index.add(make_message(1, text="um"), chat_id=1)
+    index.add(make_message(2, text="dois"), chat_id=1)
+
+    assert len(index) == 0
+    index.set_path(1, 1, "msg1.jpg")
+    assert len(index) == 2
+    index.close()
+
+
+def test_invalid_query_raises_value_error(index):
+    index.add(make_message(1, text="algo"), chat_id=1)
+    index.flush()
+
+    with pytest.raises(ValueError):
+        index.search('"aspas abertas')
+
+
+def test_sender_name_falls_back_to_signature_and_id():
+    def name(sender, **fields):
+        return get_sender_name(SimpleNamespace(sender=sender, **fields))
+
+    nameless = SimpleNamespace(title=None, first_name=None, last_name=None)
+    person = SimpleNamespace(title=None, first_name="Ana", last_name="Lima")
+
+    assert name(SimpleNamespace(title="Canal")) == "Canal"
+    assert name(person) == "Ana Lima"
+    assert name(nameless, post_author="Redação", sender_id=1) == "Redação"
+    assert name(None, sender_id=42) == "42"
@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from near_duplicates import PerceptualHashIndex, dhash
+
+BASE = 0xF0F0_AAAA_5555_0F0F
+INVERSE = ~BASE & (2**64 - 1)
+
+
+def _flip(value, bits):
+    """value with its lowest `bits` bits inverted"""
+    return value ^ ((1 << bits) - 1)
+
+
+def test_matches_are_found_by_hamming_distance():
+    index = PerceptualHashIndex(None)
+    index.add(BASE, "fotos/original.jpg")
+    index.add(INVERSE, "fotos/inverso.jpg")
+
+    assert index.nearest(_flip(BASE, 3)) == (3, "fotos/original.jpg")
+    assert index.find(_flip(BASE, 3), max_distance=4) == "fotos/original.jpg"
+    assert index.find(_flip(BASE, 5), max_distance=4) is None
+    assert PerceptualHashIndex(None).nearest(BASE) is None
+
+
+def test_index_is_persisted_across_runs(tmp_path):
+    path = tmp_path / "hashes" / "index.jsonl"
+    index = PerceptualHashIndex(str(path))
+    for i in range(1500):
+        index.add(BASE ^ (i << 20), f"msg{i}.jpg", chat_id=1, message_id=i)
+
+    reloaded = PerceptualHashIndex(str(path))
+
+    assert len(reloaded) == 1500
+    assert reloaded.find(BASE ^ (1499 << 20), 0) == "msg1499.jpg"
+    entry = json.loads(path.read_text().splitlines()[0])
+    assert entry == {
+        "hash": f"{BASE:x}",
+        "path": "msg0.jpg",
+        "chat_id": 1,
+        "message_id": 0,
+    }
+
+
+def test_reposts_wait_for_the_copy_still_downloading():
+    index = PerceptualHashIndex(None)
+
+    async def run():
+        index.reserve(BASE)
+        index.reserve(INVERSE)
+        pending = index.find_pending(_flip(BASE, 2), max_distance=4)
+        assert index.find_pending(_flip(BASE, 9), max_distance=4) is None
+        assert not pending.done()
+
+        index.add(BASE, "fotos/original.jpg")
+        stored = await pending
+
+        failed = index.find_pending(INVERSE, max_distance=0)
+        index.release(INVERSE)
+        return stored, await failed
+
+    stored, failed = asyncio.run(run())
+
+    assert stored == "fotos/original.jpg"
+    # A failed download resolves its reposts with None
+    assert failed is None
+    assert index.find_pending(BASE, 64) is None
+
+
+def test_dhash_survives_rescaling_and_recompression():
+    image_module = pytest.importorskip("PIL.Image")
+
+    image = image_module.new("L", (64, 48))
+    # Brightness grows to the right: every pixel is darker than its neighbour
+    image.putdata([x * 3 + y for y in range(48) for x in range(64)])
+
+    def encode(img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    original = dhash(encode(image, 95))
+    repost = dhash(encode(image.resize((32, 24)), 40))
+    other = dhash(encode(image.transpose(image_module.FLIP_LEFT_RIGHT), 95))
+
+    assert bin(original ^ repost).count("1") <= 6
+    assert bin(original ^ other).count("1") > 20
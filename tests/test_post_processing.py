@@ -0,0 +1,47 @@
+import asyncio
+import hashlib
+
+from file_utils import load_download_records, write_download_record
+from post_processing import PostProcessor, run_processors
+
+
+def test_run_processors_checksum_and_size(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"x" * 100)
+
+    results = run_processors(str(path), {"size": 120}, ["sha256", "size", "missing"])
+
+    assert results["sha256"] == hashlib.sha256(b"x" * 100).hexdigest()
+    assert results["actual_size"] == 100
+    assert results["size_ok"] is False
+    assert run_processors(str(tmp_path / "gone"), {}, ["sha256"]) == {
+        "error": "file_not_found"
+    }
+
+
+def test_results_are_merged_into_download_records(tmp_path):
+    records_path = str(tmp_path / "download_records.jsonl")
+    files = []
+    for message_id in range(1, 6):
+        path = tmp_path / f"msg{message_id}.bin"
+        path.write_bytes(bytes([message_id]) * message_id)
+        record = {"message_id": message_id, "size": message_id}
+        write_download_record(records_path, record)
+        files.append((str(path), record))
+
+    async def run():
+        # A queue smaller than the batch exercises submit() backpressure
+        async with PostProcessor(["sha256", "size"], workers=2, queue_size=1) as pp:
+            for path, record in files:
+                await pp.submit(path, record, records_path)
+        return pp.processed_count
+
+    assert asyncio.run(run()) == 5
+
+    records = load_download_records(records_path)
+    for message_id, record in records.items():
+        assert record["size"] == message_id
+        results = record["post_processing"]
+        assert results["size_ok"] is True
+        expected = hashlib.sha256(bytes([message_id]) * message_id).hexdigest()
+        assert results["sha256"] == expected
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from priority_scheduler import PriorityScheduler, priority_level
+
+
+class Recorder:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def write(self, data):
+        self.log.append(self.name)
+        return len(data)
+
+
+def test_waiters_are_served_by_class_then_arrival():
+    scheduler = PriorityScheduler(slots=1)
+    order = []
+
+    async def download(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    async def run():
+        async with scheduler.slot("bulk"):
+            tasks = [
+                asyncio.create_task(download(name, priority))
+                for name, priority in [
+                    ("bulk1", "bulk"),
+                    ("sync", "incremental"),
+                    ("user", "interactive"),
+                    ("bulk2", "bulk"),
+                ]
+            ]
+            await asyncio.sleep(0)
+            assert scheduler.status()["waiting"] == {
+                "interactive": 1,
+                "incremental": 1,
+                "bulk": 2,
+            }
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["user", "sync", "bulk1", "bulk2"]
+    assert scheduler.in_use == 0
+
+
+def test_bulk_download_yields_its_slot_between_chunks():
+    scheduler = PriorityScheduler(slots=1)
+    dc_limit = asyncio.Semaphore(1)
+    log = []
+
+    async def download(name, priority, chunks, pause=None):
+        async with scheduler.slot(priority, dc_limit) as slot:
+            writer = slot.wrap(Recorder(log, name))
+            for chunk in range(chunks):
+                if chunk == 2 and pause:
+                    await pause.wait()
+                await writer.write(b"chunk")
+        return slot.preemptions
+
+    async def run():
+        # The bulk download pauses after two chunks until the user waits
+        pause = asyncio.Event()
+        bulk = asyncio.create_task(download("bulk", "bulk", 4, pause))
+        while len(log) < 2:
+            await asyncio.sleep(0)
+        interactive = asyncio.create_task(download("user", "interactive", 2))
+        while not scheduler.urgent_waiting(2):
+            await asyncio.sleep(0)
+        pause.set()
+        return await asyncio.gather(bulk, interactive)
+
+    preemptions = asyncio.run(run())
+
+    # The interactive download also needed the DC slot the bulk one held
+    assert log == ["bulk", "bulk", "user", "user", "bulk", "bulk"]
+    assert preemptions == [1, 0]
+    assert scheduler.in_use == 0
+    assert not dc_limit.locked()
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    scheduler = PriorityScheduler(slots=1)
+
+    async def run():
+        await scheduler.acquire(2)
+        waiter = asyncio.create_task(scheduler.acquire(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+
+    asyncio.run(run())
+
+    assert scheduler.in_use == 0
+    assert not scheduler.urgent_waiting(2)
+
+
+def test_unknown_priority_is_rejected():
+    assert priority_level("interactive") < priority_level("bulk")
+    with pytest.raises(ValueError):
+        PriorityScheduler().slot("urgente")
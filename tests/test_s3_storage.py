@@ -0,0 +1,112 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from storage import S3Storage
+
+
+class FakeS3:
+    """In-memory subset of the boto3 S3 client"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        self.objects[(Bucket, Key)] = b"".join(parts[n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+
+def _download(storage, path, chunks):
+    async def run():
+        async with storage.open_writer(path) as writer:
+            for chunk in chunks:
+                await writer.write(chunk)
+        return writer
+
+    return asyncio.run(run())
+
+
+def test_small_file_is_a_single_put():
+    s3 = FakeS3()
+    storage = S3Storage("bucket", "backup/", part_size=10, s3_client=s3)
+    path = os.path.join("exports", "Chat_1", "photos", "a.jpg")
+
+    _download(storage, path, [b"abc", b"def"])
+
+    assert s3.objects == {("bucket", "backup/Chat_1/photos/a.jpg"): b"abcdef"}
+    assert storage.size(path) == 6
+    assert storage.size(os.path.join("exports", "missing")) is None
+
+
+def test_large_file_streams_in_parts():
+    s3 = FakeS3()
+    storage = S3Storage("bucket", "", part_size=10, s3_client=s3)
+    chunks = [bytes([i]) * 4 for i in range(7)]
+
+    writer = _download(storage, os.path.join("exports", "v.mp4"), chunks)
+
+    assert s3.objects[("bucket", "v.mp4")] == b"".join(chunks)
+    assert [part["PartNumber"] for part in writer._parts] == [1, 2, 3]
+    assert not s3.uploads
+
+
+def test_failed_download_aborts_the_upload():
+    s3 = FakeS3()
+    storage = S3Storage("bucket", "", part_size=4, s3_client=s3)
+
+    async def run():
+        async with storage.open_writer(os.path.join("exports", "v.mp4")) as writer:
+            await writer.write(b"12345678")
+            raise ConnectionError("download interrupted")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+    assert s3.aborted == ["v.mp4"]
+    assert not s3.objects
+
+
+def test_empty_s3_variables_count_as_unset():
+    # docker-compose passes unset variables as empty strings
+    env = dict(os.environ, S3_ENDPOINT_URL="", S3_ACCESS_KEY="", S3_BUCKET="")
+    code = (
+        "import config; "
+        "print(config.S3_ENDPOINT_URL, config.S3_ACCESS_KEY, config.S3_BUCKET)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert output.split() == ["None", "None", "telegram-exports"]
@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import session_manager
+from event_bus import ErrorEvent, get_event_bus
+from session_manager import CONNECTED, DISCONNECTED, SessionManager
+
+
+class FloodError(Exception):
+    """RPC error with a wait time, like Telethon's FloodWaitError"""
+
+    seconds = 30
+
+
+class ConnectionClient:
+    def __init__(self):
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self):
+        self.connects += 1
+        self.connected = True
+
+    async def disconnect(self):
+        self.disconnects += 1
+        self.connected = False
+
+
+def _supervise(monkeypatch, outcomes):
+    """Run the supervisor over scripted ping outcomes; returns the sleeps"""
+    sleeps = []
+    manager = SessionManager("teste")
+    manager.client = ConnectionClient()
+    manager.client.connected = True
+    monkeypatch.setattr(session_manager, "SESSION_HEALTH_INTERVAL", 60)
+    monkeypatch.setattr(session_manager, "SESSION_RECONNECT_MIN_DELAY", 2)
+    monkeypatch.setattr(session_manager, "SESSION_RECONNECT_MAX_DELAY", 8)
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == len(outcomes):
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(
+        session_manager,
+        "asyncio",
+        SimpleNamespace(sleep=sleep, TimeoutError=asyncio.TimeoutError),
+    )
+    pings = iter(outcomes)
+
+    async def ping():
+        outcome = next(pings)
+        if outcome:
+            raise outcome
+        return 12.5
+
+    manager.ping = ping
+    try:
+        asyncio.run(manager._supervise())
+    except asyncio.CancelledError:
+        pass
+    return manager, sleeps
+
+
+def test_rpc_errors_back_off_without_dropping_the_connection(monkeypatch):
+    manager, sleeps = _supervise(monkeypatch, [FloodError("flood"), None])
+
+    assert manager.client.disconnects == 0
+    # Waits at least as long as the server asked
+    assert sleeps == [30, 60]
+    assert (manager.state, manager.last_error) == (CONNECTED, None)
+
+
+def test_dropped_connection_is_reconnected_with_backoff(monkeypatch, events):
+    outcomes = [ConnectionError("reset"), OSError("down"), TimeoutError(), None]
+
+    manager, sleeps = _supervise(monkeypatch, outcomes)
+
+    assert sleeps == [2, 4, 8, 60]
+    assert manager.client.disconnects >= 3
+    assert manager.reconnects == 3
+    assert manager.state == CONNECTED
+    get_event_bus().flush()
+    assert len(events.of_type(ErrorEvent)) == 3
+
+
+def test_get_client_reuses_one_connection(monkeypatch):
+    manager = SessionManager("teste")
+    manager.client = ConnectionClient()
+    monkeypatch.setattr(manager, "_supervise", asyncio.Event().wait)
+
+    async def run():
+        first = await manager.get_client()
+        second = await manager.get_client()
+        supervisor = manager._supervisor
+        await manager.close()
+        return first, second, supervisor
+
+    first, second, supervisor = asyncio.run(run())
+
+    assert first is second
+    assert first.connects == 1
+    assert supervisor.cancelled()
+    assert manager.state == DISCONNECTED
+
+
+def test_unanswered_ping_times_out(monkeypatch):
+    pytest.importorskip("telethon")
+    monkeypatch.setattr(session_manager, "SESSION_PING_TIMEOUT", 0.01)
+    manager = SessionManager("teste")
+
+    async def half_open(request):
+        await asyncio.Event().wait()
+
+    manager.client = half_open
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(manager.ping())
+    assert manager.latency_ms is None
@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+errors = pytest.importorskip("telethon.errors")
+
+from takeout_session import TakeoutSession  # noqa: E402
+
+
+class GetFileRequest:
+    pass
+
+
+class TakeoutRequest:
+    """What client.takeout() returns; outcomes are scripted per attempt"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        outcome = self.client.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.client.session.takeout_id = 42
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.client.finished.append(exc_type is None)
+
+
+class TakeoutClient:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.session = SimpleNamespace(takeout_id=None)
+        self.finished = []
+        self.ended = []
+        self.sent = []
+        self._sender = "home"
+
+    def takeout(self, **options):
+        self.options = options
+        return TakeoutRequest(self)
+
+    async def end_takeout(self, success):
+        self.ended.append(success)
+
+    async def _call(self, sender, request):
+        self.sent.append((sender, type(request).__name__))
+
+
+def _run(client, body=None, enabled=True):
+    async def run():
+        async with TakeoutSession(client, enabled) as session:
+            state = (session.active, session.client)
+            await client._call("home", GetFileRequest())
+            await client._call("dc4", GetFileRequest())
+            if body:
+                body(session)
+        return session, state
+
+    return asyncio.run(run())
+
+
+def test_granted_takeout_carries_home_file_requests():
+    client = TakeoutClient("ok")
+
+    session, (active, export_client) = _run(client)
+
+    assert active and isinstance(export_client, TakeoutRequest)
+    # Only chunks of the home DC go through the takeout
+    assert client.sent == [
+        ("home", "InvokeWithTakeoutRequest"),
+        ("dc4", "GetFileRequest"),
+    ]
+    assert client.options["files"] and client.options["megagroups"]
+    assert client.finished == [True]
+    assert client.session.takeout_id is None
+    assert session.client is client and not session.active
+
+
+@pytest.mark.parametrize(
+    "refusal",
+    [
+        errors.TakeoutInitDelayError(request=None, capture=86400),
+        errors.RPCError(None, "TAKEOUT_DENIED"),
+    ],
+)
+def test_pending_or_refused_takeout_falls_back(refusal, capsys):
+    client = TakeoutClient(refusal)
+
+    session, (active, export_client) = _run(client)
+
+    assert not active and export_client is client
+    assert client.sent == [("home", "GetFileRequest"), ("dc4", "GetFileRequest")]
+    assert "sessão normal" in capsys.readouterr().out
+
+
+def test_takeout_left_open_is_finished_and_retried():
+    client = TakeoutClient(ValueError("takeout aberto"), "ok")
+
+    _, (active, _) = _run(client)
+
+    assert active
+    assert client.ended == [False]
+
+
+def test_invalidated_takeout_switches_to_the_regular_client():
+    client = TakeoutClient("ok")
+    decisions = []
+
+    def body(session):
+        decisions.append(session.fallback(ConnectionError("reset")))
+        decisions.append(session.fallback(errors.TakeoutInvalidError(request=None)))
+        decisions.append(session.client is client)
+
+    _run(client, body)
+
+    assert decisions == [False, True, True]
+    # The takeout was not finished as successful
+    assert client.finished == [False]
+
+
+def test_disabled_takeout_uses_the_regular_client():
+    client = TakeoutClient()
+
+    _, (active, export_client) = _run(client, enabled=False)
+
+    assert not active and export_client is client
+    assert not hasattr(client, "options")
+
+
+def test_export_redoes_the_chat_after_the_takeout_is_invalidated(monkeypatch):
+    import telethon_handlers
+
+    client = TakeoutClient("ok")
+    used = []
+
+    async def export_chat_media(export_client, chat_info, *args):
+        used.append((chat_info["id"], export_client is client))
+        if export_client is not client:
+            raise errors.TakeoutInvalidError(request=None)
+        return True
+
+    monkeypatch.setattr(telethon_handlers, "_export_chat_media", export_chat_media)
+    chats = [{"id": i, "title": f"Chat {i}", "type": "Channel"} for i in (1, 2)]
+
+    result = asyncio.run(
+        telethon_handlers.export_all_chats_media(client, chats, takeout=True)
+    )
+
+    assert result == (2, 0)
+    assert used == [(1, False), (1, True), (2, True)]
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from trace_replay import TraceRecorder, load_trace
+
+
+class GetHistoryRequest:
+    pass
+
+
+class GetFileRequest:
+    def __init__(self, file_id, offset):
+        self.location = SimpleNamespace(id=file_id)
+        self.offset = offset
+
+
+class FloodWaitError(Exception):
+    seconds = 7
+
+
+def _recorded_client():
+    """Client whose _call answers history pages and file chunks"""
+
+    async def call(sender, request):
+        if isinstance(request, GetHistoryRequest):
+            return SimpleNamespace(messages=[SimpleNamespace(media=None)] * 2)
+        if request.offset == 1024:
+            raise FloodWaitError()
+        return SimpleNamespace(bytes=b"x" * 1024)
+
+    return SimpleNamespace(_call=call, session=SimpleNamespace(dc_id=4))
+
+
+def test_recorded_trace_is_anonymized_and_grouped(tmp_path):
+    path = tmp_path / "traces" / "run.jsonl"
+    recorder = TraceRecorder(str(path))
+    client = _recorded_client()
+    recorder.install(client)
+    recorder.install(client)
+
+    async def export():
+        recorder.record_chat()
+        await client._call(None, GetHistoryRequest())  # Access check
+        recorder.record_history()
+        await client._call(None, GetHistoryRequest())
+        for offset in (0, 1024, 1024, 2048):
+            try:
+                await client._call(None, GetFileRequest(987654321, offset))
+            except FloodWaitError:
+                pass
+
+    asyncio.run(export())
+    recorder.close()
+
+    text = path.read_text()
+    assert "987654321" not in text
+    assert text.count('"kind": "session"') == 1
+
+    trace = load_trace(str(path))
+
+    assert trace["home_dc"] == 4
+    # The access check page is not part of the replayed history
+    assert len(trace["chats"]) == 1
+    assert [len(page["messages"]) for page in trace["chats"][0]] == [2]
+    chunks = trace["files"][1]
+    assert [chunk.get("bytes") for chunk in chunks] == [1024, None, None, 1024]
+    assert chunks[1]["error"] == "FloodWaitError"
+    assert chunks[1]["flood_seconds"] == 7
+
+
+def test_version_1_traces_start_history_at_each_chat(tmp_path):
+    path = tmp_path / "old.jsonl"
+    entries = [
+        {"t": 0, "kind": "start"},
+        {"t": 0, "kind": "chat", "chat": 1},
+        {"t": 1, "kind": "rpc", "request": "GetHistoryRequest", "messages": [None]},
+        {"t": 2, "kind": "chat", "chat": 2},
+        {"t": 3, "kind": "rpc", "request": "SearchRequest", "messages": []},
+    ]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    trace = load_trace(str(path))
+
+    assert [len(pages) for pages in trace["chats"]] == [1, 1]
+
+
+def test_replay_downloads_the_recorded_files(tmp_path):
+    pytest.importorskip("telethon")
+    from trace_replay import replay_trace
+
+    media = {"file": 1, "type": "document", "size": 2048, "dc": 4, "album": None}
+    entries = [
+        {"t": 0, "kind": "start", "version": 2},
+        {"t": 0, "kind": "session", "home_dc": 2},
+        {"t": 0, "kind": "chat", "chat": 1},
+        {"t": 0, "kind": "history", "chat": 1, "topics": 0},
+        {
+            "t": 0,
+            "kind": "rpc",
+            "request": "GetHistoryRequest",
+            "seconds": 0,
+            "messages": [media, None],
+        },
+    ]
+    # A flood wait on the second chunk; the retry starts over from offset 0
+    for chunk in (
+        {"bytes": 1024},
+        {"error": "FloodWaitError", "flood_seconds": 0},
+        {"bytes": 1024},
+        {"bytes": 1024},
+    ):
+        entries.append(
+            {
+                "t": 1,
+                "kind": "rpc",
+                "request": "GetFileRequest",
+                "seconds": 0,
+                "file": 1,
+                "offset": 0,
+                **chunk,
+            }
+        )
+    path = tmp_path / "trace.jsonl"
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    result = asyncio.run(replay_trace(str(path), concurrency=2, speed=100))
+
+    assert (result["chats"], result["files"], result["flood_waits"]) == (1, 1, 1)
+    assert result["bytes"] == 2048
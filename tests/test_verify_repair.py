@@ -0,0 +1,102 @@
+import hashlib
+import json
+
+import verify_repair
+from verify_repair import (
+    CHECKSUM_MISMATCH,
+    EMPTY,
+    MISSING,
+    TRUNCATED,
+    UNRECORDED,
+    verify_chat_export,
+)
+
+
+def _write_records(chat_dir, records):
+    with open(chat_dir / "download_records.jsonl", "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def _file_record(chat_dir, message_id, content, size=None, sha256=None):
+    path = chat_dir / f"msg{message_id}.bin"
+    if content is not None:
+        path.write_bytes(content)
+    record = {
+        "message_id": message_id,
+        "chat_id": 123,
+        "path": str(path),
+        "size": len(content or b"") if size is None else size,
+    }
+    if sha256:
+        record["post_processing"] = {"sha256": sha256}
+    return record
+
+
+def test_problems_are_reported_per_message(tmp_path):
+    chat_dir = tmp_path / "Chat_123"
+    chat_dir.mkdir()
+    good = b"intact"
+    _write_records(
+        chat_dir,
+        [
+            _file_record(chat_dir, 1, good, sha256=hashlib.sha256(good).hexdigest()),
+            _file_record(chat_dir, 2, b"half", size=10),
+            _file_record(chat_dir, 3, b"", size=10),
+            _file_record(chat_dir, 4, None, size=10),
+            _file_record(chat_dir, 5, b"damaged", sha256="0" * 64),
+            # Post-processing results only: nothing to verify
+            {"message_id": 6, "post_processing": {"sha256": "0" * 64}},
+        ],
+    )
+    # Left behind by a crash before its record was written
+    (chat_dir / "album77_msg9.jpg").write_bytes(b"partial")
+
+    issues = verify_chat_export(str(chat_dir))
+
+    problems = {issue["message_id"]: issue["problem"] for issue in issues}
+    assert problems == {
+        2: TRUNCATED,
+        3: EMPTY,
+        4: MISSING,
+        5: CHECKSUM_MISMATCH,
+        9: UNRECORDED,
+    }
+    unrecorded = issues[-1]
+    assert (unrecorded["chat_id"], unrecorded["album_id"]) == (123, 77)
+
+    # Checksums are optional
+    without = verify_chat_export(str(chat_dir), check_checksums=False)
+    assert 5 not in {issue["message_id"] for issue in without}
+
+
+def test_truncated_archive_shard_is_reported(tmp_path):
+    chat_dir = tmp_path / "Chat_123"
+    (chat_dir / "pacotes").mkdir(parents=True)
+    (chat_dir / "pacotes" / "chat_0001.tar").write_bytes(b"x" * 1500)
+
+    def archived(message_id, offset):
+        entry = {"shard": "chat_0001.tar", "offset": offset, "size": 500}
+        return {
+            "message_id": message_id,
+            "chat_id": 123,
+            "path": None,
+            "size": 500,
+            "archive": entry,
+        }
+
+    _write_records(chat_dir, [archived(1, 512), archived(2, 1536)])
+
+    issues = verify_chat_export(str(chat_dir))
+
+    assert [(i["message_id"], i["problem"]) for i in issues] == [(2, TRUNCATED)]
+    assert issues[0]["archive_format"] == "tar"
+
+
+def test_find_chat_dirs_only_lists_exports_with_records(tmp_path):
+    chat_dir = tmp_path / "Chat_123"
+    chat_dir.mkdir()
+    (chat_dir / "download_records.jsonl").write_text("")
+    (tmp_path / "Outro_456").mkdir()
+
+    assert verify_repair.find_chat_dirs(str(tmp_path)) == [str(chat_dir)]
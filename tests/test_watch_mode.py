@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import watch_mode
+from event_bus import ErrorEvent, get_event_bus
+from fakes import FakeClient, make_document, make_message
+from file_utils import write_download_record
+from watch_mode import ChatWatcher
+
+
+class FakePipeline:
+    """Records enqueued IDs; downloads of IDs in fail report a failure"""
+
+    def __init__(self, base_dir):
+        self.base_dir = str(base_dir)
+        self.records_file = os.path.join(self.base_dir, "download_records.jsonl")
+        self.fail = set()
+        self.enqueued = []
+        self.albums = []
+
+    async def _result(self, message_ids):
+        failed = len(self.fail.intersection(message_ids))
+        return None, len(message_ids) - failed, failed
+
+    def enqueue(self, message):
+        self.enqueued.append(message.id)
+        return asyncio.ensure_future(self._result([message.id]))
+
+    def enqueue_album(self, messages):
+        ids = [message.id for message in messages]
+        self.albums.append(ids)
+        return asyncio.ensure_future(self._result(ids))
+
+
+def _messages(first, last):
+    return [make_message(i, make_document()) for i in range(first, last + 1)]
+
+
+def _watcher(tmp_path, client):
+    return ChatWatcher(client, client.entity, FakePipeline(tmp_path))
+
+
+async def _catch_up(watcher):
+    count = await watcher.catch_up()
+    # Let the download tasks finish and their callbacks run
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    return count
+
+
+def test_first_run_starts_at_the_newest_message(tmp_path):
+    client = FakeClient(_messages(1, 10))
+    watcher = _watcher(tmp_path, client)
+
+    assert asyncio.run(_catch_up(watcher)) == 0
+    assert watcher.last_message_id == 10
+    assert watcher.pipeline.enqueued == []
+    with open(watcher.state_path) as f:
+        assert json.load(f)["last_message_id"] == 10
+
+
+def test_first_run_resumes_after_existing_downloads(tmp_path):
+    client = FakeClient(_messages(1, 10))
+    watcher = _watcher(tmp_path, client)
+    for message_id in (2, 6):
+        write_download_record(watcher.pipeline.records_file, {"message_id": message_id})
+
+    asyncio.run(_catch_up(watcher))
+
+    assert watcher.pipeline.enqueued == [7, 8, 9, 10]
+    assert watcher.last_message_id == 10
+
+
+def test_failed_download_holds_the_watermark_until_retried(tmp_path):
+    client = FakeClient(_messages(1, 10))
+    watcher = _watcher(tmp_path, client)
+
+    async def run():
+        await _catch_up(watcher)
+        client.messages += _messages(11, 13)
+        watcher.pipeline.fail = {12}
+        await _catch_up(watcher)
+        held = watcher.last_message_id
+
+        watcher.pipeline.fail = set()
+        await _catch_up(watcher)
+        return held
+
+    assert asyncio.run(run()) == 11
+    # Only the failed message is downloaded again
+    assert watcher.pipeline.enqueued == [11, 12, 13, 12]
+    assert watcher.last_message_id == 13
+
+
+def test_gives_up_after_max_attempts(tmp_path, monkeypatch, events):
+    monkeypatch.setattr("watch_mode.WATCH_MAX_ATTEMPTS", 2)
+    client = FakeClient(_messages(1, 3))
+    watcher = _watcher(tmp_path, client)
+    watcher.pipeline.fail = {3}
+
+    async def run():
+        await _catch_up(watcher)
+        client.messages.append(make_message(4, make_document()))
+        for _ in range(3):
+            await _catch_up(watcher)
+
+    watcher.last_message_id = 2
+    watcher.has_state = True
+    asyncio.run(run())
+
+    assert watcher.pipeline.enqueued.count(3) == 2
+    assert watcher.last_message_id == 4
+    get_event_bus().flush()
+    assert [e.message_id for e in events.of_type(ErrorEvent)] == [3]
+
+
+def test_updates_and_catch_up_do_not_download_twice(tmp_path):
+    client = FakeClient(_messages(1, 3))
+    watcher = _watcher(tmp_path, client)
+
+    async def run():
+        await _catch_up(watcher)
+        new = make_message(4, make_document())
+        client.messages.append(new)
+        watcher.handle_message(new)
+        await _catch_up(watcher)
+
+    asyncio.run(run())
+
+    assert watcher.pipeline.enqueued == [4]
+    assert watcher.last_message_id == 4
+
+
+def test_catch_up_batches_album_members(tmp_path):
+    client = FakeClient(_messages(1, 2))
+    watcher = _watcher(tmp_path, client)
+
+    async def run():
+        await _catch_up(watcher)
+        client.messages += [
+            make_message(3, make_document(), grouped_id=7),
+            make_message(4, make_document(), grouped_id=7),
+            make_message(5, make_document()),
+        ]
+        await _catch_up(watcher)
+
+    asyncio.run(run())
+
+    assert watcher.pipeline.albums == [[3, 4]]
+    assert watcher.pipeline.enqueued == [5]
+    assert watcher.last_message_id == 5
+
+
+class WatchClient:
+    """Client whose connection never drops; Telethon may reconnect it"""
+
+    def __init__(self):
+        self.disconnected = asyncio.get_running_loop().create_future()
+        self._sender = SimpleNamespace(
+            _auto_reconnect_callback=self._handle_auto_reconnect
+        )
+        self.handlers = []
+        self.resumed = 0
+
+    async def _handle_auto_reconnect(self):
+        self.resumed += 1
+
+    def add_event_handler(self, callback, event):
+        self.handlers.append(callback)
+
+    def remove_event_handler(self, callback):
+        self.handlers.remove(callback)
+
+
+def test_catch_up_runs_after_reconnects_without_polling(monkeypatch):
+    pytest.importorskip("telethon")
+    from telethon.tl.types import PeerUser
+
+    passes = []
+
+    class Watcher:
+        def __init__(self, client, entity, pipeline):
+            self.entity = entity
+            self.pipeline = pipeline
+
+        async def catch_up(self):
+            passes.append(self.entity.user_id)
+            return 0
+
+    class Pipeline:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def start(self):
+            pass
+
+        async def close(self):
+            pass
+
+    async def get_entity(client, chat_info):
+        return PeerUser(chat_info["id"])
+
+    async def get_topics(client, entity):
+        return {}
+
+    monkeypatch.setattr(watch_mode, "ChatWatcher", Watcher)
+    monkeypatch.setattr(watch_mode, "ChatDownloadPipeline", Pipeline)
+    monkeypatch.setattr(watch_mode, "get_chat_entity_safe", get_entity)
+    monkeypatch.setattr(watch_mode, "get_forum_topics", get_topics)
+    monkeypatch.setattr(watch_mode, "WATCH_CATCH_UP_INTERVAL", 0)
+
+    async def wait_for_passes(count):
+        while len(passes) < count:
+            await asyncio.sleep(0)
+
+    async def run():
+        client = WatchClient()
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            watch_mode.watch_chats(client, [{"id": 5, "title": "Chat"}], "files", stop)
+        )
+        await wait_for_passes(1)
+        await asyncio.sleep(0.05)
+        assert len(passes) == 1
+
+        await client._sender._auto_reconnect_callback()
+        await wait_for_passes(2)
+        stop.set()
+        await task
+        return client
+
+    client = asyncio.run(run())
+
+    assert passes == [5, 5]
+    # Telethon's own reconnect hook still runs and is restored afterwards
+    assert client.resumed == 1
+    assert client._sender._auto_reconnect_callback == client._handle_auto_reconnect
+    assert client.handlers == []
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import distributed
+import telethon_handlers
+import work_queue
+from work_queue import DONE, FAILED, LEASED, PENDING, SQLiteWorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"))
+    yield queue
+    queue.close()
+
+
+def test_items_are_leased_in_order_and_completed(queue):
+    assert queue.put([{"chat": 1}, {"chat": 2}]) == 2
+
+    first = queue.lease("w1", 60)
+    second = queue.lease("w2", 60)
+
+    assert (first["payload"], first["attempts"]) == ({"chat": 1}, 1)
+    assert second["payload"] == {"chat": 2}
+    assert queue.lease("w3", 60) is None
+
+    # Only the holder of a lease may renew or complete it
+    assert not queue.heartbeat(first["id"], "w2", 60)
+    assert queue.heartbeat(first["id"], "w1", 60)
+    assert not queue.complete(first["id"], "w2", {"files": 0})
+    assert queue.complete(first["id"], "w1", {"files": 3})
+
+    assert queue.stats() == {DONE: 1, LEASED: 1}
+    assert queue.items(DONE)[0]["result"] == {"files": 3}
+    assert not queue.is_finished()
+
+
+def test_failed_item_is_retried_after_backoff_until_max_attempts(queue, monkeypatch):
+    queue.put([{"chat": 1}], max_attempts=2)
+
+    item = queue.lease("w1", 60)
+    assert queue.fail(item["id"], "w1", "boom")
+
+    # Backoff: not available again right away
+    assert queue.lease("w1", 60) is None
+    assert queue.items(PENDING)[0]["error"] == "boom"
+
+    monkeypatch.setattr(work_queue, "WORK_RETRY_BACKOFF", 0)
+    queue.put([{"chat": 2}], max_attempts=2)
+    retried = queue.lease("w1", 60)
+    assert retried["payload"] == {"chat": 2}
+    queue.fail(retried["id"], "w1", "boom")
+    retried = queue.lease("w2", 60)
+    assert (retried["payload"], retried["attempts"]) == ({"chat": 2}, 2)
+
+    queue.fail(retried["id"], "w2", "boom again")
+    assert [i["payload"] for i in queue.items(FAILED)] == [{"chat": 2}]
+
+
+def test_expired_lease_goes_to_another_worker(queue):
+    queue.put([{"chat": 1}], max_attempts=2)
+
+    item = queue.lease("w1", -1)
+    taken = queue.lease("w2", 60)
+
+    assert taken["id"] == item["id"]
+    assert taken["attempts"] == 2
+    # The first worker lost its lease
+    assert not queue.heartbeat(item["id"], "w1", 60)
+    assert not queue.complete(item["id"], "w1", {})
+
+    # Out of attempts: an expired lease fails the item for good
+    queue.heartbeat(item["id"], "w2", -1)
+    assert queue.lease("w3", 60) is None
+    assert queue.items(FAILED)[0]["error"] == "lease_expired"
+    assert queue.is_finished()
+
+
+def test_network_filesystem_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "_filesystem_type", lambda path: "nfs4")
+
+    with pytest.raises(ValueError):
+        SQLiteWorkQueue(str(tmp_path / "queue.db"))
+
+
+def test_split_history_covers_the_newest_ids_once():
+    ranges = distributed.split_history(top_id=250, limit=200, range_size=100)
+
+    # Both bounds exclusive, as in iter_messages
+    assert ranges == [(50, 151), (150, 251)]
+    covered = [i for low, high in ranges for i in range(low + 1, high)]
+    assert covered == list(range(51, 251))
+
+
+def test_work_item_with_failed_downloads_retries_then_completes(monkeypatch):
+    entity = SimpleNamespace(id=7, title="Chat")
+    calls = []
+
+    async def get_chat_entity_safe(client, chat):
+        return entity
+
+    async def export_media_organized(client, chat, *args, stats, skip_recorded):
+        calls.append(skip_recorded)
+        stats.update(failed=2, recorded=3, failed_ids=[40, 41])
+        return 5
+
+    monkeypatch.setattr(telethon_handlers, "get_chat_entity_safe", get_chat_entity_safe)
+    monkeypatch.setattr(
+        telethon_handlers, "export_media_organized", export_media_organized
+    )
+    payload = {
+        "chat": 7,
+        "limit": None,
+        "media_types": None,
+        "output_mode": "files",
+        "metadata_only": False,
+        "downloads_per_chat": 2,
+        "min_id": 0,
+        "max_id": 101,
+    }
+
+    with pytest.raises(RuntimeError, match="2 downloads"):
+        asyncio.run(distributed.run_work_item(SimpleNamespace(), payload))
+    # The last attempt keeps what was downloaded and lists the failures
+    result = asyncio.run(distributed.run_work_item(SimpleNamespace(), payload, True))
+
+    assert result == {"chat_id": 7, "files": 5, "recorded": 3, "failed_ids": [40, 41]}
+    # Media recorded by earlier attempts are never downloaded again
+    assert calls == [True, True]
@@ -0,0 +1,476 @@
+"""
+Trace recording and replay module for Telegram Media Downloader
+Records an anonymized trace of a real export (RPC timings, history page
+sizes, media sizes and data centers, flood waits) and replays it offline
+against the export pipeline, so scheduling and concurrency changes can
+be compared on production-shaped workloads
+
+Recording is enabled with the TRACE_RECORD_PATH environment variable.
+
+Usage:
+    python trace_replay.py trace.jsonl [--concurrency N] [--speed X] [--mode files|tar|zip]
+"""
+
+import asyncio
+import atexit
+import inspect
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from config import TRACE_RECORD_PATH, CONCURRENT_DOWNLOADS
+from storage import StorageBackend, StorageWriter
+
+TRACE_VERSION = 2
+
+# Requests whose results are history pages fed to iter_messages
+HISTORY_REQUESTS = ("GetHistoryRequest", "SearchRequest")
+
+_MIME_TYPES = {
+    "video": "video/mp4",
+    "audio": "audio/mpeg",
+    "voice": "audio/ogg",
+    "sticker": "image/webp",
+    "document": "application/octet-stream",
+}
+
+
+class TraceRecorder:
+    """
+    Appends anonymized trace entries to a JSON Lines file
+
+    Every RPC of an instrumented client is recorded with its duration.
+    Nothing identifying is kept: chats, messages, files and albums are
+    replaced by ordinals and no text, names or IDs are written.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Trace file (appended to)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._started = time.monotonic()
+        self._files: Dict[int, int] = {}
+        self._albums: Dict[int, int] = {}
+        self._chats = 0
+
+        self.record("start", version=TRACE_VERSION)
+
+    def record(self, kind: str, **fields) -> None:
+        """Write one trace entry, timestamped from the start of the trace"""
+        entry = {"t": round(time.monotonic() - self._started, 4), "kind": kind}
+        entry.update(fields)
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def record_chat(self) -> None:
+        """Mark the start of a chat export, before its first RPC"""
+        self._chats += 1
+        self.record("chat", chat=self._chats)
+
+    def record_history(self, topics: int = 0) -> None:
+        """Mark the start of the history scan of the current chat"""
+        self.record("history", chat=self._chats, topics=topics)
+
+    def _ordinal(self, mapping: Dict[int, int], key: Optional[int]) -> Optional[int]:
+        if key is None:
+            return None
+        if key not in mapping:
+            mapping[key] = len(mapping) + 1
+        return mapping[key]
+
+    def _describe_message(self, message) -> Optional[Dict]:
+        from download_pipeline import get_media_location
+        from file_utils import get_media_size, get_media_type_name
+
+        if getattr(message, "media", None) is None:
+            return None
+
+        media = getattr(message, "document", None) or getattr(message, "photo", None)
+        dc_id, _ = get_media_location(message)
+        return {
+            "file": self._ordinal(self._files, getattr(media, "id", None)),
+            "type": get_media_type_name(message),
+            "size": get_media_size(message),
+            "dc": dc_id,
+            "album": self._ordinal(self._albums, getattr(message, "grouped_id", None)),
+        }
+
+    def _record_rpc(self, request, seconds: float, result=None, error=None) -> None:
+        # Takeout exports wrap their requests (see takeout_session.py)
+        if type(request).__name__ == "InvokeWithTakeoutRequest":
+            request = request.query
+        fields = {"request": type(request).__name__, "seconds": round(seconds, 4)}
+
+        location = getattr(request, "location", None)
+        if location is not None and hasattr(location, "id"):
+            fields["file"] = self._ordinal(self._files, location.id)
+            fields["offset"] = getattr(request, "offset", 0)
+
+        if error is not None:
+            fields["error"] = type(error).__name__
+            if getattr(error, "seconds", None) is not None:
+                fields["flood_seconds"] = error.seconds
+        elif hasattr(result, "bytes"):
+            fields["bytes"] = len(result.bytes)
+        elif hasattr(result, "messages"):
+            fields["messages"] = [
+                self._describe_message(message) for message in result.messages
+            ]
+
+        self.record("rpc", **fields)
+
+    def install(self, client) -> None:
+        """
+        Record every RPC of a client
+
+        Telethon sends requests (including file chunks) through
+        client._call, which is wrapped on this client instance only.
+        """
+        if getattr(client, "_trace_recorder", None) is self:
+            return
+
+        original_call = client._call
+
+        async def traced_call(sender, request, *args, **kwargs):
+            started = time.monotonic()
+            try:
+                result = await original_call(sender, request, *args, **kwargs)
+            except Exception as e:
+                self._record_rpc(request, time.monotonic() - started, error=e)
+                raise
+            self._record_rpc(request, time.monotonic() - started, result=result)
+            return result
+
+        client._call = traced_call
+        client._trace_recorder = self
+        self.record("session", home_dc=getattr(client.session, "dc_id", None))
+
+    def close(self) -> None:
+        """Close the trace file (called at exit for the shared recorder)"""
+        if not self._file.closed:
+            self._file.close()
+
+
+_recorder: Optional[TraceRecorder] = None
+
+
+def get_trace_recorder() -> Optional[TraceRecorder]:
+    """Return the recorder selected by TRACE_RECORD_PATH, or None if disabled"""
+    global _recorder
+    if _recorder is None and TRACE_RECORD_PATH:
+        _recorder = TraceRecorder(TRACE_RECORD_PATH)
+        atexit.register(_recorder.close)
+    return _recorder
+
+
+def trace_chat(client) -> Optional[TraceRecorder]:
+    """
+    Start tracing the export of a chat, if recording is enabled
+
+    Call before the first RPC about the chat (entity resolution, access
+    check), so those requests are not mixed into the previous chat.
+
+    Returns:
+        The active recorder, or None if recording is disabled
+    """
+    recorder = get_trace_recorder()
+    if recorder is not None:
+        recorder.install(client)
+        recorder.record_chat()
+    return recorder
+
+
+def load_trace(path: str) -> Dict:
+    """
+    Load a trace and group it for replay
+
+    Args:
+        path: Trace file written by TraceRecorder
+
+    Returns:
+        Dictionary with home_dc, chats (list of history pages, each a
+        dict with seconds and messages) and files (file ordinal -> list
+        of chunk entries in recorded order)
+    """
+    trace = {"home_dc": None, "chats": [], "files": {}}
+    pages: Optional[List[Dict]] = None
+    # Version 1 traces have no "history" entries: pages follow "chat"
+    version = TRACE_VERSION
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+
+            if entry["kind"] == "start":
+                version = entry.get("version", 1)
+            elif entry["kind"] == "session":
+                trace["home_dc"] = entry["home_dc"]
+            elif entry["kind"] == "chat" and version >= 2:
+                # Access checks before the history scan are not replayed
+                pages = None
+            elif entry["kind"] in ("chat", "history"):
+                pages = []
+                trace["chats"].append(pages)
+            elif entry["kind"] == "rpc":
+                if entry["request"] in HISTORY_REQUESTS and pages is not None:
+                    if "messages" in entry:
+                        pages.append(entry)
+                elif entry.get("file") is not None:
+                    trace["files"].setdefault(entry["file"], []).append(entry)
+
+    return trace
+
+
+class NullWriter(StorageWriter):
+    """Writer that only counts bytes"""
+
+    def __init__(self, storage: "NullStorage"):
+        self.bytes_written = 0
+        self._storage = storage
+
+    def write(self, data: bytes) -> int:
+        self.bytes_written += len(data)
+        return len(data)
+
+    async def commit(self) -> None:
+        self._storage.files += 1
+        self._storage.bytes += self.bytes_written
+
+    async def abort(self) -> None:
+        pass
+
+
+class NullStorage(StorageBackend):
+    """Storage backend that discards media (for replays)"""
+
+    name = "null"
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+
+    def open_writer(
+        self, path: str, expected_size: Optional[int] = None
+    ) -> StorageWriter:
+        return NullWriter(self)
+
+    def size(self, path: str) -> Optional[int]:
+        return None
+
+
+def _synthetic_message(message_id: int, media: Optional[Dict]):
+    message = SimpleNamespace(
+        id=message_id,
+        date=datetime.now(),
+        media=None,
+        photo=None,
+        document=None,
+        video=None,
+        voice=None,
+        audio=None,
+        sticker=None,
+        gif=None,
+        grouped_id=None,
+        reply_to=None,
+        sender_id=None,
+        message="",
+    )
+    if media is None:
+        return message
+
+    message.media = media
+    message.grouped_id = media["album"]
+    # Media IDs are the file ordinals, so downloads find their chunks
+    common = dict(id=media["file"] or 0, access_hash=0, file_reference=b"")
+    common["dc_id"] = media["dc"]
+    if media["type"] == "photo":
+        message.photo = SimpleNamespace(
+            **common, sizes=[SimpleNamespace(type="y", size=media["size"])]
+        )
+    elif media["type"] in _MIME_TYPES:
+        message.document = SimpleNamespace(
+            **common,
+            size=media["size"],
+            mime_type=_MIME_TYPES[media["type"]],
+            attributes=[],
+        )
+        if media["type"] != "document":
+            setattr(message, media["type"], message.document)
+    return message
+
+
+class TraceReplayClient:
+    """
+    Stand-in for TelegramClient driven by a recorded trace
+
+    iter_messages serves the recorded history pages and download_file
+    the recorded chunks, each after its recorded latency divided by
+    speed. Recorded flood waits are raised once, as FloodWaitError.
+    """
+
+    def __init__(self, trace: Dict, speed: float = 1.0):
+        """
+        Args:
+            trace: Trace from load_trace
+            speed: Latency divisor (2.0 replays twice as fast)
+        """
+        self.trace = trace
+        self.speed = speed
+        self.session = SimpleNamespace(dc_id=trace["home_dc"])
+        self.flood_waits = 0
+        self._chunks = {
+            ordinal: list(chunks) for ordinal, chunks in trace["files"].items()
+        }
+        self._messages: Dict[int, Dict[int, object]] = {}
+
+    async def _wait(self, seconds: float) -> None:
+        if seconds:
+            await asyncio.sleep(seconds / self.speed)
+
+    async def get_entity(self, entity):
+        return entity
+
+    async def iter_messages(self, entity, limit=None, **kwargs):
+        pages = self.trace["chats"][entity.id - 1]
+        total = sum(len(page["messages"]) for page in pages)
+        messages = self._messages.setdefault(entity.id, {})
+        count = 0
+
+        # Newest first, like Telegram history
+        for page in pages:
+            await self._wait(page["seconds"])
+            for media in page["messages"]:
+                if limit and count >= limit:
+                    return
+                message = _synthetic_message(total - count, media)
+                messages[message.id] = message
+                count += 1
+                yield message
+
+    async def get_messages(self, entity, ids=None, **kwargs):
+        messages = self._messages.get(entity.id, {})
+        return [messages.get(message_id) for message_id in ids]
+
+    async def download_file(self, location, file=None, file_size=None, **kwargs):
+        from telethon.errors import FloodWaitError
+
+        chunks = self._chunks.get(location.id)
+        if not chunks:
+            # Not downloaded while recording: deliver it at once
+            chunks = [{"bytes": file_size or 0, "seconds": 0}]
+
+        while chunks:
+            chunk = chunks[0]
+            await self._wait(chunk["seconds"])
+            if chunk.get("error") == "FloodWaitError":
+                chunks.pop(0)
+                self.flood_waits += 1
+                raise FloodWaitError(
+                    request=None, capture=chunk.get("flood_seconds", 0)
+                )
+            if chunk.get("error"):
+                chunks.pop(0)
+                continue
+
+            result = file.write(b"\0" * chunk["bytes"])
+            if inspect.isawaitable(result):
+                await result
+            chunks.pop(0)
+
+        # The same file downloaded again (e.g. from another chat) replays in full
+        self._chunks[location.id] = list(self.trace["files"].get(location.id, []))
+
+    async def download_media(self, media, file=None, **kwargs):
+        return None
+
+
+async def replay_trace(
+    path: str,
+    concurrency: int = CONCURRENT_DOWNLOADS,
+    speed: float = 1.0,
+    output_mode: str = "files",
+) -> Dict:
+    """
+    Replay a recorded trace through export_media_organized
+
+    Media is discarded (NullStorage) and logs and records go to a
+    temporary directory, so replays leave nothing behind.
+
+    Args:
+        path: Trace file written by TraceRecorder
+        concurrency: Simultaneous downloads per chat
+        speed: Latency divisor
+        output_mode: "files", "tar" or "zip"
+
+    Returns:
+        Dictionary with chats, files, bytes, flood_waits, seconds and
+        bytes_per_sec
+    """
+    from storage import get_storage_backend, set_storage_backend
+    from telethon_handlers import export_media_organized
+
+    trace = load_trace(path)
+    client = TraceReplayClient(trace, speed)
+    storage = NullStorage()
+    previous_storage = get_storage_backend()
+    previous_dir = os.getcwd()
+
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory() as workdir:
+        # EXPORTS_DIR is relative, so logs and records land in workdir
+        os.chdir(workdir)
+        set_storage_backend(storage)
+        try:
+            for chat, pages in enumerate(trace["chats"], 1):
+                entity = SimpleNamespace(id=chat, title=f"Replay_{chat}")
+                limit = sum(len(page["messages"]) for page in pages)
+                await export_media_organized(
+                    client, entity, limit, output_mode, concurrency=concurrency
+                )
+        finally:
+            set_storage_backend(previous_storage)
+            os.chdir(previous_dir)
+    seconds = time.monotonic() - started
+
+    return {
+        "chats": len(trace["chats"]),
+        "files": storage.files,
+        "bytes": storage.bytes,
+        "flood_waits": client.flood_waits,
+        "seconds": round(seconds, 2),
+        "bytes_per_sec": round(storage.bytes / seconds) if seconds else 0,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    options = {"--concurrency": CONCURRENT_DOWNLOADS, "--speed": 1.0, "--mode": "files"}
+    for i, arg in enumerate(args[1:], 1):
+        if arg in options and i + 1 < len(args):
+            options[arg] = type(options[arg])(args[i + 1])
+
+    result = asyncio.run(
+        replay_trace(
+            args[0], options["--concurrency"], options["--speed"], options["--mode"]
+        )
+    )
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,340 @@
+"""
+Verify and repair module for Telegram Media Downloader
+Checks an export against its download records (expected size and
+SHA-256 checksum) and re-downloads only missing, empty, truncated or
+corrupted items through the normal download pipeline
+
+Usage:
+    python verify_repair.py [--repair] [--no-checksum] [chat_dir ...]
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from config import EXPORTS_DIR, DOWNLOAD_RECORDS_FILENAME, REPAIR_FETCH_BATCH_SIZE
+from file_utils import load_download_records
+from storage import get_storage_backend
+
+# Media filenames end in "[album{grouped_id}_]msg{message_id}{ext}"
+_MEDIA_FILENAME = re.compile(r"(?:album(\d+)_)?msg(\d+)(?:\.\w+)?$")
+
+# Problems found by verification
+MISSING = "missing"
+EMPTY = "empty"
+TRUNCATED = "truncated"
+SIZE_MISMATCH = "size_mismatch"
+CHECKSUM_MISMATCH = "checksum_mismatch"
+UNRECORDED = "unrecorded"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_size(actual: Optional[int], expected: int) -> Optional[str]:
+    if actual is None:
+        return MISSING
+    if actual == 0:
+        return EMPTY
+    if expected and actual < expected:
+        return TRUNCATED
+    if expected and actual != expected:
+        return SIZE_MISMATCH
+    return None
+
+
+def _verify_file_record(record: Dict, check_checksums: bool) -> Optional[Dict]:
+    storage = get_storage_backend()
+    path = record["path"]
+    expected = record.get("size") or 0
+
+    actual = storage.size(path)
+    problem = _check_size(actual, expected)
+
+    # The checksum is computed after a complete download, so a mismatch
+    # means the file was damaged afterwards
+    sha256 = record.get("post_processing", {}).get("sha256")
+    local_path = storage.local_path(path)
+    if problem is None and check_checksums and sha256 and local_path:
+        if _file_sha256(local_path) != sha256:
+            problem = CHECKSUM_MISMATCH
+
+    if problem is None:
+        return None
+    return {"path": path, "problem": problem, "expected_size": expected, "size": actual}
+
+
+def _verify_archive_record(record: Dict, archive_dir: str) -> Optional[Dict]:
+    entry = record["archive"]
+    shard_path = os.path.join(archive_dir, entry["shard"])
+    expected = record.get("size") or 0
+
+    try:
+        shard_size = os.path.getsize(shard_path)
+    except OSError:
+        shard_size = None
+
+    if shard_size is None:
+        problem = MISSING
+    elif shard_size < entry["offset"] + entry["size"]:
+        # The shard was cut before the end of this member
+        problem = TRUNCATED
+    else:
+        problem = _check_size(entry["size"], expected)
+
+    if problem is None:
+        return None
+    return {
+        "path": shard_path,
+        "problem": problem,
+        "expected_size": expected,
+        "size": entry["size"],
+    }
+
+
+def verify_chat_export(chat_dir: str, check_checksums: bool = True) -> List[Dict]:
+    """
+    Verify the media of one chat export against its download records
+
+    Media files without a record (left behind by a crash in the middle
+    of a download) are reported as "unrecorded".
+
+    Args:
+        chat_dir: Chat export directory ("{EXPORTS_DIR}/{ChatName}_{ChatID}")
+        check_checksums: Also compare SHA-256 checksums when recorded
+
+    Returns:
+        List of problems, each with message_id, chat_id, album_id, path,
+        problem, expected_size and size
+    """
+    records = load_download_records(os.path.join(chat_dir, DOWNLOAD_RECORDS_FILENAME))
+    archive_dir = os.path.join(chat_dir, "pacotes")
+    issues = []
+
+    for message_id, record in sorted(records.items()):
+        if "chat_id" not in record:
+            # Only post-processing results were recorded for this message
+            continue
+
+        if record.get("archive"):
+            issue = _verify_archive_record(record, archive_dir)
+        else:
+            issue = _verify_file_record(record, check_checksums)
+
+        if issue:
+            issue.update(
+                {
+                    "message_id": message_id,
+                    "chat_id": record["chat_id"],
+                    "album_id": record.get("album_id"),
+                    "archive_format": (
+                        record["archive"]["shard"].rsplit(".", 1)[-1]
+                        if record.get("archive")
+                        else None
+                    ),
+                }
+            )
+            issues.append(issue)
+
+    chat_id = _chat_id_from_dir(chat_dir)
+    for root, dirs, files in os.walk(chat_dir):
+        if os.path.abspath(root) == os.path.abspath(chat_dir) and "pacotes" in dirs:
+            dirs.remove("pacotes")
+        for name in files:
+            match = _MEDIA_FILENAME.search(name)
+            if not match or int(match.group(2)) in records:
+                continue
+            path = os.path.join(root, name)
+            issues.append(
+                {
+                    "message_id": int(match.group(2)),
+                    "chat_id": chat_id,
+                    "album_id": int(match.group(1)) if match.group(1) else None,
+                    "archive_format": None,
+                    "path": path,
+                    "problem": UNRECORDED,
+                    "expected_size": None,
+                    "size": os.path.getsize(path),
+                }
+            )
+
+    return issues
+
+
+def _chat_id_from_dir(chat_dir: str) -> Optional[int]:
+    # Directories are named "{ChatName}_{ChatID}"
+    suffix = os.path.basename(os.path.normpath(chat_dir)).rsplit("_", 1)[-1]
+    return int(suffix) if suffix.lstrip("-").isdigit() else None
+
+
+async def find_chat_entity(client, chat_id: int):
+    """
+    Find the entity of an exported chat by its ID
+
+    Records store the bare ID (without the -100 channel prefix), so the
+    chat is looked up among the dialogs of the account.
+
+    Args:
+        client: Authenticated Telegram client
+        chat_id: Chat ID as stored in the download records
+
+    Returns:
+        Chat entity or None if the account has no such dialog
+    """
+    async for dialog in client.iter_dialogs():
+        if dialog.entity.id == chat_id:
+            return dialog.entity
+    return None
+
+
+async def repair_chat_export(client, issues: List[Dict]) -> Tuple[int, int]:
+    """
+    Re-download the items of one chat reported by verify_chat_export
+
+    Messages are fetched in batches by ID and downloaded through the
+    regular pipeline, so they keep their original path (or are appended
+    to a new archive shard) and their records are rewritten.
+
+    Args:
+        client: Authenticated Telegram client
+        issues: Problems of a single chat
+
+    Returns:
+        Tuple of (repaired, failed)
+    """
+    from download_pipeline import ChatDownloadPipeline
+    from telethon_handlers import get_forum_topics
+
+    if not issues:
+        return 0, 0
+
+    entity = await find_chat_entity(client, issues[0]["chat_id"])
+    if entity is None:
+        print(f"❌ Chat {issues[0]['chat_id']} não encontrado nos diálogos da conta")
+        return 0, len(issues)
+
+    topics = await get_forum_topics(client, entity)
+    repaired = failed = 0
+
+    # Each item is repaired in the layout it was exported with
+    by_mode: Dict[str, List[Dict]] = {}
+    for issue in issues:
+        by_mode.setdefault(issue["archive_format"] or "files", []).append(issue)
+
+    for output_mode, mode_issues in by_mode.items():
+        pipeline = ChatDownloadPipeline(
+            client, entity, topics, output_mode, priority="incremental"
+        )
+        await pipeline.start()
+
+        for start in range(0, len(mode_issues), REPAIR_FETCH_BATCH_SIZE):
+            batch = mode_issues[start : start + REPAIR_FETCH_BATCH_SIZE]
+            messages = await client.get_messages(
+                entity, ids=[issue["message_id"] for issue in batch]
+            )
+
+            for issue, message in zip(batch, messages):
+                if message is None or message.media is None:
+                    print(f"⚠️ Mensagem {issue['message_id']} não está mais disponível")
+                    failed += 1
+                    continue
+                if pipeline.enqueue(message, issue["album_id"]) is None:
+                    failed += 1
+
+        await pipeline.close()
+        repaired += pipeline.downloaded_count
+        failed += pipeline.failed_count
+
+    return repaired, failed
+
+
+def find_chat_dirs(exports_dir: str = EXPORTS_DIR) -> List[str]:
+    """Return every chat export directory that has download records"""
+    if not os.path.isdir(exports_dir):
+        return []
+
+    return sorted(
+        os.path.join(exports_dir, name)
+        for name in os.listdir(exports_dir)
+        if os.path.exists(os.path.join(exports_dir, name, DOWNLOAD_RECORDS_FILENAME))
+    )
+
+
+async def verify_exports(
+    chat_dirs: List[str], repair: bool = False, check_checksums: bool = True
+) -> Dict[str, int]:
+    """
+    Verify chat exports and optionally repair them
+
+    Args:
+        chat_dirs: Chat export directories
+        repair: Re-download the problematic items (uses the saved session)
+        check_checksums: Also compare SHA-256 checksums when recorded
+
+    Returns:
+        Dictionary with "problems", "repaired" and "failed" counts
+    """
+    totals = {"problems": 0, "repaired": 0, "failed": 0}
+    all_issues = {}
+
+    for chat_dir in chat_dirs:
+        issues = verify_chat_export(chat_dir, check_checksums)
+        totals["problems"] += len(issues)
+
+        if not issues:
+            print(f"✅ {chat_dir}: íntegro")
+            continue
+
+        print(f"⚠️ {chat_dir}: {len(issues)} problema(s)")
+        for issue in issues:
+            print(
+                f"   - msg {issue['message_id']}: {issue['problem']} ({issue['path']})"
+            )
+        all_issues[chat_dir] = issues
+
+    if not repair or not all_issues:
+        return totals
+
+    from dc_pool import close_dc_pool
+    from telethon_handlers import connect_saved_session
+
+    client = await connect_saved_session()
+    if client is None:
+        print("❌ Nenhuma sessão autorizada. Faça login antes de reparar.")
+        return totals
+
+    try:
+        for chat_dir, issues in all_issues.items():
+            print(f"🔧 Reparando {chat_dir}...")
+            repaired, failed = await repair_chat_export(client, issues)
+            totals["repaired"] += repaired
+            totals["failed"] += failed
+    finally:
+        await close_dc_pool(client)
+        await client.disconnect()
+
+    return totals
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    dirs = [arg for arg in args if not arg.startswith("--")] or find_chat_dirs()
+
+    result = asyncio.run(
+        verify_exports(dirs, "--repair" in args, "--no-checksum" not in args)
+    )
+
+    print(
+        f"\n📊 Problemas: {result['problems']} | Reparados: {result['repaired']} | "
+        f"Falhas: {result['failed']}"
+    )
+    sys.exit(1 if result["problems"] > result["repaired"] else 0)
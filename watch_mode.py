@@ -0,0 +1,390 @@
+"""
+Watch mode module for Telegram Media Downloader
+Keeps exports current by downloading new media as it arrives, using
+Telethon update handlers instead of re-scanning chat history
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from config import (
+    OUTPUT_MODE,
+    WATCH_STATE_FILENAME,
+    WATCH_RECONNECT_MAX_DELAY,
+    WATCH_CATCH_UP_INTERVAL,
+    WATCH_MAX_ATTEMPTS,
+)
+from download_pipeline import ChatDownloadPipeline
+from event_bus import emit, ErrorEvent
+from file_utils import load_download_records
+from telethon_handlers import get_chat_entity_safe, get_forum_topics
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+
+class ChatWatcher:
+    """
+    Live download state of one watched chat
+
+    Tracks a watermark: the highest message ID such that every media
+    message up to it has been downloaded. It is persisted in the chat
+    directory, so the catch-up pass after a reconnect or restart starts
+    exactly where the previous session stopped. Messages whose download
+    failed hold the watermark back and are retried by the next catch-up
+    pass, up to WATCH_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, client: TelegramClient, entity, pipeline: ChatDownloadPipeline):
+        self.client = client
+        self.entity = entity
+        self.pipeline = pipeline
+        self.state_path = os.path.join(pipeline.base_dir, WATCH_STATE_FILENAME)
+
+        self.has_state = os.path.exists(self.state_path)
+        self.last_message_id = self._load_state()
+        self._max_seen_id = self.last_message_id
+        self._pending_ids = set()
+        self._done_ids = set()
+        self._failed_ids = set()
+        self._attempts: Dict[int, int] = {}
+
+    def _load_state(self) -> int:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return int(json.load(f).get("last_message_id", 0))
+        except (OSError, ValueError):
+            return 0
+
+    async def seed_watermark(self) -> None:
+        """
+        Start a chat watched for the first time at its current end
+
+        Without a state file the watermark would be 0 and the first
+        catch-up would download the whole history. Media already exported
+        are taken from the download records; otherwise watching starts at
+        the newest message.
+        """
+        if self.has_state:
+            return
+
+        records = load_download_records(self.pipeline.records_file)
+        if records:
+            self.last_message_id = max(records)
+        else:
+            async for message in self.client.iter_messages(self.entity, limit=1):
+                self.last_message_id = message.id
+
+        self._max_seen_id = max(self._max_seen_id, self.last_message_id)
+        self._save_state()
+        self.has_state = True
+
+    def _save_state(self) -> None:
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump({"last_message_id": self.last_message_id}, f)
+
+    def _update_watermark(self) -> None:
+        blocking = self._pending_ids | self._failed_ids
+        if blocking:
+            watermark = min(blocking) - 1
+        else:
+            watermark = self._max_seen_id
+
+        if watermark > self.last_message_id:
+            self.last_message_id = watermark
+            self._done_ids = {i for i in self._done_ids if i > watermark}
+            self._save_state()
+
+    def _is_known(self, message) -> bool:
+        # Updates and the catch-up pass may deliver the same message
+        return (
+            message.id <= self.last_message_id
+            or message.id in self._pending_ids
+            or message.id in self._done_ids
+        )
+
+    def _finish(self, message_ids: List[int], succeeded: bool) -> None:
+        self._pending_ids.difference_update(message_ids)
+
+        for message_id in message_ids:
+            attempts = self._attempts.pop(message_id, 0) + 1
+            if succeeded:
+                self._failed_ids.discard(message_id)
+                self._done_ids.add(message_id)
+            elif attempts < WATCH_MAX_ATTEMPTS:
+                # Retried by the next catch-up pass
+                self._failed_ids.add(message_id)
+                self._attempts[message_id] = attempts
+            else:
+                emit(
+                    ErrorEvent(
+                        "watch",
+                        f"Desistindo após {attempts} tentativas",
+                        self.entity.id,
+                        message_id,
+                    )
+                )
+                self._failed_ids.discard(message_id)
+                self._done_ids.add(message_id)
+
+        self._update_watermark()
+
+    def _track(self, task: Optional[asyncio.Task], message_ids: List[int]) -> None:
+        self._max_seen_id = max([self._max_seen_id] + message_ids)
+        self._failed_ids.difference_update(message_ids)
+
+        if task is None:
+            # Nothing to download (no media or filtered out)
+            self._finish(message_ids, True)
+            return
+
+        self._pending_ids.update(message_ids)
+
+        def on_done(task):
+            succeeded = (
+                not task.cancelled()
+                and task.exception() is None
+                # Tasks return (topic_name, downloaded, failed)
+                and task.result()[2] == 0
+            )
+            self._finish(message_ids, succeeded)
+
+        task.add_done_callback(on_done)
+
+    def handle_message(self, message) -> None:
+        """
+        Enqueue a new message into the download pipeline
+
+        Args:
+            message: Telethon message object
+        """
+        if self._is_known(message):
+            return
+
+        try:
+            task = self.pipeline.enqueue(message)
+        except Exception as e:
+            emit(ErrorEvent("watch", str(e), self.entity.id, message.id))
+            self._max_seen_id = max(self._max_seen_id, message.id)
+            self._finish([message.id], False)
+            return
+
+        self._track(task, [message.id])
+
+    def handle_album(self, messages: List) -> None:
+        """
+        Enqueue the members of an album as one batch
+
+        Args:
+            messages: Telethon messages sharing a grouped_id
+        """
+        messages = [message for message in messages if not self._is_known(message)]
+        if not messages:
+            return
+
+        message_ids = [message.id for message in messages]
+        try:
+            task = self.pipeline.enqueue_album(messages)
+        except Exception as e:
+            emit(ErrorEvent("watch", str(e), self.entity.id, messages[0].id))
+            self._max_seen_id = max([self._max_seen_id] + message_ids)
+            self._finish(message_ids, False)
+            return
+
+        self._track(task, message_ids)
+
+    async def catch_up(self) -> int:
+        """
+        Enqueue every message newer than the watermark
+
+        Also retries the messages whose download failed, since they keep
+        the watermark below them.
+
+        Returns:
+            Number of messages received during the pass
+        """
+        await self.seed_watermark()
+
+        count = 0
+        album_messages = []
+
+        # Oldest first, so album members arrive consecutively and in order
+        async for message in self.client.iter_messages(
+            self.entity, min_id=self.last_message_id, reverse=True
+        ):
+            count += 1
+            grouped_id = getattr(message, "grouped_id", None)
+            if album_messages and album_messages[0].grouped_id != grouped_id:
+                self.handle_album(album_messages)
+                album_messages = []
+
+            if grouped_id:
+                album_messages.append(message)
+            else:
+                self.handle_message(message)
+
+        if album_messages:
+            self.handle_album(album_messages)
+
+        return count
+
+
+def _on_auto_reconnect(client: TelegramClient, callback) -> Callable[[], None]:
+    """
+    Call callback whenever Telethon reconnects the client on its own
+
+    Telethon reconnects dropped connections internally and only reports
+    it to the hook its sender was created with, so that hook is wrapped.
+    Gaps in the update sequence are not a concern here: Telethon fetches
+    the difference itself and delivers the missed updates to the handlers.
+
+    Args:
+        client: Telegram client
+        callback: Function called without arguments after a reconnection
+
+    Returns:
+        Function that removes the hook again
+    """
+    sender = getattr(client, "_sender", None)
+    original = getattr(sender, "_auto_reconnect_callback", None)
+    if original is None:
+        return lambda: None
+
+    async def on_reconnect():
+        callback()
+        await original()
+
+    def remove():
+        sender._auto_reconnect_callback = original
+
+    sender._auto_reconnect_callback = on_reconnect
+    return remove
+
+
+async def watch_chats(
+    client: TelegramClient,
+    chat_list: List[Dict],
+    output_mode: str = OUTPUT_MODE,
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Download new media from the given chats as it arrives
+
+    Runs until stop_event is set (or forever). Albums are handled as a
+    whole by the Album event; their individual NewMessage events are
+    ignored. Nothing is polled: after every (re)connection, including the
+    ones Telethon makes on its own, a catch-up pass downloads what arrived
+    while updates were missed and retries failed downloads. A periodic
+    pass every WATCH_CATCH_UP_INTERVAL seconds is opt-in (0 disables it).
+
+    Args:
+        client: Authenticated Telegram client
+        chat_list: List of chat information dictionaries
+        output_mode: "files", "tar" or "zip"
+        stop_event: Optional event that ends watch mode when set
+    """
+    from telethon import events
+    from telethon.utils import get_peer_id
+
+    watchers: Dict[int, ChatWatcher] = {}
+
+    for chat_info in chat_list:
+        entity = await get_chat_entity_safe(client, chat_info)
+        if not entity:
+            print(f"❌ Não foi possível acessar o chat: {chat_info['title']}")
+            continue
+
+        topics = await get_forum_topics(client, entity)
+        pipeline = ChatDownloadPipeline(
+            client, entity, topics, output_mode, priority="incremental"
+        )
+        await pipeline.start()
+        # Keyed by marked peer ID, the same form as event.chat_id
+        watchers[get_peer_id(entity)] = ChatWatcher(client, entity, pipeline)
+
+    if not watchers:
+        print("❌ Nenhum chat disponível para monitorar")
+        return
+
+    entities = [watcher.entity for watcher in watchers.values()]
+
+    async def on_new_message(event):
+        # Album members are delivered together by on_album
+        if event.message.grouped_id:
+            return
+        watcher = watchers.get(event.chat_id)
+        if watcher:
+            watcher.handle_message(event.message)
+
+    async def on_album(event):
+        watcher = watchers.get(event.chat_id)
+        if watcher:
+            watcher.handle_album(event.messages)
+
+    client.add_event_handler(on_new_message, events.NewMessage(chats=entities))
+    client.add_event_handler(on_album, events.Album(chats=entities))
+
+    print(f"👀 Monitorando {len(watchers)} chat(s) - novas mídias serão baixadas")
+
+    stop_event = stop_event or asyncio.Event()
+    stop_task = asyncio.create_task(stop_event.wait())
+    reconnected = asyncio.Event()
+    remove_reconnect_hook = _on_auto_reconnect(client, reconnected.set)
+    reconnect_delay = 1
+
+    try:
+        while not stop_event.is_set():
+            reconnected.clear()
+            # Close any gap left while the client was disconnected
+            for watcher in watchers.values():
+                caught_up = await watcher.catch_up()
+                if caught_up:
+                    print(
+                        f"🔄 Recuperadas {caught_up} mensagens de "
+                        f"{getattr(watcher.entity, 'title', watcher.entity.id)}"
+                    )
+
+            # Wait until the connection drops or comes back, or a stop
+            disconnected = asyncio.ensure_future(client.disconnected)
+            resumed = asyncio.create_task(reconnected.wait())
+            await asyncio.wait(
+                [disconnected, resumed, stop_task],
+                timeout=WATCH_CATCH_UP_INTERVAL or None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            resumed.cancel()
+            if stop_event.is_set():
+                break
+            if not disconnected.done():
+                if reconnected.is_set():
+                    print("🔄 Conexão restabelecida - recuperando mensagens perdidas")
+                continue
+
+            print("⚠️ Conexão perdida - reconectando...")
+            while not client.is_connected() and not stop_event.is_set():
+                try:
+                    await client.connect()
+                    reconnect_delay = 1
+                except Exception as e:
+                    print(
+                        f"❌ Falha ao reconectar: {e} (nova tentativa em {reconnect_delay}s)"
+                    )
+                    await asyncio.sleep(reconnect_delay)
+                    reconnect_delay = min(
+                        reconnect_delay * 2, WATCH_RECONNECT_MAX_DELAY
+                    )
+
+    finally:
+        stop_task.cancel()
+        remove_reconnect_hook()
+        client.remove_event_handler(on_new_message)
+        client.remove_event_handler(on_album)
+
+        for watcher in watchers.values():
+            await watcher.pipeline.close()
+
+        print("🛑 Monitoramento encerrado")
@@ -0,0 +1,322 @@
+"""
+Work queue module for Telegram Media Downloader
+Durable queue of export work items shared by a coordinator and several
+worker processes, with leases, heartbeats and retries
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from config import (
+    WORK_QUEUE_BACKEND,
+    WORK_QUEUE_PATH,
+    WORK_MAX_ATTEMPTS,
+    WORK_RETRY_BACKOFF,
+)
+
+# Item states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# Filesystems where SQLite locking (and WAL shared memory) is unreliable
+_NETWORK_FILESYSTEMS = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "afs",
+    "ceph",
+    "glusterfs",
+    "fuse.sshfs",
+    "fuse.s3fs",
+    "fuse.gcsfuse",
+}
+
+
+def _filesystem_type(path: str) -> Optional[str]:
+    """Type of the filesystem holding path (Linux only, None elsewhere)"""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if line.strip()]
+    except OSError:
+        return None
+
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type
+
+
+class WorkQueue:
+    """
+    Base class for work queue backends
+
+    A work item is a dictionary with "id", "payload", "attempts" and
+    "max_attempts". Workers lease an item for a limited time and must
+    renew the lease with heartbeat() while working; an item whose lease
+    expires is handed to another worker. Failed items are retried with
+    exponential backoff until max_attempts is reached.
+    """
+
+    name = "base"
+
+    def put(self, payloads: Iterable[Dict], max_attempts: int = WORK_MAX_ATTEMPTS):
+        """Add one work item per payload"""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        """Lease the next available item, or return None if there is none"""
+        raise NotImplementedError
+
+    def heartbeat(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a lease; returns False if the worker no longer holds it"""
+        raise NotImplementedError
+
+    def complete(self, item_id: int, worker_id: str, result: Dict) -> bool:
+        """Mark a leased item as done"""
+        raise NotImplementedError
+
+    def fail(self, item_id: int, worker_id: str, error: str) -> bool:
+        """Release a leased item after an error (retried if attempts remain)"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of items in each state"""
+        raise NotImplementedError
+
+    def items(self, status: Optional[str] = None) -> List[Dict]:
+        """Return all items, optionally only those in one state"""
+        raise NotImplementedError
+
+    def is_finished(self) -> bool:
+        """True when no item is pending or leased"""
+        counts = self.stats()
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a SQLite database
+
+    Every state change runs in its own IMMEDIATE transaction, so several
+    worker processes can share the same database file on one machine.
+    SQLite locks (and WAL mode) do not work across machines, so a
+    database on a network filesystem is refused: run every worker on the
+    host that stores the queue.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = WORK_QUEUE_PATH):
+        """
+        Args:
+            path: Database file (created if missing)
+
+        Raises:
+            ValueError: If path is on a network filesystem
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        fs_type = _filesystem_type(directory or ".")
+        if fs_type in _NETWORK_FILESYSTEMS:
+            raise ValueError(
+                f"Fila SQLite em sistema de arquivos de rede ({fs_type}): "
+                f"execute todos os workers na máquina que guarda {path}"
+            )
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker_id TEXT,
+                lease_expires REAL,
+                available_at REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS work_items_status "
+            "ON work_items (status, available_at)"
+        )
+
+    def _transaction(self, func):
+        # One writer transaction at a time per process; SQLite serializes
+        # writers across processes
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _to_item(row) -> Dict:
+        item = dict(row)
+        item["payload"] = json.loads(item["payload"])
+        item["result"] = json.loads(item["result"]) if item["result"] else None
+        return item
+
+    def put(self, payloads: Iterable[Dict], max_attempts: int = WORK_MAX_ATTEMPTS):
+        now = time.time()
+        rows = [
+            (json.dumps(p, ensure_ascii=False), max_attempts, now) for p in payloads
+        ]
+
+        def insert(conn):
+            conn.executemany(
+                "INSERT INTO work_items (payload, max_attempts, updated_at) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+
+        self._transaction(insert)
+        return len(rows)
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        def take(conn):
+            now = time.time()
+
+            # Expired leases: the worker died or lost its connection
+            conn.execute(
+                "UPDATE work_items SET status = CASE WHEN attempts >= max_attempts "
+                "THEN 'failed' ELSE 'pending' END, worker_id = NULL, "
+                "error = 'lease_expired', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ?",
+                (now, now),
+            )
+
+            row = conn.execute(
+                "SELECT * FROM work_items WHERE status = 'pending' "
+                "AND available_at <= ? ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE work_items SET status = 'leased', worker_id = ?, "
+                "lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+            item = self._to_item(row)
+            item["attempts"] += 1
+            return item
+
+        return self._transaction(take)
+
+    def heartbeat(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+
+        def renew(conn):
+            cursor = conn.execute(
+                "UPDATE work_items SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (now + lease_seconds, now, item_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(renew)
+
+    def complete(self, item_id: int, worker_id: str, result: Dict) -> bool:
+        def finish(conn):
+            cursor = conn.execute(
+                "UPDATE work_items SET status = 'done', result = ?, error = NULL, "
+                "lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (
+                    json.dumps(result, ensure_ascii=False),
+                    time.time(),
+                    item_id,
+                    worker_id,
+                ),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(finish)
+
+    def fail(self, item_id: int, worker_id: str, error: str) -> bool:
+        def release(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM work_items "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (item_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return False
+
+            now = time.time()
+            retry = row["attempts"] < row["max_attempts"]
+            conn.execute(
+                "UPDATE work_items SET status = ?, error = ?, worker_id = NULL, "
+                "lease_expires = NULL, available_at = ?, updated_at = ? WHERE id = ?",
+                (
+                    PENDING if retry else FAILED,
+                    error,
+                    now + WORK_RETRY_BACKOFF * 2 ** (row["attempts"] - 1),
+                    now,
+                    item_id,
+                ),
+            )
+            return True
+
+        return self._transaction(release)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM work_items GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def items(self, status: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            if status:
+                rows = self._conn.execute(
+                    "SELECT * FROM work_items WHERE status = ? ORDER BY id", (status,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM work_items ORDER BY id"
+                ).fetchall()
+        return [self._to_item(row) for row in rows]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def get_work_queue(path: Optional[str] = None) -> WorkQueue:
+    """Open the work queue selected by WORK_QUEUE_BACKEND"""
+    if WORK_QUEUE_BACKEND == "sqlite":
+        return SQLiteWorkQueue(path or WORK_QUEUE_PATH)
+
+    raise ValueError(f"WORK_QUEUE_BACKEND inválido: {WORK_QUEUE_BACKEND}")